@@ -0,0 +1,122 @@
+# 完了済みタスクのアーカイブ
+# 完了してから ARCHIVE_AFTER_DAYS 日たったタスクを tasks_archive に移し、ボードが毎回読む tasks を小さく保つ。
+# 1バッチを1つの短いトランザクションで移し、バッチの間は書き込みスレッドを空けるので、
+# アーカイブ中もユーザーの書き込みは長く待たされない。
+# 定期実行では、このプロセスで開いたすべてのボード（データベースファイル）を順に処理する。
+# 前後のテーブルの件数とボードの描画時間の記録は重いので、TASKS_ARCHIVE_MEASURE=1 のときだけ行う
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from app import database
+from app.async_database import archive_completed_tasks, run_read
+
+logger = logging.getLogger(__name__)
+
+# 完了（最後の更新）からアーカイブするまでの日数
+ARCHIVE_AFTER_DAYS = float(os.environ.get("TASKS_ARCHIVE_AFTER_DAYS", "30"))
+# 1トランザクションで移す件数
+ARCHIVE_BATCH_SIZE = int(os.environ.get("TASKS_ARCHIVE_BATCH_SIZE", "500"))
+# バックグラウンドで実行する間隔（秒）。0 で無効（POST /api/archive/run でだけ実行する）
+ARCHIVE_INTERVAL = float(os.environ.get("TASKS_ARCHIVE_INTERVAL", "3600"))
+# バッチの間に他の書き込みを通す待ち時間（秒）
+ARCHIVE_PAUSE = 0.01
+# 実行の前後に件数を数え、キャッシュを使わずにボード全体を描画する時間を測る（計測用）
+ARCHIVE_MEASURE = os.environ.get("TASKS_ARCHIVE_MEASURE") == "1"
+
+
+class ArchiveJob:
+    """アーカイブを定期的に実行する
+    measure が真なら、前後のテーブルの大きさとボードの描画時間も記録する
+    """
+
+    def __init__(self, render_board: Callable, interval: float = ARCHIVE_INTERVAL,
+                 older_than_days: float = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                 measure: bool = ARCHIVE_MEASURE):
+        self.render_board = render_board  # {quadrant: 行のリスト} -> ボードのHTML
+        self.measure = measure
+        self.interval = interval
+        self.older_than_days = older_than_days
+        self.batch_size = batch_size
+        self.runs = 0
+        self.archived = 0
+        self.last_run = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for path in database.initialized_databases():
+                try:
+                    with database.use_database(path):
+                        await self.run()
+                except Exception:
+                    logger.exception("archive job failed (%s)", path)
+
+    def _snapshot(self) -> dict:
+        """テーブルの件数と、キャッシュを使わずにボードを読んで描画する時間（ミリ秒）
+        読み込みスレッドで実行する（全件を読んで描画するので、イベントループでは実行しない）
+        """
+        sizes = database.get_table_sizes()
+        start = time.perf_counter()
+        self.render_board(database.get_board(use_cache=False))
+        return {**sizes, "board_render_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    async def run(self, older_than_days: Optional[float] = None) -> dict:
+        """現在のボードで、対象がなくなるまでバッチを繰り返す（同時に2回は実行しない）"""
+        older_than_days = self.older_than_days if older_than_days is None else older_than_days
+        async with self._lock:
+            before = await run_read(self._snapshot) if self.measure else None
+            start = time.perf_counter()
+            archived = batches = 0
+            while True:
+                count = await archive_completed_tasks(older_than_days, self.batch_size)
+                archived += count
+                batches += 1 if count else 0
+                if count < self.batch_size:
+                    break
+                await asyncio.sleep(ARCHIVE_PAUSE)
+            seconds = time.perf_counter() - start
+            after = await run_read(self._snapshot) if self.measure else None
+
+            self.runs += 1
+            self.archived += archived
+            self.last_run = {
+                "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "database": database.current_database(),
+                "older_than_days": older_than_days,
+                "archived": archived,
+                "batches": batches,
+                "seconds": round(seconds, 3),
+            }
+            if self.measure:
+                self.last_run.update(before=before, after=after)
+            if archived:
+                logger.info("archived %d tasks in %d batches (%.2f s)", archived, batches, seconds)
+            return self.last_run
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "older_than_days": self.older_than_days,
+            "batch_size": self.batch_size,
+            "measure": self.measure,
+            "runs": self.runs,
+            "archived": self.archived,
+            "last_run": self.last_run,
+        }
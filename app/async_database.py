@@ -0,0 +1,118 @@
+# 非同期データアクセス
+# app.database の同期関数を専用スレッドで実行し、イベントループを塞がないようにする
+# 書き込みはデータベースファイル（ボード）ごとに1本のスレッドに直列化し（ワーカー内でのロック競合をなくす）、
+# 読み込みは複数のスレッドで並行させる。ボードはファイル名のハッシュで書き込みスレッドに割り当てるので、
+# 別のボードへの大量の書き込みには待たされない
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from app import database
+
+# 読み込みスレッド数（既定は接続プールから書き込み用の1本を除いた数）
+READ_WORKERS = int(os.environ.get("TASKS_DB_READ_WORKERS", str(max(1, database.POOL_SIZE - 1))))
+# 書き込みスレッド数（ボードを割り当てる枠の数）
+WRITE_WORKERS = int(os.environ.get("TASKS_DB_WRITE_WORKERS", "4"))
+
+_read_executor = None
+_write_executors = None
+_executors_lock = threading.Lock()
+
+
+def _get_executors():
+    global _read_executor, _write_executors
+    if _read_executor is None:
+        with _executors_lock:
+            if _read_executor is None:
+                _write_executors = [
+                    ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"db-writer-{lane}")
+                    for lane in range(max(1, WRITE_WORKERS))
+                ]
+                _read_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="db-reader")
+    return _read_executor, _write_executors
+
+
+def write_lane(path: str, lanes: int) -> int:
+    """データベースファイルを割り当てる書き込みスレッドの番号（プロセスをまたいで同じ値になるハッシュ）"""
+    return zlib.crc32(path.encode()) % lanes
+
+
+def shutdown_executors():
+    """実行中の処理を待ってからスレッドを止める（アプリ終了時に呼ぶ）"""
+    global _read_executor, _write_executors
+    with _executors_lock:
+        executors = [_read_executor, *(_write_executors or ())]
+        _read_executor = _write_executors = None
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+async def run_read(func, *args, **kwargs):
+    """同期関数を読み込みスレッドで実行"""
+    return await _run(_get_executors()[0], func, *args, **kwargs)
+
+
+async def run_write(func, *args, **kwargs):
+    """同期関数を現在のボードの書き込みスレッドで実行"""
+    writers = _get_executors()[1]
+    executor = writers[write_lane(database.current_database(), len(writers))]
+    return await _run(executor, func, *args, **kwargs)
+
+
+async def _run(executor, func, *args, **kwargs):
+    # asyncio.to_thread と同じくコンテキスト変数を引き継ぐ
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+def _reader(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_read(func, *args, **kwargs)
+    return wrapper
+
+
+def _writer(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_write(func, *args, **kwargs)
+    return wrapper
+
+
+# 読み込み
+get_all_tasks = _reader(database.get_all_tasks)
+list_tasks = _reader(database.list_tasks)
+get_tasks_by_quadrant = _reader(database.get_tasks_by_quadrant)
+get_board = _reader(database.get_board)
+get_task_by_id = _reader(database.get_task_by_id)
+get_generation_states = _reader(database.get_generation_states)
+get_task_state = _reader(database.get_task_state)
+get_due_tasks = _reader(database.get_due_tasks)
+list_archived_tasks = _reader(database.list_archived_tasks)
+get_table_sizes = _reader(database.get_table_sizes)
+get_overdue_counts = _reader(database.get_overdue_counts)
+get_next_due = _reader(database.get_next_due)
+search_tasks = _reader(database.search_tasks)
+
+# 書き込み
+insert_task = _writer(database.insert_task)
+create_task = _writer(database.create_task)
+update_task = _writer(database.update_task)
+move_task_to_quadrant = _writer(database.move_task_to_quadrant)
+move_task = _writer(database.move_task)
+update_task_positions = _writer(database.update_task_positions)
+delete_task = _writer(database.delete_task)
+bulk_insert_tasks = _writer(database.bulk_insert_tasks)
+import_task_chunk = _writer(database.import_task_chunk)
+bulk_update_tasks = _writer(database.bulk_update_tasks)
+bulk_delete_tasks = _writer(database.bulk_delete_tasks)
+archive_completed_tasks = _writer(database.archive_completed_tasks)
+ensure_db = _writer(database.ensure_db)
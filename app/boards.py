@@ -0,0 +1,112 @@
+# ボード（チームごとのマトリックス）
+# ボードごとに別のSQLiteファイルを使うので、書き込みロックも書き込みスレッドもボードの間で共有しない。
+# ボードはURLの先頭（/boards/<名前>/...）か X-Board ヘッダーで選び、指定がなければ既定のボード（DATABASE）。
+# ファイルはそのボードへの最初のリクエストで作ってマイグレーションする
+
+import contextvars
+import json
+import os
+import re
+
+from starlette.datastructures import MutableHeaders
+
+from app import database
+from app.async_database import ensure_db
+
+# 既定のボード（従来の tasks.db）
+DEFAULT_BOARD = "default"
+# ボードのファイルを置くディレクトリ
+BOARDS_DIR = os.environ.get("TASKS_BOARDS_DIR", "boards")
+BOARD_HEADER = "x-board"
+BOARD_PREFIX = "/boards/"
+
+# ボード名は小文字英数字・ハイフン・アンダースコア（ファイル名にそのまま使う）
+_BOARD_NAME = re.compile(r"[a-z0-9][a-z0-9_-]{0,62}")
+
+_current_board = contextvars.ContextVar("current_board", default=DEFAULT_BOARD)
+
+
+def is_valid_board(board: str) -> bool:
+    return bool(_BOARD_NAME.fullmatch(board))
+
+
+def database_for_board(board: str) -> str:
+    """ボードのデータベースファイル"""
+    if board == DEFAULT_BOARD:
+        return database.DATABASE
+    return os.path.join(BOARDS_DIR, f"{board}.db")
+
+
+def current_board() -> str:
+    """現在のリクエストのボード名"""
+    return _current_board.get()
+
+
+def board_prefix(board: str) -> str:
+    """ボードのページやリンクのURLの先頭（既定のボードは空）"""
+    return "" if board == DEFAULT_BOARD else f"{BOARD_PREFIX}{board}"
+
+
+def _board_in_path(path: str):
+    """/boards/<名前>/... の名前（先頭がボードでなければ None）"""
+    if not path.startswith(BOARD_PREFIX):
+        return None
+    return path[len(BOARD_PREFIX):].partition("/")[0]
+
+
+class BoardMiddleware:
+    """リクエストのボードを決めて、そのボードのデータベースに読み書きを向けるASGIミドルウェア
+
+    /boards/<名前>/api/... は /api/... として処理する（リクエストのURLは先頭つきのままなので、
+    Link ヘッダーなどのリンクも同じボードを指す）。
+    URLにボードがない場合は X-Board ヘッダーで応答が変わるので、応答に Vary: X-Board を付ける
+    （ブラウザや中継のキャッシュが別のボードの応答を返さないように）。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        board = _board_in_path(scope["path"])
+        if board is not None:
+            # 先頭を root_path に移すと、ルーターは残りのパスで照合する
+            # （scope はその場で書き換えて、外側のミドルウェアも一致したルートを参照できるようにする）
+            prefix = f"{BOARD_PREFIX}{board}"
+            if scope["path"] == prefix:
+                scope["path"] = prefix + "/"
+            scope["root_path"] = scope.get("root_path", "") + prefix
+        else:
+            header = dict(scope["headers"]).get(BOARD_HEADER.encode())
+            board = header.decode("latin-1").strip() if header else DEFAULT_BOARD
+            send = _vary_on_board(send)
+        if not is_valid_board(board):
+            await _bad_request(send, f"Invalid board name: {board!r}")
+            return
+
+        board_token = _current_board.set(board)
+        try:
+            with database.use_database(database_for_board(board)):
+                if not database.is_initialized():
+                    await ensure_db()
+                await self.app(scope, receive, send)
+        finally:
+            _current_board.reset(board_token)
+
+
+def _vary_on_board(send):
+    async def send_with_vary(message):
+        if message["type"] == "http.response.start":
+            MutableHeaders(scope=message).add_vary_header("X-Board")
+        await send(message)
+    return send_with_vary
+
+
+async def _bad_request(send, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": 400,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
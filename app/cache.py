@@ -0,0 +1,64 @@
+# プロセス内の読み込みキャッシュ
+# エントリは「世代番号」と一緒に保存し、取得時の世代と一致したときだけ使う。
+# 世代番号は象限ごとにデータベースに保存され、書き込みのたびに増えるので、
+# 他のワーカーの書き込みも次の読み込みで検出できる
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """世代番号つきのLRUキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (generation, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, generation):
+        """世代が一致するエントリの値を返す。なければ None"""
+        return self.get_if(key, lambda stored: stored == generation)
+
+    def get_if(self, key, is_current):
+        """保存時の世代を is_current(世代) で検証し、有効なら値を返す。なければ None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not is_current(entry[0]):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, generation, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
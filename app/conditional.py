@@ -0,0 +1,95 @@
+# 条件付きGET（ETag / Last-Modified）と条件付きの書き込み（If-Match）
+# 検証子は象限ごとの世代番号やタスクのバージョンから作るので、本体のクエリやテンプレート描画の前に判定できる。
+# 同じURLが X-Board ヘッダーで別のボードを指すので、どの検証子にもボード名を含める
+
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.boards import current_board
+
+# ブラウザ（とHTMXのXHR）に毎回再検証させる
+CACHE_CONTROL = "no-cache"
+
+# "t-<ボード>-<id>-<version>"（ボード名にもハイフンを使えるので、数字の2つを後ろから取る）
+_TASK_ETAG = re.compile(r'"t-(.+)-(\d+)-(\d+)"')
+# If-Match / If-None-Match の entity-tag 1つ（RFC 9110: [W/]"..."）
+_ENTITY_TAG = re.compile(r'(W/)?"[\x21\x23-\x7e\x80-\xff]*"')
+
+
+def make_etag(*parts) -> str:
+    """世代番号などから現在のボードの弱いETagを作る"""
+    return 'W/"' + "-".join(str(part) for part in (current_board(), *parts)) + '"'
+
+
+def task_etag(task_id: int, version: int) -> str:
+    """現在のボードのタスク1件の強いETag（バージョンは書き込みのたびに増えるので、内容が同じなら同じ値）"""
+    return f'"t-{current_board()}-{task_id}-{version}"'
+
+
+def if_match_versions(request: Request, task_id: int) -> Optional[set]:
+    """If-Match の entity-tag の列から、書き込みの前提にできるタスクのバージョンの集合を取り出す
+    ヘッダーがない・* の場合は None。If-Match は強い比較なので、弱いETag（W/）と
+    別のボード・別のタスクのETagはどのバージョンにも一致しない（空の集合になりうる）。
+    entity-tag の列として読めない場合は ValueError
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = set()
+    for member in if_match.split(","):
+        member = member.strip()
+        if not member:
+            continue  # RFC 9110 の #rule は空の要素を許す
+        if not _ENTITY_TAG.fullmatch(member):
+            raise ValueError(f"Invalid If-Match: {if_match}")
+        match = _TASK_ETAG.fullmatch(member)
+        if match and match[1] == current_board() and int(match[2]) == task_id:
+            versions.add(int(match[3]))
+    return versions
+
+
+def http_date(changed_at: Optional[str]) -> Optional[str]:
+    """SQLiteの CURRENT_TIMESTAMP（UTC）をHTTP日付に変換"""
+    if not changed_at:
+        return None
+    moment = datetime.fromisoformat(changed_at).replace(tzinfo=timezone.utc)
+    return format_datetime(moment, usegmt=True)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # 弱い比較（W/ の有無は無視する）
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[str] = None) -> bool:
+    """If-None-Match / If-Modified-Since でクライアントの内容が最新か判定する"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match があるときは If-Modified-Since を見ない（RFC 9110）
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[str] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+
+def not_modified_response(etag: str, last_modified: Optional[str] = None) -> Response:
+    """304 Not Modified（本体なし）"""
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
@@ -1,93 +1,492 @@
 # データベース接続・操作
 # 後で実装します
 
+import base64
+import contextvars
+import json
+import logging
+import os
+import re
 import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from datetime import date, timedelta
 from typing import Optional
 
+from app.cache import LRUCache
+from app.metrics import connection_factory
+from app.migrations import run_migrations
+from app.pool import ConnectionPool, PoolClosed, retry_on_busy
+
+logger = logging.getLogger(__name__)
+
 DATABASE = "tasks.db"
 
+# リクエストごとのデータベースファイル（ボード）。未設定なら DATABASE
+# DBスレッドにもコンテキストごと引き継がれる（app.async_database）
+_current_database = contextvars.ContextVar("current_database", default=None)
+
+# 接続プールの設定（環境変数で上書き可能）
+POOL_SIZE = int(os.environ.get("TASKS_DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.environ.get("TASKS_DB_POOL_TIMEOUT", "5.0"))
+
+# 接続ごとに一度だけ適用するPRAGMA
+CONNECTION_PRAGMAS = {
+    "foreign_keys": "ON",
+}
+
+# ストレージプロファイル（TASKS_DB_PROFILE で選択）
+# journal_mode はファイルに永続化されるので init_db で一度だけ設定する
+STORAGE_PROFILES = {
+    # SQLite既定（rollback journal）。書き込み中は読み込みも待たされる
+    "default": {},
+    # WAL: 書き込み中も読み込みが並行して進む。NORMALはWALなら電源断でも壊れない
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16000,  # 負の値はKiB単位（約16MB）
+        "temp_store": "MEMORY",
+    },
+}
+STORAGE_PROFILE = os.environ.get("TASKS_DB_PROFILE", "wal")
+
+# ロック待ちの設定: busy_timeout で待ち、それでも SQLITE_BUSY なら再試行する
+BUSY_TIMEOUT_MS = int(os.environ.get("TASKS_DB_BUSY_TIMEOUT_MS", "5000"))
+BUSY_RETRIES = int(os.environ.get("TASKS_DB_BUSY_RETRIES", "5"))
+
+# 並び順の間隔。移動は前後の行の中間値を書き込むだけで済み、
+# 間隔が詰まったときだけ象限全体を振り直す
+POSITION_GAP = 1024
+
+# 一覧APIのページサイズ
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 象限の一覧・タスク詳細の読み込みキャッシュ（TASKS_CACHE_SIZE=0 で無効）
+CACHE_SIZE = int(os.environ.get("TASKS_CACHE_SIZE", "1024"))
+task_cache = LRUCache(CACHE_SIZE)
+
+# データベースファイルごとの接続プール（最近使った順。上限を超えたら古いものから閉じる）
+MAX_OPEN_DATABASES = int(os.environ.get("TASKS_MAX_OPEN_BOARDS", "64"))
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+# このプロセスでマイグレーション済みのデータベースファイル
+_initialized = set()
+_init_lock = threading.Lock()
+
+# 変更通知の購読者。書き込みのコミット後に listener(kind, quadrants, task_id) を
+# 書き込んだスレッドから呼ぶ（同じプロセス内の書き込みだけが通知される）
+#   "task":  タスクの内容だけが変わった（象限と並び順はそのまま）
+#   "board": 象限の並びや所属が変わった（quadrants は分かっている範囲の象限）
+_change_listeners = []
+
+def get_storage_profile() -> dict:
+    """現在のストレージプロファイルのPRAGMA"""
+    try:
+        return STORAGE_PROFILES[STORAGE_PROFILE]
+    except KeyError:
+        raise ValueError(f"Unknown storage profile: {STORAGE_PROFILE}") from None
+
+def configure_connection(conn: sqlite3.Connection):
+    """新しい接続にPRAGMAと行ファクトリ（カラム名でアクセスできる sqlite3.Row）を設定"""
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    for name, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    for name, value in get_storage_profile().items():
+        if name != "journal_mode":
+            conn.execute(f"PRAGMA {name} = {value}")
+
+# 書き込み関数用: SQLITE_BUSY のときは指数バックオフで再試行
+retry_writes = retry_on_busy(lambda: BUSY_RETRIES)
+
+def current_database() -> str:
+    """現在のリクエスト（ボード）のデータベースファイル"""
+    return _current_database.get() or DATABASE
+
+@contextmanager
+def use_database(database: str):
+    """with文の中の読み書きを database のファイルに向ける"""
+    token = _current_database.set(database)
+    try:
+        yield database
+    finally:
+        _current_database.reset(token)
+
 def get_connection():
-    conn = sqlite3.connect(DATABASE)
+    """プールを使わない単発の接続（呼び出し側で close すること）"""
+    conn = sqlite3.connect(current_database(), factory=connection_factory())
+    configure_connection(conn)
     return conn
 
+def get_pool(database: Optional[str] = None) -> ConnectionPool:
+    """データベースファイルに対応する接続プールを取得（なければ作成）
+
+    開いておくプールは MAX_OPEN_DATABASES 個まで。超えたら最も長く使われていないプールを閉じる
+    （貸出中の接続は返却時に閉じられ、次に使うときにプールを作り直す）。
+    """
+    database = database or current_database()
+    evicted = None
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is not None:
+            _pools.move_to_end(database)
+            return pool
+        pool = ConnectionPool(database, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                              on_connect=configure_connection, factory=connection_factory())
+        _pools[database] = pool
+        if len(_pools) > max(1, MAX_OPEN_DATABASES):
+            _, evicted = _pools.popitem(last=False)
+    if evicted is not None:
+        evicted.close()
+    return pool
+
+def open_databases() -> list:
+    """接続プールを開いているデータベースファイル（最近使った順）"""
+    with _pools_lock:
+        return list(reversed(_pools))
+
+def initialized_databases() -> list:
+    """このプロセスでマイグレーション済みのデータベースファイル"""
+    return sorted(_initialized)
+
+@contextmanager
+def connection():
+    """現在のデータベース（ボード）のプールから接続を借りる"""
+    with ExitStack() as stack:
+        try:
+            conn = stack.enter_context(get_pool().connection())
+        except PoolClosed:
+            # 借りる直前に上限超えで閉じられたプール。作り直したプールから借りる
+            conn = stack.enter_context(get_pool().connection())
+        yield conn
+
+def add_change_listener(listener):
+    _change_listeners.append(listener)
+
+def remove_change_listener(listener):
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+def _notify(kind: str, quadrants, task_id: Optional[int] = None):
+    for listener in list(_change_listeners):
+        try:
+            listener(kind, tuple(quadrants), task_id)
+        except Exception:
+            # 通知の失敗で書き込みを失敗させない
+            logger.exception("change listener failed")
+
+def close_pools():
+    """すべての接続プールを閉じる（アプリ終了時・テスト後に呼ぶ）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _initialized.clear()
+    for pool in pools:
+        pool.close()
+    task_cache.clear()
+
 def init_db():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            quadrant INTEGER NOT NULL CHECK(quadrant IN (1, 2, 3, 4)),
-            position INTEGER DEFAULT 0,
-            completed BOOLEAN DEFAULT 0,
-            due_date TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # positionカラムが存在しない場合は追加（マイグレーション）
-    cursor.execute('PRAGMA table_info(tasks)')
-    columns = [column[1] for column in cursor.fetchall()]
-    if 'position' not in columns:
-        cursor.execute('ALTER TABLE tasks ADD COLUMN position INTEGER DEFAULT 0')
-    
-    conn.commit()
-    conn.close()
+    """スキーマを最新バージョンまでマイグレーション（起動時に一度呼ぶ）
+    適用したマイグレーションの一覧を返す
+    """
+    # 同じパスに作り直されたデータベースの古いエントリを使わないように
+    task_cache.clear()
+    with connection() as conn:
+        journal_mode = get_storage_profile().get("journal_mode")
+        if journal_mode:
+            conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        applied = run_migrations(conn)
+    _initialized.add(current_database())
+    return applied
+
+def is_initialized() -> bool:
+    """現在のデータベースがこのプロセスでマイグレーション済みか"""
+    return current_database() in _initialized
+
+def ensure_db() -> bool:
+    """現在のデータベース（ボード）をこのプロセスで初めて使うときにマイグレーションする
+    ファイルがなければディレクトリごと作る。マイグレーションした場合は True
+    """
+    database = current_database()
+    if database in _initialized:
+        return False
+    with _init_lock:
+        if database in _initialized:
+            return False
+        directory = os.path.dirname(database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        init_db()
+        return True
+
+@retry_writes
+def insert_task(title: str, description: Optional[str], quadrant: int, due_date: Optional[str] = None):
+    """新しいタスクを作成し、作成した行を返す（1文で実行）"""
+    with connection() as conn:
+        # 同じ象限の末尾（最大position + 間隔）を同じ文の中で求める
+        rows = conn.execute('''
+            INSERT INTO tasks (title, description, quadrant, position, due_date)
+            SELECT ?, ?, ?, COALESCE(MAX(position) + ?, 0), ?
+            FROM tasks WHERE quadrant = ?
+            RETURNING *
+        ''', (title, description, quadrant, POSITION_GAP, due_date, quadrant)).fetchall()
+        conn.commit()
+    _notify("board", (quadrant,), rows[0]["id"])
+    return rows[0]
 
 def create_task(title: str, description: Optional[str], quadrant: int, due_date: Optional[str] = None):
-    """新しいタスクを作成"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    # 同じ象限内の最大positionを取得して+1
-    cursor.execute('SELECT COALESCE(MAX(position), -1) FROM tasks WHERE quadrant = ?', (quadrant,))
-    max_position = cursor.fetchone()[0]
-    new_position = max_position + 1
-    
-    cursor.execute('''
-        INSERT INTO tasks (title, description, quadrant, position, due_date)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (title, description, quadrant, new_position, due_date))
-    task_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return task_id
+    """新しいタスクを作成してIDを返す"""
+    return insert_task(title, description, quadrant, due_date)[0]
 
 def get_all_tasks():
     """すべてのタスクを取得"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks ORDER BY quadrant, position, created_at')
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM tasks ORDER BY quadrant, position, created_at')
+        return cursor.fetchall()
+
+def encode_cursor(row) -> str:
+    """行の並び順キー (quadrant, position, created_at, id) を不透明なカーソル文字列にする"""
+    key = [row["quadrant"], row["position"], row["created_at"], row["id"]]
+    data = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    """encode_cursor の逆変換。不正なカーソルは ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        quadrant, position, created_at, task_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    # JSON の true/false は bool（int のサブクラス）になるので除く
+    if not (all(isinstance(value, int) and not isinstance(value, bool) for value in (quadrant, position, task_id))
+            and isinstance(created_at, str)):
+        raise ValueError("Invalid cursor")
+    return quadrant, position, created_at, task_id
+
+def list_tasks(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+               quadrant: Optional[int] = None, completed: Optional[bool] = None,
+               due_from: Optional[str] = None, due_to: Optional[str] = None):
+    """ボードの並び順 (quadrant, position, created_at, id) でキーセットページング
+    (行のリスト, 次ページのカーソル or None) を返す
+    """
+    conditions = []
+    params = []
+    # 並び順のインデックスを辿りながら絞り込む（+ を付けて他のインデックスを使わせない）
+    if completed is not None:
+        conditions.append("+completed = ?")
+        params.append(int(completed))
+    if due_from is not None:
+        conditions.append("+due_date >= ?")
+        params.append(due_from)
+    if due_to is not None:
+        conditions.append("+due_date <= ?")
+        params.append(due_to)
+    if quadrant is not None:
+        conditions.append("quadrant = ?")
+        params.append(quadrant)
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        if quadrant is not None:
+            conditions.append("(position, created_at, id) > (?, ?, ?)")
+            params.extend(after[1:])
+        else:
+            conditions.append("(quadrant, position, created_at, id) > (?, ?, ?, ?)")
+            params.extend(after)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT * FROM tasks {where} ORDER BY quadrant, position, created_at, id LIMIT ?"
+    params.append(limit + 1)  # 1件多く読んで次ページの有無を判定
+    with connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+def _generations(conn: sqlite3.Connection) -> dict:
+    return dict(conn.execute('SELECT quadrant, generation FROM quadrant_generations').fetchall())
+
+def get_generations() -> dict:
+    """象限ごとの世代番号 {quadrant: generation}。象限のタスクが変わるたびに増える"""
+    with connection() as conn:
+        return _generations(conn)
+
+def get_generation_states() -> dict:
+    """象限ごとの (世代番号, 最終変更時刻) {quadrant: (generation, changed_at)}
+    HTTPの条件付きGETの検証子に使う
+    """
+    with connection() as conn:
+        rows = conn.execute('SELECT quadrant, generation, changed_at FROM quadrant_generations').fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+def get_task_state(task_id: int):
+    """タスクの (version, changed_at)。changed_at は属する象限の最終変更時刻。存在しない場合はNone"""
+    with connection() as conn:
+        return conn.execute('''
+            SELECT t.version, g.changed_at
+            FROM tasks AS t JOIN quadrant_generations AS g ON g.quadrant = t.quadrant
+            WHERE t.id = ?
+        ''', (task_id,)).fetchone()
 
 def get_tasks_by_quadrant(quadrant: int):
-    """指定された象限のタスクを順序付きで取得"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks WHERE quadrant = ? ORDER BY position, created_at', (quadrant,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    """指定された象限のタスクを順序付きで取得（世代番号が変わるまでキャッシュ）"""
+    with connection() as conn:
+        # 世代番号を先に読む（行を読んだ後に変わっても、次の読み込みで必ず検出される）
+        row = conn.execute('SELECT generation FROM quadrant_generations WHERE quadrant = ?',
+                           (quadrant,)).fetchone()
+        generation = row[0] if row else None
+        key = (current_database(), "quadrant", quadrant)
+        if generation is not None:
+            rows = task_cache.get(key, generation)
+            if rows is not None:
+                return list(rows)
+        rows = conn.execute('SELECT * FROM tasks WHERE quadrant = ? ORDER BY position, created_at',
+                            (quadrant,)).fetchall()
+    if generation is not None:
+        task_cache.put(key, generation, rows)
+    return list(rows)
+
+def get_board(use_cache: bool = True) -> dict:
+    """4象限すべてのタスクを {quadrant: [行, ...]} で取得（象限ごとに世代番号が変わるまでキャッシュ）
+    キャッシュにない象限は、象限順の1回のスキャンでまとめて読む
+    use_cache=False はキャッシュを使わずに全象限を読む（読み込み時間の計測用）
+    """
+    board = {}
+    with connection() as conn:
+        generations = _generations(conn)
+        for quadrant in sorted(generations) if use_cache else ():
+            rows = task_cache.get((current_database(), "quadrant", quadrant), generations[quadrant])
+            if rows is not None:
+                board[quadrant] = list(rows)
+        missing = [quadrant for quadrant in sorted(generations) if quadrant not in board]
+        if missing:
+            placeholders = ", ".join("?" * len(missing))
+            rows = conn.execute(f'''
+                SELECT * FROM tasks WHERE quadrant IN ({placeholders})
+                ORDER BY quadrant, position, created_at
+            ''', missing).fetchall()
+    if missing:
+        scanned = {quadrant: [] for quadrant in missing}
+        for row in rows:
+            scanned[row["quadrant"]].append(row)
+        for quadrant, quadrant_rows in scanned.items():
+            task_cache.put((current_database(), "quadrant", quadrant), generations[quadrant], quadrant_rows)
+            board[quadrant] = list(quadrant_rows)
+    return dict(sorted(board.items()))
 
 def get_task_by_id(task_id: int):
-    """IDでタスクを取得"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
-    row = cursor.fetchone()
-    conn.close()
+    """IDでタスクを取得（タスクの象限の世代番号が変わるまでキャッシュ）"""
+    with connection() as conn:
+        generations = _generations(conn)
+        key = (current_database(), "task", task_id)
+        row = task_cache.get_if(key, lambda stored: generations.get(stored[0]) == stored[1])
+        if row is not None:
+            return row
+        row = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    if row is not None:
+        quadrant = row["quadrant"]
+        task_cache.put(key, (quadrant, generations.get(quadrant)), row)
     return row
 
+# 期限のビュー（未完了のタスクを4象限をまたいで期限の近い順に）
+DUE_VIEWS = ("overdue", "today", "week")
+# 「次の期限」としてキャッシュしておく件数
+NEXT_DUE_LIMIT = 10
+
+def _due_condition(view: str, today: str) -> tuple:
+    """ビューの期限の範囲（today は YYYY-MM-DD。week は今日から7日間）"""
+    if view == "overdue":
+        return "due_date < ?", [today]
+    if view == "today":
+        return "due_date = ?", [today]
+    if view == "week":
+        last_day = (date.fromisoformat(today) + timedelta(days=6)).isoformat()
+        return "due_date BETWEEN ? AND ?", [today, last_day]
+    raise ValueError(f"unknown due view: {view}")
+
+def get_due_tasks(view: str, today: str, limit: int = DEFAULT_PAGE_SIZE) -> list:
+    """期限のビューのタスク（(completed, due_date, quadrant) のインデックスの範囲だけを読む）"""
+    condition, params = _due_condition(view, today)
+    with connection() as conn:
+        return conn.execute(f'''
+            SELECT * FROM tasks
+            WHERE completed = 0 AND {condition}
+            ORDER BY due_date, quadrant
+            LIMIT ?
+        ''', [*params, limit]).fetchall()
+
+def _board_version(conn: sqlite3.Connection) -> tuple:
+    return tuple(sorted(_generations(conn).items()))
+
+def get_overdue_counts(today: str) -> dict:
+    """象限ごとの期限切れ（未完了）の件数 {quadrant: count}
+    インデックスだけで数え、日付とボードの世代番号が変わるまでキャッシュする
+    """
+    with connection() as conn:
+        version = _board_version(conn)
+        key = (current_database(), "overdue", today)
+        counts = task_cache.get(key, version)
+        if counts is None:
+            counts = {quadrant: 0 for quadrant in (1, 2, 3, 4)}
+            counts.update(conn.execute('''
+                SELECT quadrant, count(*) FROM tasks
+                WHERE completed = 0 AND due_date < ?
+                GROUP BY quadrant
+            ''', (today,)).fetchall())
+            task_cache.put(key, version, counts)
+    return dict(counts)
+
+def get_next_due(today: str, limit: int = NEXT_DUE_LIMIT) -> list:
+    """今日以降で期限が最も近い未完了のタスク（「次の期限」の表示用）
+    日付ごとに先頭の NEXT_DUE_LIMIT 件を期限順の索引として持っておき、
+    ボードが変わるまでは表示のたびにタスクを読まない
+    """
+    with connection() as conn:
+        version = _board_version(conn)
+        key = (current_database(), "next_due", today)
+        rows = task_cache.get(key, version)
+        if rows is None:
+            rows = conn.execute('''
+                SELECT * FROM tasks
+                WHERE completed = 0 AND due_date >= ?
+                ORDER BY due_date, quadrant
+                LIMIT ?
+            ''', (today, NEXT_DUE_LIMIT)).fetchall()
+            task_cache.put(key, version, rows)
+    return list(rows[:limit])
+
+class VersionConflict(Exception):
+    """書き込みの前提にしたバージョンが古い（他のタブや利用者が先に更新した）
+
+    current は現在の行（並べ替えでは象限の行のリスト）。呼び出し側はこれを返して読み直させる。
+    """
+
+    def __init__(self, current):
+        super().__init__("version conflict")
+        self.current = current
+
+def _check_version(conn: sqlite3.Connection, task_id: int, rows: list, expected_version: Optional[int]):
+    """バージョンつきの書き込みが0行だったとき、タスクが存在すれば（= バージョンが違えば）現在の行を返す"""
+    if rows or expected_version is None:
+        return None
+    return conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+
+def _raise_conflict(current):
+    if current is not None:
+        raise VersionConflict(current)
+
+@retry_writes
 def update_task(task_id: int, title: Optional[str] = None, description: Optional[str] = None, 
                 quadrant: Optional[int] = None, position: Optional[int] = None, 
-                completed: Optional[bool] = None, due_date: Optional[str] = None):
-    """タスクを更新"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+                completed: Optional[bool] = None, due_date: Optional[str] = None,
+                expected_version: Optional[int] = None):
+    """タスクを更新し、更新後の行を返す（存在しない場合はNone）
+    expected_version を指定すると、現在のバージョンが一致するときだけ更新する（違えば VersionConflict）
+    """
     # 更新するフィールドを動的に構築
     updates = []
     params = []
@@ -111,38 +510,496 @@ def update_task(task_id: int, title: Optional[str] = None, description: Optional
         updates.append("due_date = ?")
         params.append(due_date)
     
-    # updated_atを更新
+    # updated_atとバージョンを更新
     updates.append("updated_at = CURRENT_TIMESTAMP")
+    updates.append("version = version + 1")
     params.append(task_id)
+    condition = ""
+    if expected_version is not None:
+        condition = " AND version = ?"
+        params.append(expected_version)
     
-    if updates:
-        query = f"UPDATE tasks SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
+    query = f"UPDATE tasks SET {', '.join(updates)} WHERE id = ?{condition} RETURNING *"
+    with connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+        current = _check_version(conn, task_id, rows, expected_version)
         conn.commit()
-    
-    conn.close()
+    if not rows:
+        _raise_conflict(current)
+        return None
+    # 象限や並び順を指定した場合は移動したかもしれない（移動元は通知側で世代番号から分かる）
+    kind = "task" if quadrant is None and position is None else "board"
+    _notify(kind, (rows[0]["quadrant"],), task_id)
+    return rows[0]
+
+@retry_writes
+def move_task_to_quadrant(task_id: int, quadrant: int, expected_version: Optional[int] = None):
+    """タスクを別の象限の末尾へ移動し、更新後の行を返す（存在しない場合はNone）
+    expected_version は update_task と同じ
+    """
+    params = [quadrant, POSITION_GAP, quadrant, task_id]
+    condition = ""
+    if expected_version is not None:
+        condition = " AND version = ?"
+        params.append(expected_version)
+    with connection() as conn:
+        rows = conn.execute(f'''
+            UPDATE tasks
+            SET quadrant = ?,
+                position = (SELECT COALESCE(MAX(position) + ?, 0) FROM tasks WHERE quadrant = ?),
+                updated_at = CURRENT_TIMESTAMP,
+                version = version + 1
+            WHERE id = ?{condition}
+            RETURNING *
+        ''', params).fetchall()
+        current = _check_version(conn, task_id, rows, expected_version)
+        conn.commit()
+    if not rows:
+        _raise_conflict(current)
+        return None
+    _notify("board", (quadrant,), task_id)
+    return rows[0]
+
+def _neighbor_positions(conn: sqlite3.Connection, task_id: int, quadrant: int,
+                        before_id: Optional[int], after_id: Optional[int]):
+    """移動先の前後の行のposition (prev, next) を返す。端の場合はNone"""
+    def position_of(neighbor_id):
+        row = conn.execute('SELECT position FROM tasks WHERE id = ? AND quadrant = ? AND id != ?',
+                           (neighbor_id, quadrant, task_id)).fetchone()
+        return row[0] if row else None
+
+    next_position = position_of(before_id) if before_id is not None else None
+    prev_position = position_of(after_id) if after_id is not None else None
+    if next_position is not None:
+        row = conn.execute('SELECT MAX(position) FROM tasks WHERE quadrant = ? AND position < ? AND id != ?',
+                           (quadrant, next_position, task_id)).fetchone()
+        return row[0], next_position
+    if prev_position is not None:
+        row = conn.execute('SELECT MIN(position) FROM tasks WHERE quadrant = ? AND position > ? AND id != ?',
+                           (quadrant, prev_position, task_id)).fetchone()
+        return prev_position, row[0]
+    # 基準の行がない（指定なし・既に削除された）場合は末尾
+    row = conn.execute('SELECT MAX(position) FROM tasks WHERE quadrant = ? AND id != ?',
+                       (quadrant, task_id)).fetchone()
+    return row[0], None
+
+def _rebalance_quadrant(conn: sqlite3.Connection, quadrant: int):
+    """象限のpositionを間隔を空けて振り直す（間隔が詰まったときだけ呼ばれる）"""
+    conn.execute('''
+        UPDATE tasks SET position = ranked.rank * ?
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY position, created_at, id) - 1 AS rank
+            FROM tasks WHERE quadrant = ?
+        ) AS ranked
+        WHERE tasks.id = ranked.id AND tasks.position != ranked.rank * ?
+    ''', (POSITION_GAP, quadrant, POSITION_GAP))
 
-def update_task_positions(quadrant: int, task_positions: list):
-    """象限内のタスクの順序を一括更新
+@retry_writes
+def move_task(task_id: int, quadrant: int, before_id: Optional[int] = None, after_id: Optional[int] = None,
+              expected_version: Optional[int] = None):
+    """タスクを象限内の指定位置へ移動し、更新後の行を返す（存在しない場合はNone）
+
+    before_id の直前、または after_id の直後に置く（どちらもなければ末尾）。
+    通常は移動するタスク1行だけを書き込む。expected_version は update_task と同じ
+    """
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        if expected_version is not None:
+            # 前後の行を読む前に確かめる（BEGIN IMMEDIATE の中なので、この後に他から変わることはない）
+            current = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            if current is not None and current["version"] != expected_version:
+                conn.rollback()
+                raise VersionConflict(current)
+        for attempt in range(2):
+            prev_position, next_position = _neighbor_positions(conn, task_id, quadrant, before_id, after_id)
+            if prev_position is None and next_position is None:
+                position = 0
+            elif next_position is None:
+                position = prev_position + POSITION_GAP
+            elif prev_position is None:
+                position = next_position - POSITION_GAP
+            elif next_position - prev_position >= 2:
+                position = (prev_position + next_position) // 2
+            elif attempt == 0:
+                # 間に入る隙間がないので振り直してからもう一度求める
+                _rebalance_quadrant(conn, quadrant)
+                continue
+            else:
+                raise RuntimeError("no room to move task after rebalancing")
+            break
+
+        rows = conn.execute('''
+            UPDATE tasks SET quadrant = ?, position = ?, updated_at = CURRENT_TIMESTAMP, version = version + 1
+            WHERE id = ?
+            RETURNING *
+        ''', (quadrant, position, task_id)).fetchall()
+        conn.commit()
+    if not rows:
+        return None
+    _notify("board", (quadrant,), task_id)
+    return rows[0]
+
+# 1文あたりの (id, position) の組数（SQLiteの変数上限 32766 に収まるように）
+REORDER_CHUNK_SIZE = 5000
+
+@retry_writes
+def update_task_positions(quadrant: int, task_positions: list, expected_versions: Optional[dict] = None):
+    """象限内のタスクの順序を一括更新し、並べ替え後の象限の行を返す
     task_positions: [(task_id, position), ...] の形式
+    expected_versions: {task_id: version}。1件でも現在のバージョンと違う（象限にない）場合は
+    何も書かずに VersionConflict（current は現在の象限の行）
+
+    - 指定した象限に属さないIDは無視する
+    - positionが実際に変わった行だけを書き込む（updated_atとバージョンもその行だけ更新）
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    for task_id, position in task_positions:
-        cursor.execute('UPDATE tasks SET position = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?', 
-                      (position, task_id))
-    
-    conn.commit()
-    conn.close()
-
-def delete_task(task_id: int):
-    """タスクを削除"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        # 読み込みから書き込みまで他の書き込みが割り込まないようにする
+        conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute('SELECT * FROM tasks WHERE quadrant = ?', (quadrant,)).fetchall()
+        if expected_versions:
+            versions = {row["id"]: row["version"] for row in rows}
+            if any(versions.get(int(task_id)) != version for task_id, version in expected_versions.items()):
+                conn.rollback()
+                rows.sort(key=lambda row: (row["position"], row["created_at"], row["id"]))
+                raise VersionConflict(rows)
+        current = {row["id"]: row["position"] for row in rows}
+        changes = []
+        for task_id, position in task_positions:
+            task_id, position = int(task_id), int(position)
+            if task_id in current and current[task_id] != position:
+                changes.append((task_id, position))
+
+        updated = {}
+        for start in range(0, len(changes), REORDER_CHUNK_SIZE):
+            chunk = changes[start:start + REORDER_CHUNK_SIZE]
+            values = ", ".join(["(?, ?)"] * len(chunk))
+            params = [value for pair in chunk for value in pair]
+            for row in conn.execute(f'''
+                UPDATE tasks
+                SET position = v.column2, updated_at = CURRENT_TIMESTAMP, version = version + 1
+                FROM (VALUES {values}) AS v
+                WHERE tasks.id = v.column1 AND tasks.quadrant = ?
+                RETURNING *
+            ''', params + [quadrant]):
+                updated[row["id"]] = row
+        conn.commit()
+    if updated:
+        _notify("board", (quadrant,))
+
+    rows = [updated.get(row["id"], row) for row in rows]
+    rows.sort(key=lambda row: (row["position"], row["created_at"], row["id"]))
+    return rows
+
+@retry_writes
+def delete_task(task_id: int) -> bool:
+    """タスクを削除。削除した場合はTrue、存在しなかった場合はFalse"""
+    with connection() as conn:
+        rows = conn.execute('DELETE FROM tasks WHERE id = ? RETURNING quadrant', (task_id,)).fetchall()
+        conn.commit()
+    if not rows:
+        return False
+    _notify("board", (rows[0][0],), task_id)
+    return True
+
+# 全文検索の件数
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# 一致箇所を囲む印（HTMLにするときに <mark> に置き換える）
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+# 説明から一致箇所の前後を切り出す長さ（文字数）
+SNIPPET_WIDTH = 48
+# trigram の索引で引ける最短の語の長さ
+MIN_INDEXED_TERM = 3
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _mark(pattern: re.Pattern, text: str) -> str:
+    return pattern.sub(lambda match: HIGHLIGHT_START + match.group(0) + HIGHLIGHT_END, text)
+
+def _snippet(pattern: re.Pattern, text: Optional[str]) -> Optional[str]:
+    """説明のうち最初の一致の前後だけを切り出す（一致しなければ None）"""
+    match = pattern.search(text or "")
+    if match is None:
+        return None
+    start = max(0, match.start() - SNIPPET_WIDTH // 4)
+    end = start + SNIPPET_WIDTH
+    return ("…" if start else "") + _mark(pattern, text[start:end]) + ("…" if end < len(text) else "")
+
+def search_tasks(text: str, limit: int = SEARCH_LIMIT) -> list:
+    """タイトルと説明を全文検索する
+
+    空白で区切った語をすべて含むタスクを、タイトルに一致するものを先に、それぞれ新しい順で返す。
+    bm25 は一致する全行を数えてから並べるので、よく使う語では件数に比例して遅くなる。
+    ここでは索引を rowid の降順に読んで limit 件で打ち切るため、一致件数に関係なく速い。
+    行は tasks のカラムに加えて、一致箇所を HIGHLIGHT_START / HIGHLIGHT_END で囲んだ
+    title_highlight と description_snippet（説明に一致しなければ None）を持つ辞書。
+    3文字未満の語は trigram の索引を引けないので、索引で引いた行を LIKE で絞り込むのに使う。
+    短い語だけの場合は全行の走査になり、まれな語ほど遅くなるので検索しない（空のリストを返す）。
+    """
+    terms = text.split()
+    indexed = [term for term in terms if len(term) >= MIN_INDEXED_TERM]
+    if not indexed:
+        return []
+    conditions = []
+    params = []
+    for term in terms:
+        if len(term) < MIN_INDEXED_TERM:
+            conditions.append("(tasks.title LIKE ? ESCAPE '\\' OR tasks.description LIKE ? ESCAPE '\\')")
+            params.extend([_like_pattern(term)] * 2)
+    where = "".join(f" AND {condition}" for condition in conditions)
+
+    with connection() as conn:
+        # 語ごとにフレーズとして引用する（FTS5の演算子として解釈させない）
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in indexed)
+        ids = []
+        for expression in (f"title : ({match})", match):
+            found = conn.execute(f'''
+                SELECT tasks_fts.rowid FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid
+                WHERE tasks_fts MATCH ?{where}
+                ORDER BY tasks_fts.rowid DESC
+                LIMIT ?
+            ''', [expression, *params, limit + len(ids)]).fetchall()
+            ids.extend(row[0] for row in found if row[0] not in ids)
+            if len(ids) >= limit:
+                break
+        ids = ids[:limit]
+        by_id = {row["id"]: row for row in conn.execute(
+            "SELECT * FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))}
+        rows = [by_id[task_id] for task_id in ids if task_id in by_id]
+
+    # trigram の索引と同じく大文字小文字を区別せずに印を付ける
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    results = []
+    for row in rows:
+        result = dict(row)
+        result["title_highlight"] = _mark(pattern, row["title"])
+        result["description_snippet"] = _snippet(pattern, row["description"])
+        results.append(result)
+    return results
+
+# 一括操作の1リクエストあたりの上限
+MAX_BULK_ITEMS = 10000
+# IN (...) に並べるIDの数（SQLiteの変数上限 32766 に収まるように）
+BULK_CHUNK_SIZE = 5000
+# 一括更新で変更できるフィールド
+BULK_UPDATE_FIELDS = ("title", "description", "quadrant", "completed", "due_date")
+
+def _task_quadrants(conn: sqlite3.Connection, task_ids) -> dict:
+    """存在するタスクの {id: quadrant}"""
+    ids = list(dict.fromkeys(task_ids))
+    found = {}
+    for start in range(0, len(ids), BULK_CHUNK_SIZE):
+        chunk = ids[start:start + BULK_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        found.update(conn.execute(f'SELECT id, quadrant FROM tasks WHERE id IN ({placeholders})', chunk))
+    return found
+
+def _next_positions(conn: sqlite3.Connection) -> dict:
+    """象限ごとの末尾の次のposition {quadrant: position}（タスクのない象限は含まない）"""
+    # GROUP BY はインデックス全体を走査するので、象限ごとに末尾を1回ずつ引く
+    positions = {}
+    for quadrant in (1, 2, 3, 4):
+        row = conn.execute('SELECT MAX(position) FROM tasks WHERE quadrant = ?', (quadrant,)).fetchone()
+        if row[0] is not None:
+            positions[quadrant] = row[0] + POSITION_GAP
+    return positions
+
+def _insert_rows(conn: sqlite3.Connection, tasks: list):
+    """タスクを各象限の末尾に入力の順で追加する（positionは象限ごとに一度だけ求める）
+    書き込みのトランザクションの中で呼ぶ。全文検索の索引には行ごとのトリガーではなく最後にまとめて追加する
+    """
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM tasks').fetchone()[0]
+    next_positions = _next_positions(conn)
+    params = []
+    for task in tasks:
+        quadrant = task["quadrant"]
+        position = next_positions.get(quadrant, 0)
+        next_positions[quadrant] = position + POSITION_GAP
+        params.append((task["title"], task.get("description"), quadrant, position,
+                       bool(task.get("completed")), task.get("due_date")))
+    conn.execute('INSERT INTO tasks_fts_deferred (id) VALUES (1)')
+    conn.executemany('''
+        INSERT INTO tasks (title, description, quadrant, position, completed, due_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', params)
+    conn.execute('DELETE FROM tasks_fts_deferred')
+    # 書き込みロックを持っているので、last_id より後の行はすべてここで追加したもの
+    conn.execute('''
+        INSERT INTO tasks_fts (rowid, title, description)
+        SELECT id, title, description FROM tasks WHERE id > ?
+    ''', (last_id,))
+
+@retry_writes
+def bulk_insert_tasks(tasks: list) -> list:
+    """複数のタスクを1トランザクションで作成し、作成したIDを入力の順に返す
+    tasks: [{"title", "description", "quadrant", "completed", "due_date"}, ...]
+
+    各象限の末尾に入力の順で追加する。
+    """
+    if not tasks:
+        return []
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM tasks').fetchone()[0]
+        _insert_rows(conn, tasks)
+        # 書き込みロックを持っているので、last_id より後のIDはすべてこの一括作成のもの
+        ids = [row[0] for row in conn.execute('SELECT id FROM tasks WHERE id > ? ORDER BY id', (last_id,))]
+        conn.commit()
+    _notify("board", sorted({task["quadrant"] for task in tasks}))
+    return ids
+
+@retry_writes
+def import_task_chunk(tasks: list) -> int:
+    """インポート用: 複数のタスクを1トランザクションで追加し、件数を返す
+    IDの読み戻しと変更通知はしない（インポートの最後に notify_board_changed を呼ぶ）
+    """
+    if not tasks:
+        return 0
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        _insert_rows(conn, tasks)
+        conn.commit()
+    return len(tasks)
+
+def notify_board_changed(quadrants):
+    """まとめて書き込んだ後に、象限の変更を購読者に通知する"""
+    _notify("board", sorted(quadrants))
+
+@retry_writes
+def bulk_update_tasks(patches: list) -> list:
+    """複数のタスクを1トランザクションで部分更新し、入力ごとにタスクが存在したかを返す
+    patches: [{"id": ..., 変更するフィールドだけ}, ...]
+
+    - 同じIDが複数あれば、後の入力のフィールドで上書きしてまとめる
+    - 別の象限に移るタスクは移動先の末尾に置く
+    - 変更するフィールドの組ごとに executemany で書き込む
+    """
+    merged = {}
+    for patch in patches:
+        merged.setdefault(patch["id"], {}).update(patch)
+
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        current = _task_quadrants(conn, merged)
+        next_positions = None
+        groups = {}  # 変更するカラムの組 -> パラメータのリスト
+        quadrants = set()
+        for task_id, patch in merged.items():
+            if task_id not in current:
+                continue
+            columns = [field for field in BULK_UPDATE_FIELDS if field in patch]
+            values = [patch[field] for field in columns]
+            quadrants.add(current[task_id])
+            quadrant = patch.get("quadrant")
+            if quadrant is not None and quadrant != current[task_id]:
+                if next_positions is None:
+                    next_positions = _next_positions(conn)
+                position = next_positions.get(quadrant, 0)
+                next_positions[quadrant] = position + POSITION_GAP
+                columns.append("position")
+                values.append(position)
+                quadrants.add(quadrant)
+            groups.setdefault(tuple(columns), []).append(values + [task_id])
+        for columns, params in groups.items():
+            assignments = "".join(f"{column} = ?, " for column in columns)
+            conn.executemany(f'UPDATE tasks SET {assignments}updated_at = CURRENT_TIMESTAMP, version = version + 1 '
+                             'WHERE id = ?', params)
+        conn.commit()
+    if quadrants:
+        _notify("board", sorted(quadrants))
+    return [patch["id"] in current for patch in patches]
+
+@retry_writes
+def bulk_delete_tasks(task_ids: list) -> list:
+    """複数のタスクを1トランザクションで削除し、入力ごとにタスクが存在したかを返す"""
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        current = _task_quadrants(conn, task_ids)
+        conn.executemany('DELETE FROM tasks WHERE id = ?', [(task_id,) for task_id in current])
+        conn.commit()
+    if current:
+        _notify("board", sorted(set(current.values())))
+    return [task_id in current for task_id in task_ids]
+
+# アーカイブ
+# 完了から時間がたったタスクを tasks_archive に移し、ボードが読む tasks を小さく保つ
+ARCHIVE_COLUMNS = "id, title, description, quadrant, position, completed, due_date, created_at, updated_at, version"
+
+@retry_writes
+def archive_completed_tasks(older_than_days: float, limit: int) -> int:
+    """最後の更新（完了）から older_than_days 日以上たった完了済みのタスクを、
+    古い順に最大 limit 件 tasks_archive に移して件数を返す
+    1回の呼び出しが1つの短いトランザクションなので、書き込みのロックを長く持たない
+    """
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        ids = [row[0] for row in conn.execute('''
+            SELECT id FROM tasks INDEXED BY idx_tasks_completed_updated_at
+            WHERE completed = 1 AND updated_at < datetime('now', ?)
+            ORDER BY updated_at
+            LIMIT ?
+        ''', (f"-{older_than_days} days", limit))]
+        if not ids:
+            conn.commit()
+            return 0
+        selected = json.dumps(ids)
+        conn.execute(f'''
+            INSERT INTO tasks_archive ({ARCHIVE_COLUMNS})
+            SELECT {ARCHIVE_COLUMNS} FROM tasks WHERE id IN (SELECT value FROM json_each(?))
+        ''', (selected,))
+        quadrants = {row[0] for row in conn.execute(
+            'DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?)) RETURNING quadrant', (selected,))}
+        conn.commit()
+    _notify("board", sorted(quadrants))
+    return len(ids)
+
+def _encode_archive_cursor(task_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([task_id]).encode()).rstrip(b"=").decode()
+
+def _decode_archive_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        (task_id,) = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    # decode_cursor と同じく、JSON の true/false（bool）は除く
+    if not isinstance(task_id, int) or isinstance(task_id, bool):
+        raise ValueError("Invalid cursor")
+    return task_id
+
+def list_archived_tasks(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                        quadrant: Optional[int] = None):
+    """アーカイブを新しいタスク（id の降順）からキーセットページングで読む
+    (行のリスト, 次ページのカーソル or None) を返す
+    """
+    conditions = []
+    params = []
+    if quadrant is not None:
+        conditions.append("quadrant = ?")
+        params.append(quadrant)
+    if cursor is not None:
+        conditions.append("id < ?")
+        params.append(_decode_archive_cursor(cursor))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append(limit + 1)
+    with connection() as conn:
+        rows = conn.execute(f"SELECT * FROM tasks_archive {where} ORDER BY id DESC LIMIT ?", params).fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, _encode_archive_cursor(rows[-1]["id"])
+    return rows, None
+
+def get_table_sizes() -> dict:
+    """ボードが読むタスク（うち完了済み）とアーカイブの件数"""
+    with connection() as conn:
+        return {
+            "tasks": conn.execute('SELECT count(*) FROM tasks').fetchone()[0],
+            "completed": conn.execute('SELECT count(*) FROM tasks WHERE completed = 1').fetchone()[0],
+            "archived": conn.execute('SELECT count(*) FROM tasks_archive').fetchone()[0],
+        }
 
 # 動作確認用
 
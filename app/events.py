@@ -0,0 +1,196 @@
+# サーバーからのプッシュ（Server-Sent Events）
+# 書き込みの通知を受けて、変わったカードか象限の一覧のHTMLを1回だけ描画し、
+# 接続中のすべてのクライアントに同じメッセージを配る。
+# 接続ごとに持つのは上限つきのキュー1つだけなので、待機中の接続は安い。
+# 通知は同じプロセス内の書き込みだけ（ワーカーが複数ある場合、他のワーカーの書き込みは
+# 次の通知か再接続時のボード再読み込みで反映される）。
+# 購読と配信はボード（データベースファイル）ごとに分け、他のボードの変更は届かない
+
+import asyncio
+import os
+from typing import Callable, Optional
+
+from app import database
+from app.async_database import get_board, get_generation_states, get_task_by_id
+
+# 何も送らない接続に送るコメント行の間隔（プロキシに切られないように）
+HEARTBEAT_INTERVAL = float(os.environ.get("TASKS_SSE_HEARTBEAT", "15"))
+# 接続ごとの未送信メッセージの上限。あふれたクライアントにはボードの再読み込みを指示する
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("TASKS_SSE_QUEUE_SIZE", "64"))
+# 切断されたクライアントが再接続するまでの待ち時間（ミリ秒）
+RETRY_MS = 3000
+
+
+def format_event(event: str, data: str = "", event_id: Optional[int] = None) -> str:
+    """SSEのメッセージ1件（複数行のデータは行ごとに data: を付ける）"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+RESYNC = format_event("refresh")
+KEEPALIVE = ": keepalive\n\n"
+
+
+class Broadcaster:
+    """購読者ごとのキューにメッセージを配る（イベントループのスレッドから使う）
+
+    購読者はボードごとのチャンネルに分かれる。channel を省略すると現在のボードのデータベースファイル。
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._channels = {}  # チャンネル -> 購読者のキューの集合
+        self.published = 0
+        self.resyncs = 0
+
+    def __len__(self):
+        return sum(len(subscribers) for subscribers in self._channels.values())
+
+    def count(self, channel: Optional[str] = None) -> int:
+        """チャンネルの購読者数"""
+        return len(self._channels.get(channel or database.current_database(), ()))
+
+    def subscribe(self, channel: Optional[str] = None) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self._channels.setdefault(channel or database.current_database(), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, channel: Optional[str] = None):
+        channel = channel or database.current_database()
+        subscribers = self._channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._channels[channel]
+
+    def _put(self, queue: asyncio.Queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # 追いつけないクライアントは溜まった分を捨てて、ボード全体を読み直させる
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC if message is not None else None)
+            self.resyncs += 1
+
+    def broadcast(self, message: str, channel: Optional[str] = None):
+        """チャンネルの全購読者に同じメッセージを送る（描画は呼び出し側で1回だけ行う）"""
+        self.published += 1
+        for queue in list(self._channels.get(channel or database.current_database(), ())):
+            self._put(queue, message)
+
+    def close(self):
+        """すべてのチャンネルのストリームを終わらせる（アプリ終了時）"""
+        for subscribers in list(self._channels.values()):
+            for queue in list(subscribers):
+                self._put(queue, None)
+
+    async def stream(self, heartbeat: float = HEARTBEAT_INTERVAL, channel: Optional[str] = None):
+        """1クライアント分のSSEストリーム"""
+        channel = channel or database.current_database()
+        queue = self.subscribe(channel)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(queue, channel)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self),
+            "channels": len(self._channels),
+            "published": self.published,
+            "resyncs": self.resyncs,
+        }
+
+
+class ChangeFeed:
+    """データベースの変更通知をHTMLの断片にしてブロードキャストする
+
+    通知は書き込みスレッドから届くので、イベントループに渡して届いた順に処理する。
+    世代番号を前回送った時点と比べて、移動元の象限など通知に含まれない変化も拾う。
+    世代番号とイベントIDはボード（データベースファイル）ごとに持つ。
+    """
+
+    def __init__(self, broadcaster: Broadcaster,
+                 render_card: Callable, render_board: Callable):
+        self.broadcaster = broadcaster
+        self.render_card = render_card    # 行 -> カードのHTML
+        self.render_board = render_board  # {quadrant: 行のリスト} -> hx-swap-oob のHTML
+        self._loop = None
+        self._boards = {}  # データベースファイル -> _BoardFeed
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.watch()
+        database.add_change_listener(self._on_change)
+
+    def stop(self):
+        database.remove_change_listener(self._on_change)
+        self._loop = None
+
+    async def watch(self):
+        """現在のボードの世代番号を記録しておく（購読の開始時に呼ぶ。以後の変更を差分で配る）"""
+        path = database.current_database()
+        if path not in self._boards:
+            feed = _BoardFeed()
+            feed.generations = await self._read_generations()
+            self._boards.setdefault(path, feed)
+
+    async def _read_generations(self) -> dict:
+        states = await get_generation_states()
+        return {quadrant: state[0] for quadrant, state in states.items()}
+
+    def _on_change(self, kind: str, quadrants: tuple, task_id: Optional[int]):
+        # 書き込みスレッドで呼ばれる（書き込んだボードのコンテキストのまま）。購読者がいなければ何もしない
+        loop = self._loop
+        path = database.current_database()
+        if loop is None or not self.broadcaster.count(path):
+            return
+        asyncio.run_coroutine_threadsafe(self.push(kind, quadrants, task_id, path), loop)
+
+    async def push(self, kind: str, quadrants: tuple, task_id: Optional[int] = None, path: Optional[str] = None):
+        with database.use_database(path or database.current_database()) as path:
+            feed = self._boards.setdefault(path, _BoardFeed())
+            # ロックは待った順に取れるので、ボードごとに通知の順に処理される
+            async with feed.lock:
+                generations = await self._read_generations()
+                changed = {quadrant for quadrant, generation in generations.items()
+                           if generation != feed.generations.get(quadrant)}
+                feed.generations = generations
+
+                if kind == "task" and changed <= set(quadrants):
+                    # 内容だけの変更はカード1枚を差し替える
+                    row = await get_task_by_id(task_id)
+                    if row is not None:
+                        feed.event_id += 1
+                        self.broadcaster.broadcast(format_event("task", self.render_card(row), feed.event_id), path)
+                    return
+
+                targets = sorted(changed | set(quadrants))
+                if not targets:
+                    return
+                board = await get_board()
+                feed.event_id += 1
+                html = self.render_board({quadrant: board.get(quadrant, []) for quadrant in targets})
+                self.broadcaster.broadcast(format_event("board", html, feed.event_id), path)
+
+
+class _BoardFeed:
+    """ChangeFeed のボードごとの状態"""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.generations = {}
+        self.event_id = 0
@@ -0,0 +1,102 @@
+# エクスポート
+# タスクをボードの並び順にバッチで読みながら、Markdown / NDJSON / CSV を逐次生成する
+# 全件をメモリに載せないので、ボードの大きさに関係なくメモリ使用量は一定
+
+import csv
+import io
+from datetime import datetime
+
+from app.async_database import list_tasks
+from app.mappers import row_to_json
+
+QUADRANT_NAMES = {
+    1: "Q1 · 緊急かつ重要",
+    2: "Q2 · 重要",
+    3: "Q3 · 緊急",
+    4: "Q4 · その他"
+}
+
+EXPORT_BATCH_SIZE = 500
+
+# 形式ごとの (メディアタイプ, 拡張子)
+EXPORT_FORMATS = {
+    "markdown": ("text/markdown", "md"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+CSV_COLUMNS = ["id", "title", "description", "quadrant", "position", "completed",
+               "due_date", "created_at", "updated_at"]
+
+
+async def iter_task_batches(batch_size: int = EXPORT_BATCH_SIZE):
+    """全タスクをボードの並び順でバッチごとに返す（バッチごとに接続を借りて返す）"""
+    cursor = None
+    while True:
+        rows, cursor = await list_tasks(limit=batch_size, cursor=cursor)
+        if rows:
+            yield rows
+        if cursor is None:
+            break
+
+
+async def export_markdown(batches):
+    """Markdown（タイトルのみ、簡潔版）。象限順に並んでいるので1パスでグループ化できる"""
+    yield "# Eisenhower Matrix\n\n"
+    yield f"Exported: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n"
+    yield "---\n\n"
+
+    current = 0  # 見出しを出力済みの象限
+    has_tasks = False
+    async for rows in batches:
+        lines = []
+        for row in rows:
+            quadrant = row["quadrant"]
+            while current < quadrant:
+                # 前の象限を閉じて次の見出しを出す（タスクのない象限は「—」）
+                if current:
+                    lines.append("\n" if has_tasks else "—\n\n")
+                current += 1
+                lines.append(f"## {QUADRANT_NAMES[current]}\n\n")
+                has_tasks = False
+            checkbox = "- [x]" if row["completed"] else "- [ ]"
+            lines.append(f"{checkbox} {row['title']}\n")
+            has_tasks = True
+        yield "".join(lines)
+
+    lines = []
+    while current < 4:
+        if current:
+            lines.append("\n" if has_tasks else "—\n\n")
+        current += 1
+        lines.append(f"## {QUADRANT_NAMES[current]}\n\n")
+        has_tasks = False
+    lines.append("\n" if has_tasks else "—\n\n")
+    yield "".join(lines)
+
+
+async def export_ndjson(batches):
+    """1行に1タスクのJSON（/api/tasks と同じ形）"""
+    async for rows in batches:
+        yield b"".join(row_to_json(row) + b"\n" for row in rows)
+
+
+async def export_csv(batches):
+    """ヘッダー付きCSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for rows in batches:
+        writer.writerows([row[column] for column in CSV_COLUMNS] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # タスクが1件もない場合のヘッダー
+
+
+EXPORTERS = {
+    "markdown": export_markdown,
+    "ndjson": export_ndjson,
+    "csv": export_csv,
+}
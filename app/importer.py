@@ -0,0 +1,233 @@
+# インポート
+# エクスポートした Markdown / NDJSON を行ごとに読みながら、一定件数ごとに1トランザクションで追加する
+# アップロード全体をメモリに載せないので、ファイルの大きさに関係なくメモリ使用量は一定
+#
+#   python -m app.importer board.md [--format markdown|ndjson] [--db tasks.db]
+
+import argparse
+import asyncio
+import codecs
+import re
+import time
+from itertools import islice
+
+from pydantic import ValidationError
+
+from app import database
+from app.async_database import import_task_chunk
+from app.models import TaskCreate
+
+IMPORT_FORMATS = ("markdown", "ndjson")
+# 1トランザクションで追加する件数
+IMPORT_CHUNK_SIZE = 10000
+
+# 拡張子から形式を推測する（CLI用）
+FORMAT_BY_EXTENSION = {"md": "markdown", "markdown": "markdown", "ndjson": "ndjson", "jsonl": "ndjson"}
+
+_HEADING = re.compile(r"##\s+Q([1-4])\b")
+_CHECKBOX = re.compile(r"\s*[-*]\s+\[([ xX])\]\s+(.*)")
+
+
+class ImportFormatError(ValueError):
+    """入力の形式が正しくない（line は1始まりの行番号）"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+        self.imported = 0  # エラーまでに追加済みの件数
+
+
+def _task_dict(task: TaskCreate) -> dict:
+    return {
+        "title": task.title,
+        "description": task.description,
+        "quadrant": task.quadrant,
+        "completed": task.completed,
+        "due_date": task.due_date.isoformat() if task.due_date else None,
+    }
+
+
+def _validation_message(error: ValidationError) -> str:
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+
+class MarkdownParser:
+    """export_markdown の形式（## Qn 見出しの下に - [ ] / - [x] のチェックリスト）"""
+
+    def __init__(self):
+        self.line = 0
+        self.quadrant = None
+
+    def parse(self, lines) -> list:
+        tasks = []
+        for text in lines:
+            self.line += 1
+            text = text.rstrip("\r\n")
+            heading = _HEADING.match(text)
+            if heading:
+                self.quadrant = int(heading.group(1))
+                continue
+            item = _CHECKBOX.match(text)
+            if item is None:
+                continue  # タイトル、日時、区切り線、「—」など
+            if self.quadrant is None:
+                raise ImportFormatError(self.line, "task before a quadrant heading")
+            try:
+                task = TaskCreate(title=item.group(2).strip(), quadrant=self.quadrant,
+                                  completed=item.group(1) != " ")
+            except ValidationError as error:
+                raise ImportFormatError(self.line, _validation_message(error)) from None
+            tasks.append(_task_dict(task))
+        return tasks
+
+
+class NDJSONParser:
+    """export_ndjson の形式（1行に1タスクのJSON。id や日時などのフィールドは無視する）"""
+
+    def __init__(self):
+        self.line = 0
+
+    def parse(self, lines) -> list:
+        tasks = []
+        for text in lines:
+            self.line += 1
+            if not text.strip():
+                continue
+            try:
+                task = TaskCreate.model_validate_json(text)
+            except ValidationError as error:
+                raise ImportFormatError(self.line, _validation_message(error)) from None
+            tasks.append(_task_dict(task))
+        return tasks
+
+
+PARSERS = {
+    "markdown": MarkdownParser,
+    "ndjson": NDJSONParser,
+}
+
+
+async def iter_line_batches(chunks):
+    """バイト列のチャンクを行のリストにして返す（行がチャンクをまたいでもよい）"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        if lines:
+            yield lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending]
+
+
+class _Counter:
+    def __init__(self):
+        self.imported = 0
+        self.quadrants = {1: 0, 2: 0, 3: 0, 4: 0}
+
+    def add(self, tasks: list, imported: int):
+        """コミットしたチャンクを数える（失敗したチャンクの行は数えない）"""
+        self.imported += imported
+        for task in tasks:
+            self.quadrants[task["quadrant"]] += 1
+
+    def result(self, seconds: float) -> dict:
+        return {"imported": self.imported, "quadrants": self.quadrants, "seconds": round(seconds, 3)}
+
+
+async def import_stream(chunks, format: str = "markdown", chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """アップロードのバイト列を読みながらインポートする
+    書き込み中に次のチャンクを読む（書き込みは常に1チャンクだけ）
+    """
+    parser = PARSERS[format]()
+    counter = _Counter()
+    start = time.perf_counter()
+    pending = []
+    inserting = None  # (書き込み中のチャンクの future, そのチャンクの行)
+
+    async def wait_inserting():
+        nonlocal inserting
+        if inserting is not None:
+            future, tasks = inserting
+            inserting = None
+            counter.add(tasks, await future)
+
+    async def flush(tasks):
+        nonlocal inserting
+        await wait_inserting()
+        if tasks:
+            inserting = (asyncio.ensure_future(import_task_chunk(tasks)), tasks)
+
+    try:
+        async for lines in iter_line_batches(chunks):
+            tasks = parser.parse(lines)
+            pending.extend(tasks)
+            while len(pending) >= chunk_size:
+                await flush(pending[:chunk_size])
+                pending = pending[chunk_size:]
+        await flush(pending)
+        await flush([])
+    except ImportFormatError as error:
+        await wait_inserting()
+        error.imported = counter.imported
+        raise
+    finally:
+        # 他の例外（アップロードの切断など）でも、書き込み中のチャンクを待ってから終える
+        # （スレッドで実行中の書き込みは取り消せないので、コミットされたかどうかを数えに入れる）
+        try:
+            await wait_inserting()
+        except Exception:
+            pass  # 元の例外を返す
+        if counter.imported:
+            database.notify_board_changed(q for q, count in counter.quadrants.items() if count)
+    return counter.result(time.perf_counter() - start)
+
+
+def import_file(path: str, format: str = None, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """ファイルからインポートする（同期版。CLI用）"""
+    format = format or FORMAT_BY_EXTENSION.get(path.rsplit(".", 1)[-1].lower(), "markdown")
+    parser = PARSERS[format]()
+    counter = _Counter()
+    start = time.perf_counter()
+    pending = []
+    try:
+        with open(path, encoding="utf-8") as file:
+            while True:
+                lines = list(islice(file, chunk_size))
+                if not lines:
+                    break
+                pending.extend(parser.parse(lines))
+                while len(pending) >= chunk_size:
+                    counter.add(pending[:chunk_size], database.import_task_chunk(pending[:chunk_size]))
+                    pending = pending[chunk_size:]
+        counter.add(pending, database.import_task_chunk(pending))
+    except ImportFormatError as error:
+        error.imported = counter.imported
+        raise
+    return counter.result(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="エクスポートしたファイルからタスクをインポートする")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--db", default=database.DATABASE)
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    database.DATABASE = args.db
+    database.init_db()
+    try:
+        result = import_file(args.path, args.format, args.chunk_size)
+    except ImportFormatError as error:
+        raise SystemExit(f"❌ {error}（{error.imported}件はインポート済み）")
+    finally:
+        database.close_pools()
+    print(f"✅ {result['imported']}件をインポートしました（{result['seconds']:.1f} 秒）")
+
+
+if __name__ == "__main__":
+    main()
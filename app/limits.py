@@ -0,0 +1,51 @@
+# リクエスト本文の大きさの上限
+# 一括操作（/api/tasks/bulk）は件数の上限（MAX_BULK_ITEMS）を JSON を解析した後でしか確かめられないので、
+# 大きすぎる本文は解析する前（Content-Length か、読みながら数えた大きさ）で 413 にする
+
+import os
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+# 一括操作の本文の上限（バイト）
+MAX_BULK_BYTES = int(os.environ.get("TASKS_MAX_BULK_BYTES", str(16 * 1024 * 1024)))
+BULK_PATH = "/api/tasks/bulk"
+
+
+def _too_large_detail() -> str:
+    return f"Request body too large (max {MAX_BULK_BYTES} bytes)"
+
+
+class BulkBodyLimitMiddleware:
+    """一括操作の本文が MAX_BULK_BYTES を超えたら、JSON を読む前に 413 を返すASGIミドルウェア
+
+    Content-Length があればそれで判断してボードも開かずに返す。
+    ない場合（chunked）は受け取った大きさを数え、超えた時点で読むのをやめて 413 にする。
+    ボードつきのURL（/boards/<名前>/api/tasks/bulk）も対象にする。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].endswith(BULK_PATH):
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > MAX_BULK_BYTES:
+            response = JSONResponse({"detail": _too_large_detail()}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > MAX_BULK_BYTES:
+                # FastAPI は本文を読むときの HTTPException をそのまま応答にする
+                raise HTTPException(status_code=413, detail=_too_large_detail())
+            return message
+
+        await self.app(scope, receive_limited, send)
@@ -1,395 +1,595 @@
 from fastapi import FastAPI
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from fastapi import Request
-from app.database import init_db, create_task, get_all_tasks, get_task_by_id, get_tasks_by_quadrant, update_task, update_task_positions, delete_task
-from app.models import Task, TaskCreate
-from datetime import datetime
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+from fastapi import Body, Query, Request, Response
+from typing import List, Literal, Optional
+from app.database import VersionConflict, init_db, close_pools, current_database, get_pool, task_cache, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_BULK_ITEMS, POSITION_GAP, SEARCH_LIMIT, MIN_INDEXED_TERM, MAX_SEARCH_LIMIT, NEXT_DUE_LIMIT
+from app.async_database import shutdown_executors, insert_task, list_tasks, get_task_by_id, get_tasks_by_quadrant, get_board, get_generation_states, get_task_state, get_due_tasks, get_overdue_counts, get_next_due, list_archived_tasks, get_table_sizes, update_task, move_task_to_quadrant, move_task, update_task_positions, delete_task, search_tasks, bulk_insert_tasks, bulk_update_tasks, bulk_delete_tasks
+from app.models import ArchivedTask, Task, TaskCreate, TaskPatch
+from app.mappers import archived_rows_to_json, dumps, row_to_json, row_to_json_dict, row_to_task, rows_to_json
+from app.export import EXPORT_FORMATS, EXPORTERS, iter_task_batches
+from app.importer import ImportFormatError, import_stream
+from app.conditional import make_etag, task_etag, if_match_versions, http_date, is_not_modified, not_modified_response, validator_headers
+from app.events import Broadcaster, ChangeFeed
+from app.archive import ArchiveJob
+from app import metrics
+from app.boards import BoardMiddleware, board_prefix, current_board
+from app.limits import BulkBodyLimitMiddleware
+from app.rendering import templates, card_cache, precompile, render_card, render_list, render_board, render_search_results, render_due_list, render_due_summary
+from datetime import date, datetime
 from fastapi import HTTPException
 
 # FastAPIアプリケーションインスタンスを作成
 app = FastAPI()
+# ボードの選択（/boards/<名前>/... か X-Board ヘッダー。ボードごとに別のデータベースファイル）
+app.add_middleware(BoardMiddleware)
+# 一括操作の本文の大きさの上限（TASKS_MAX_BULK_BYTES）。JSON を解析する前に 413 を返す
+app.add_middleware(BulkBodyLimitMiddleware)
+# ルートごとのレイテンシとSQLの計測（TASKS_METRICS=0 で無効）
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.RequestMetricsMiddleware)
 # アプリ起動時にデータベースを初期化
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    precompile()
+    applied = init_db()
+    for migration in applied:
+        print(f"✅ マイグレーション {migration['version']} ({migration['name']}): {migration['duration_ms']:.1f} ms")
     print("✅ データベースの初期化が完了しました！")
+    await change_feed.start()
+    archive_job.start()
 
-# テンプレートエンジンの設定
-templates = Jinja2Templates(directory="templates")
+# アプリ終了時にSSEのストリーム、アーカイブ、DBスレッド、接続プールを閉じる
+@app.on_event("shutdown")
+async def shutdown_event():
+    change_feed.stop()
+    broadcaster.close()
+    await archive_job.stop()
+    shutdown_executors()
+    close_pools()
+
+# ライブ更新（SSE）: 変更のたびにカードか象限の一覧を1回だけ描画して全タブに配る
+broadcaster = Broadcaster()
+change_feed = ChangeFeed(broadcaster, render_card, render_board)
+
+# 完了済みタスクのアーカイブ（TASKS_ARCHIVE_INTERVAL 秒ごと）
+archive_job = ArchiveJob(render_board)
+
+# 条件付きGETの検証子（ETag, Last-Modified）。本体を読む前に世代番号だけで作る
+async def board_validators(kind: str):
+    states = await get_generation_states()
+    generations = ".".join(str(states[quadrant][0]) for quadrant in sorted(states))
+    changed_at = max((state[1] for state in states.values() if state[1]), default=None)
+    return make_etag(kind, generations), http_date(changed_at)
+
+async def due_validators(today: str) -> str:
+    """期限のビューは日付が変わっても変わるので、ETagに日付を含める
+    （Last-Modified はボードの変更時刻なので付けない）
+    """
+    etag, _ = await board_validators(f"d.{today}")
+    return etag
+
+def today_iso(today: Optional[date]) -> str:
+    """期限の基準日（省略時はサーバーの今日）"""
+    return (today or date.today()).isoformat()
+
+def json_response(content: bytes, headers: Optional[dict] = None, status_code: int = 200) -> Response:
+    """mappers で行から直接作ったJSONをそのまま返す
+    （response_model での再検証と jsonable_encoder を通さない。本体は同じバイト列）
+    """
+    return Response(content, status_code=status_code, media_type="application/json", headers=headers)
+
+# どのタスクのバージョンにも一致しない（バージョンは1から始まる）。一致するETagがない If-Match 用
+NO_VERSION = 0
+
+async def expected_version(request: Request, task_id: int, form_version: Optional[str] = None) -> Optional[int]:
+    """書き込みの前提にするバージョン（If-Match かフォームの version）
+    どちらもなければ None（従来どおり無条件で上書きする）
+    """
+    try:
+        versions = if_match_versions(request, task_id)
+        if versions is None:
+            return int(form_version) if form_version else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid version")
+    if len(versions) == 1:
+        return versions.pop()
+    if not versions:
+        return NO_VERSION
+    # 複数のETagのどれかに一致すればよい。現在のバージョンを前提にし、
+    # 読んだ後に変わった場合は書き込み側のバージョンの比較で 409 になる
+    state = await get_task_state(task_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return state[0] if state[0] in versions else NO_VERSION
+
+def conflict_card(error: VersionConflict) -> HTMLResponse:
+    """HTMX用の 409。現在のカードを返すので、画面はそれで置き換えて読み直す"""
+    current = error.current
+    return HTMLResponse(render_card(current), status_code=409,
+                        headers={"ETag": task_etag(current["id"], current["version"])})
+
+async def quadrant_validators(quadrant_id: int):
+    states = await get_generation_states()
+    generation, changed_at = states.get(quadrant_id, (0, None))
+    return make_etag("q", quadrant_id, generation), http_date(changed_at)
+
+async def task_validators(task_id: int):
+    """タスクが存在しない場合は (None, None)"""
+    state = await get_task_state(task_id)
+    if state is None:
+        return None, None
+    version, changed_at = state
+    return task_etag(task_id, version), http_date(changed_at)
 
 # ルートエンドポイント
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    board = current_board()
+    return templates.TemplateResponse("index.html", {"request": request, "board": board,
+                                                     "board_prefix": board_prefix(board)})
 
 @app.get("/api/hello")
 async def hello():
     return "<p>HTMXが正常に動作しています！</p>"
 
-@app.get("/api/tasks")
-async def get_tasks():
-    """すべてのタスクを取得"""
-    rows = get_all_tasks()
-    tasks = []
-    for row in rows:
-        task = Task(
-            id=row[0],
-            title=row[1],
-            description=row[2],
-            quadrant=row[3],
-            completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-            due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-            created_at=datetime.fromisoformat(row[7]),
-            updated_at=datetime.fromisoformat(row[8])
+@app.get("/api/events")
+async def stream_events():
+    """変更をプッシュするSSEストリーム（event: task / board / refresh）。現在のボードの変更だけを送る"""
+    await change_feed.watch()
+    return StreamingResponse(broadcaster.stream(channel=current_database()), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/events/stats")
+async def get_event_stats():
+    """SSEの接続数と配信数"""
+    return broadcaster.stats()
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """読み込みキャッシュのヒット率など（cards は描画済みカードのキャッシュ）"""
+    return {**task_cache.stats(), "cards": card_cache.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus のテキスト形式の計測値（ルートごとのレイテンシ、SQL文ごとの時間、キャッシュと接続）"""
+    cache = task_cache.stats()
+    pool = get_pool().stats()
+    gauges = {
+        "mytask_cache_hits": ("Read cache hits", cache["hits"]),
+        "mytask_cache_misses": ("Read cache misses", cache["misses"]),
+        "mytask_cache_entries": ("Read cache entries", cache["size"]),
+        "mytask_db_pool_open_connections": ("Open pooled SQLite connections", pool["open"]),
+        "mytask_db_pool_idle_connections": ("Idle pooled SQLite connections", pool["idle"]),
+        "mytask_sse_subscribers": ("Connected SSE clients", broadcaster.stats()["subscribers"]),
+    }
+    return PlainTextResponse(metrics.render_prometheus(gauges),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/metrics/slow-queries")
+async def get_slow_queries(limit: int = Query(20, ge=1, le=metrics.SLOW_LOG_SIZE)):
+    """しきい値（TASKS_SLOW_QUERY_MS）を超えたSQL文と実行計画、合計時間の長いSQL文"""
+    return {
+        "threshold_ms": metrics.SLOW_QUERY_MS,
+        "slow": metrics.slow_queries()[:limit],
+        "top_statements": metrics.statement_stats(limit),
+    }
+
+@app.get("/api/tasks", response_model=List[Task])
+async def get_tasks(request: Request,
+                    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                    cursor: Optional[str] = None,
+                    quadrant: Optional[int] = Query(None, ge=1, le=4),
+                    completed: Optional[bool] = None,
+                    due_from: Optional[date] = None,
+                    due_to: Optional[date] = None):
+    """タスクをボードの並び順でページ単位に取得
+    次のページがある場合は X-Next-Cursor と Link ヘッダーでカーソルを返す
+    """
+    etag, last_modified = await board_validators("l")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    headers = validator_headers(etag, last_modified)
+    try:
+        rows, next_cursor = await list_tasks(
+            limit=limit,
+            cursor=cursor,
+            quadrant=quadrant,
+            completed=completed,
+            due_from=due_from.isoformat() if due_from else None,
+            due_to=due_to.isoformat() if due_to else None
         )
-        tasks.append(task)
-    return tasks
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return json_response(rows_to_json(rows), headers)
 
 @app.post("/api/tasks", response_model=Task)
 async def create_new_task(task: TaskCreate):
     """新しいタスクを作成"""
-    task_id = create_task(
+    # 作成されたタスクの行がそのまま返る
+    row = await insert_task(
         title=task.title,
         description=task.description,
         quadrant=task.quadrant,
         due_date=task.due_date.isoformat() if task.due_date else None
     )
-    # 作成されたタスクを取得
-    row = get_task_by_id(task_id)
-    created_task = Task(
-        id=row[0],
-        title=row[1],
-        description=row[2],
-        quadrant=row[3],
-        completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-        due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-        created_at=datetime.fromisoformat(row[7]),
-        updated_at=datetime.fromisoformat(row[8])
-    )
-    return created_task
+    return json_response(row_to_json(row))
+
+# 一括操作（/api/tasks/{task_id} より前に登録する）
+# 本文の大きさは解析する前に BulkBodyLimitMiddleware が確かめ、件数は解析した後でここで確かめる
+def check_bulk_size(count: int):
+    if count > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items (max {MAX_BULK_ITEMS})")
+
+@app.post("/api/tasks/bulk")
+async def bulk_create(tasks: List[TaskCreate]):
+    """複数のタスクを1トランザクションで作成。入力の順に {index, status, id} を返す"""
+    check_bulk_size(len(tasks))
+    ids = await bulk_insert_tasks([{
+        "title": task.title,
+        "description": task.description,
+        "quadrant": task.quadrant,
+        "completed": task.completed,
+        "due_date": task.due_date.isoformat() if task.due_date else None
+    } for task in tasks])
+    return {"results": [{"index": index, "status": "created", "id": task_id}
+                        for index, task_id in enumerate(ids)]}
+
+@app.patch("/api/tasks/bulk")
+async def bulk_update(patches: List[TaskPatch]):
+    """複数のタスクを1トランザクションで部分更新（一括完了など）。存在しないIDは not_found"""
+    check_bulk_size(len(patches))
+    items = []
+    for patch in patches:
+        item = patch.model_dump(exclude_unset=True)
+        if item.get("due_date"):
+            item["due_date"] = item["due_date"].isoformat()
+        items.append(item)
+    found = await bulk_update_tasks(items)
+    return {"results": [{"index": index, "status": "updated" if ok else "not_found", "id": patch.id}
+                        for index, (patch, ok) in enumerate(zip(patches, found))]}
+
+@app.delete("/api/tasks/bulk")
+async def bulk_delete(ids: List[int] = Body(..., embed=True)):
+    """複数のタスクを1トランザクションで削除（{"ids": [...]}）。存在しないIDは not_found"""
+    check_bulk_size(len(ids))
+    found = await bulk_delete_tasks(ids)
+    return {"results": [{"index": index, "status": "deleted" if ok else "not_found", "id": task_id}
+                        for index, (task_id, ok) in enumerate(zip(ids, found))]}
+
+@app.get("/api/tasks/due/{view}", response_model=List[Task])
+async def get_due_tasks_json(
+    request: Request,
+    view: Literal["overdue", "today", "week"],
+    today: Optional[date] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """期限のビュー（overdue: 期限切れ / today: 今日 / week: 今日から7日間）
+    4象限をまたいで未完了のタスクを期限の近い順に返す
+    """
+    today = today_iso(today)
+    etag = await due_validators(today)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    rows = await get_due_tasks(view, today, limit)
+    return json_response(rows_to_json(rows), validator_headers(etag))
+
+@app.get("/api/due/counts")
+async def get_overdue_counts_json(today: Optional[date] = None):
+    """象限ごとの期限切れ（未完了）の件数"""
+    return await get_overdue_counts(today_iso(today))
+
+@app.get("/api/archive", response_model=List[ArchivedTask])
+async def get_archived_tasks(request: Request,
+                             limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                             cursor: Optional[str] = None,
+                             quadrant: Optional[int] = Query(None, ge=1, le=4)):
+    """アーカイブ済みのタスクを新しい順にページ単位で取得
+    次のページがある場合は X-Next-Cursor と Link ヘッダーでカーソルを返す
+    """
+    try:
+        rows, next_cursor = await list_archived_tasks(limit=limit, cursor=cursor, quadrant=quadrant)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return json_response(archived_rows_to_json(rows), headers)
+
+@app.post("/api/archive/run")
+async def run_archive(older_than_days: Optional[float] = Query(None, ge=0)):
+    """アーカイブをすぐに実行し、移した件数とバッチ数・かかった時間を返す
+    前後のテーブルの大きさとボードの描画時間（before / after）は TASKS_ARCHIVE_MEASURE=1 のときだけ含める
+    """
+    return await archive_job.run(older_than_days)
+
+@app.get("/api/archive/stats")
+async def get_archive_stats():
+    """ボードが読むテーブルとアーカイブの件数、アーカイブの実行状況"""
+    return {**await get_table_sizes(), "job": archive_job.stats()}
 
 @app.get("/api/tasks/{task_id}", response_model=Task)
-async def get_task(task_id: int):
+async def get_task(request: Request, task_id: int):
     """IDでタスクを取得"""
-    row = get_task_by_id(task_id)
+    etag, last_modified = await task_validators(task_id)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    row = await get_task_by_id(task_id)
     if not row:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    task = Task(
-        id=row[0],
-        title=row[1],
-        description=row[2],
-        quadrant=row[3],
-        completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-        due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-        created_at=datetime.fromisoformat(row[7]),
-        updated_at=datetime.fromisoformat(row[8])
-    )
-    return task
+    return json_response(row_to_json(row), validator_headers(etag, last_modified))
 
 @app.put("/api/tasks/{task_id}", response_model=Task)
-async def update_existing_task(task_id: int, task: TaskCreate):
-    """タスクを更新"""
-    # タスクが存在するか確認
-    existing = get_task_by_id(task_id)
-    if not existing:
+async def update_existing_task(request: Request, task_id: int, task: TaskCreate):
+    """タスクを更新
+    If-Match（GET の ETag）を付けると、その後に他から更新されていた場合は 409 と現在のタスクを返す
+    """
+    # 更新後の行が返る（存在しない場合はNone）
+    try:
+        row = await update_task(
+            task_id=task_id,
+            title=task.title,
+            description=task.description,
+            quadrant=task.quadrant,
+            completed=task.completed,
+            due_date=task.due_date.isoformat() if task.due_date else None,
+            expected_version=await expected_version(request, task_id)
+        )
+    except VersionConflict as error:
+        current = error.current
+        return json_response(dumps({"detail": "Version conflict", "current": row_to_json_dict(current)}),
+                             {"ETag": task_etag(task_id, current["version"])}, status_code=409)
+    if not row:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    update_task(
-        task_id=task_id,
-        title=task.title,
-        description=task.description,
-        quadrant=task.quadrant,
-        completed=task.completed,
-        due_date=task.due_date.isoformat() if task.due_date else None
-    )
-    
-    # 更新されたタスクを取得
-    row = get_task_by_id(task_id)
-    updated_task = Task(
-        id=row[0],
-        title=row[1],
-        description=row[2],
-        quadrant=row[3],
-        completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-        due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-        created_at=datetime.fromisoformat(row[7]),
-        updated_at=datetime.fromisoformat(row[8])
-    )
-    return updated_task
+    return json_response(row_to_json(row), {"ETag": task_etag(task_id, row["version"])})
 
 @app.delete("/api/tasks/{task_id}")
 async def delete_existing_task(task_id: int):
     """タスクを削除"""
-    # タスクが存在するか確認
-    existing = get_task_by_id(task_id)
-    if not existing:
+    if not await delete_task(task_id):
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    delete_task(task_id)
     return {"message": "Task deleted successfully"}
 
 # HTMX用のHTMLエンドポイント
+@app.get("/api/board", response_class=HTMLResponse)
+async def get_board_html(request: Request):
+    """4象限のタスク一覧をまとめてHTMLで取得（hx-swap-oob で各象限に差し込む）
+    1回のスキャンで全象限を読むので、象限ごとに4回リクエストするより軽い
+    """
+    etag, last_modified = await board_validators("b")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    board = await get_board()
+    return HTMLResponse(render_board(board), headers=validator_headers(etag, last_modified))
+
+@app.get("/api/search", response_class=HTMLResponse)
+async def search_html(
+    request: Request,
+    q: str = "",
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+):
+    """タイトルと説明の全文検索。関連度の高い順に、一致箇所を強調したカードを返す
+    入力のたびに呼ばれるライブ検索用。ボードが変わっていなければ 304 を返す
+    3文字以上の語がなければ索引を引けない（全行の走査になる）ので、DBを読まずに案内だけ返す
+    """
+    query = q.strip()
+    if query and not any(len(term) >= MIN_INDEXED_TERM for term in query.split()):
+        return HTMLResponse(render_search_results([], query, too_short=True))
+    etag, last_modified = await board_validators("s")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    rows = await search_tasks(q, limit)
+    return HTMLResponse(render_search_results(rows, query), headers=validator_headers(etag, last_modified))
+
+@app.get("/api/due/summary", response_class=HTMLResponse)
+async def get_due_summary_html(request: Request, today: Optional[date] = None):
+    """象限の期限切れバッジと「次の期限」をまとめてHTMLで取得（hx-swap-oob で差し込む）
+    ボードと日付が変わらなければ 304。件数と次の期限はキャッシュから返す
+    """
+    today = today_iso(today)
+    etag = await due_validators(today)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    counts = await get_overdue_counts(today)
+    next_due = await get_next_due(today, NEXT_DUE_LIMIT)
+    return HTMLResponse(render_due_summary(counts, next_due), headers=validator_headers(etag))
+
+@app.get("/api/due/{view}", response_class=HTMLResponse)
+async def get_due_tasks_html(
+    request: Request,
+    view: Literal["overdue", "today", "week"],
+    today: Optional[date] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """期限のビューをHTMLのカードで取得（期限を表示する）"""
+    today = today_iso(today)
+    etag = await due_validators(today)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    rows = await get_due_tasks(view, today, limit)
+    return HTMLResponse(render_due_list(rows), headers=validator_headers(etag))
+
 @app.get("/api/tasks/quadrant/{quadrant_id}", response_class=HTMLResponse)
 async def get_tasks_by_quadrant_html(request: Request, quadrant_id: int):
-    """指定された象限のタスクをHTMLで取得（順序付き）"""
-    rows = get_tasks_by_quadrant(quadrant_id)
-    tasks = []
-    for row in rows:
-        task = Task(
-            id=row[0],
-            title=row[1],
-            description=row[2],
-            quadrant=row[3],
-            completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-            due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-            created_at=datetime.fromisoformat(row[7]),
-            updated_at=datetime.fromisoformat(row[8])
-        )
-        tasks.append(task)
-    return templates.TemplateResponse("task_list.html", {
-        "request": request,
-        "tasks": tasks,
-        "quadrant_id": quadrant_id
-    })
+    """指定された象限のタスクをHTMLで取得（順序付き）
+    象限が変わっていなければ 304 を返す（クエリも描画もしない）
+    """
+    etag, last_modified = await quadrant_validators(quadrant_id)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    rows = await get_tasks_by_quadrant(quadrant_id)
+    return HTMLResponse(render_list(rows), headers=validator_headers(etag, last_modified))
 
 @app.post("/api/tasks/html", response_class=HTMLResponse)
 async def create_task_html(request: Request):
     """HTMX用：タスクを作成してHTMLを返す"""
     form_data = await request.form()
-    task_id = create_task(
+    # 作成されたタスクの行がそのまま返る
+    row = await insert_task(
         title=form_data.get("title"),
         description=form_data.get("description"),
         quadrant=int(form_data.get("quadrant")),
         due_date=form_data.get("due_date") if form_data.get("due_date") else None
     )
-    # 作成されたタスクを取得
-    row = get_task_by_id(task_id)
-    task = Task(
-        id=row[0],
-        title=row[1],
-        description=row[2],
-        quadrant=row[3],
-        completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-        due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-        created_at=datetime.fromisoformat(row[7]),
-        updated_at=datetime.fromisoformat(row[8])
-    )
-    return templates.TemplateResponse("task_card.html", {
-        "request": request,
-        "task": task
-    })
+    return HTMLResponse(render_card(row))
 
 @app.delete("/api/tasks/{task_id}/html", response_class=HTMLResponse)
 async def delete_task_html(request: Request, task_id: int):
     """HTMX用：タスクを削除"""
-    existing = get_task_by_id(task_id)
-    if not existing:
-        return ""  # 既に削除されている場合は空を返す
-    delete_task(task_id)
-    return ""  # 削除成功時は空を返す（HTMXが要素を削除）
+    # 既に削除されている場合も含めて空を返す（HTMXが要素を削除）
+    await delete_task(task_id)
+    return ""
 
 @app.get("/api/tasks/{task_id}/detail", response_class=HTMLResponse)
 async def get_task_detail(request: Request, task_id: int):
     """カードクリック時の詳細表示"""
-    row = get_task_by_id(task_id)
+    etag, last_modified = await task_validators(task_id)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    row = await get_task_by_id(task_id)
     if not row:
         raise HTTPException(status_code=404, detail="Task not found")
-    task = Task(
-        id=row[0],
-        title=row[1],
-        description=row[2],
-        quadrant=row[3],
-        completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-        due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-        created_at=datetime.fromisoformat(row[7]),
-        updated_at=datetime.fromisoformat(row[8])
-    )
+    task = row_to_task(row)
     return templates.TemplateResponse("task_detail.html", {
         "request": request,
         "task": task
-    })
+    }, headers=validator_headers(etag, last_modified))
 
 @app.put("/api/tasks/{task_id}/html", response_class=HTMLResponse)
 async def update_task_html(request: Request, task_id: int):
     """HTMX用：タスクを更新してHTMLを返す"""
     form_data = await request.form()
-    existing = get_task_by_id(task_id)
-    if not existing:
+    try:
+        row = await update_task(
+            task_id=task_id,
+            title=form_data.get("title"),
+            description=form_data.get("description") if form_data.get("description") else None,
+            due_date=form_data.get("due_date") if form_data.get("due_date") else None,
+            expected_version=await expected_version(request, task_id, form_data.get("version"))
+        )
+    except VersionConflict as error:
+        return conflict_card(error)
+    if not row:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    update_task(
-        task_id=task_id,
-        title=form_data.get("title"),
-        description=form_data.get("description") if form_data.get("description") else None,
-        due_date=form_data.get("due_date") if form_data.get("due_date") else None
-    )
-    
-    # 更新されたタスクを取得
-    row = get_task_by_id(task_id)
-    task = Task(
-        id=row[0],
-        title=row[1],
-        description=row[2],
-        quadrant=row[3],
-        completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-        due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-        created_at=datetime.fromisoformat(row[7]),
-        updated_at=datetime.fromisoformat(row[8])
-    )
-    return templates.TemplateResponse("task_card.html", {
-        "request": request,
-        "task": task
-    })
+    return HTMLResponse(render_card(row))
 
 @app.patch("/api/tasks/{task_id}", response_class=HTMLResponse)
 async def patch_task_html(request: Request, task_id: int):
     """HTMX用：タスクを部分更新（完了状態など）"""
     form_data = await request.form()
-    existing = get_task_by_id(task_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Task not found")
     
     # 完了状態の更新
     completed = form_data.get("completed") == "true"
-    update_task(task_id=task_id, completed=completed)
+    try:
+        row = await update_task(task_id=task_id, completed=completed,
+                                expected_version=await expected_version(request, task_id, form_data.get("version")))
+    except VersionConflict as error:
+        return conflict_card(error)
+    if not row:
+        raise HTTPException(status_code=404, detail="Task not found")
     
-    # 更新されたタスクを取得
-    row = get_task_by_id(task_id)
-    task = Task(
-        id=row[0],
-        title=row[1],
-        description=row[2],
-        quadrant=row[3],
-        completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-        due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-        created_at=datetime.fromisoformat(row[7]),
-        updated_at=datetime.fromisoformat(row[8])
-    )
-    return templates.TemplateResponse("task_card.html", {
-        "request": request,
-        "task": task
-    })
+    return HTMLResponse(render_card(row))
 
 @app.patch("/api/tasks/{task_id}/quadrant", response_class=HTMLResponse)
 async def update_task_quadrant(request: Request, task_id: int):
     """HTMX用：タスクの象限を更新（ドラッグ&ドロップ用）"""
     form_data = await request.form()
-    existing = get_task_by_id(task_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
     new_quadrant = int(form_data.get("quadrant"))
-    old_quadrant = existing[3]  # 元の象限
-    
-    # 新しい象限の最大positionを取得して+1
-    rows = get_tasks_by_quadrant(new_quadrant)
-    new_position = len(rows)  # 最後尾に追加
     
-    update_task(task_id=task_id, quadrant=new_quadrant, position=new_position)
+    # 新しい象限の最後尾へ移動（更新後の行が返る）
+    try:
+        row = await move_task_to_quadrant(task_id, new_quadrant,
+                                          await expected_version(request, task_id, form_data.get("version")))
+    except VersionConflict as error:
+        return conflict_card(error)
+    if not row:
+        raise HTTPException(status_code=404, detail="Task not found")
     
-    # 更新されたタスクを取得
-    row = get_task_by_id(task_id)
-    task = Task(
-        id=row[0],
-        title=row[1],
-        description=row[2],
-        quadrant=row[3],
-        completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-        due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-        created_at=datetime.fromisoformat(row[7]),
-        updated_at=datetime.fromisoformat(row[8])
-    )
-    return templates.TemplateResponse("task_card.html", {
-        "request": request,
-        "task": task
-    })
+    return HTMLResponse(render_card(row))
+
+@app.patch("/api/tasks/{task_id}/move", response_class=HTMLResponse)
+async def move_task_html(request: Request, task_id: int):
+    """HTMX用：ドラッグ&ドロップで移動したタスク1件だけを更新
+    before_id の直前 / after_id の直後に置く（どちらもなければ象限の末尾）
+    version を送ると、ドラッグの間に他から更新されていた場合は 409 と現在のカードを返す
+    """
+    form_data = await request.form()
+    try:
+        quadrant = int(form_data.get("quadrant"))
+        before_id = int(form_data["before_id"]) if form_data.get("before_id") else None
+        after_id = int(form_data["after_id"]) if form_data.get("after_id") else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid move")
+    if quadrant not in (1, 2, 3, 4):
+        raise HTTPException(status_code=400, detail="Invalid move")
+
+    try:
+        row = await move_task(task_id, quadrant, before_id=before_id, after_id=after_id,
+                              expected_version=await expected_version(request, task_id, form_data.get("version")))
+    except VersionConflict as error:
+        return conflict_card(error)
+    if not row:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return HTMLResponse(render_card(row))
 
 @app.patch("/api/tasks/quadrant/{quadrant_id}/reorder", response_class=HTMLResponse)
 async def reorder_tasks_in_quadrant(request: Request, quadrant_id: int):
-    """HTMX用：同じ象限内でのタスクの順序を更新"""
-    body = await request.json()
+    """HTMX用：同じ象限内でのタスクの順序を更新
+    versions（{task_id: version}）を送ると、どれかが他から更新されていた場合は 409 と現在の一覧を返す
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="task_ids is required")
     task_ids = body.get("task_ids", [])  # [task_id1, task_id2, ...] の形式
     
     if not task_ids:
         raise HTTPException(status_code=400, detail="task_ids is required")
+    # JSON の true/false は bool（int のサブクラス）になるので除く
+    if not isinstance(task_ids, list) or not all(
+            isinstance(task_id, int) and not isinstance(task_id, bool) for task_id in task_ids):
+        raise HTTPException(status_code=400, detail="task_ids must be a list of integers")
+    try:
+        versions = {int(task_id): int(version) for task_id, version in (body.get("versions") or {}).items()}
+    except (AttributeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid version")
     
-    # タスクIDとpositionのペアを作成
-    task_positions = [(task_id, position) for position, task_id in enumerate(task_ids)]
-    update_task_positions(quadrant_id, task_positions)
-    
-    # 更新後のタスク一覧を取得して返す
-    rows = get_tasks_by_quadrant(quadrant_id)
-    tasks = []
-    for row in rows:
-        task = Task(
-            id=row[0],
-            title=row[1],
-            description=row[2],
-            quadrant=row[3],
-            completed=bool(row[5]),
-            due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-            created_at=datetime.fromisoformat(row[7]),
-            updated_at=datetime.fromisoformat(row[8])
-        )
-        tasks.append(task)
-    
-    return templates.TemplateResponse("task_list.html", {
-        "request": request,
-        "tasks": tasks,
-        "quadrant_id": quadrant_id
-    })
+    # タスクIDとpositionのペアを作成（移動用に間隔を空ける）
+    task_positions = [(task_id, index * POSITION_GAP) for index, task_id in enumerate(task_ids)]
+    # 並べ替え後の象限の行がそのまま返る
+    try:
+        rows = await update_task_positions(quadrant_id, task_positions, versions)
+    except VersionConflict as error:
+        return HTMLResponse(render_list(error.current), status_code=409)
+    return HTMLResponse(render_list(rows))
+
+@app.post("/api/import")
+async def import_tasks(request: Request, format: str = Query("markdown", pattern="^(markdown|ndjson)$")):
+    """エクスポートした Markdown / NDJSON をインポート（本文を読みながら一定件数ごとに追加する）"""
+    try:
+        return await import_stream(request.stream(), format)
+    except ImportFormatError as error:
+        raise HTTPException(status_code=400, detail=f"{error} ({error.imported} tasks imported before the error)")
 
 @app.get("/api/export")
-async def export_tasks():
-    """Markdownエクスポート（タイトルのみ、簡潔版）"""
-    from fastapi.responses import Response
-    rows = get_all_tasks()
-    
-    # 象限ごとにタスクを分類
-    quadrants = {1: [], 2: [], 3: [], 4: []}
-    quadrant_names = {
-        1: "Q1 · 緊急かつ重要",
-        2: "Q2 · 重要",
-        3: "Q3 · 緊急",
-        4: "Q4 · その他"
-    }
-    
-    for row in rows:
-        quadrant = row[3]
-        task = Task(
-            id=row[0],
-            title=row[1],
-            description=row[2],
-            quadrant=row[3],
-            completed=bool(row[5]),  # positionが追加されたためインデックスが1つずれる
-            due_date=datetime.fromisoformat(row[6]) if row[6] else None,
-            created_at=datetime.fromisoformat(row[7]),
-            updated_at=datetime.fromisoformat(row[8])
-        )
-        quadrants[quadrant].append(task)
-    
-    # Markdownを生成（タイトルのみ、簡潔版）
-    markdown = "# Eisenhower Matrix\n\n"
-    markdown += f"Exported: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n"
-    markdown += "---\n\n"
-    
-    for quadrant_id in [1, 2, 3, 4]:
-        markdown += f"## {quadrant_names[quadrant_id]}\n\n"
-        if not quadrants[quadrant_id]:
-            markdown += "—\n\n"
-        else:
-            for task in quadrants[quadrant_id]:
-                checkbox = "- [x]" if task.completed else "- [ ]"
-                markdown += f"{checkbox} {task.title}\n"
-            markdown += "\n"
-    
-    # レスポンスを返す
-    return Response(
-        content=markdown,
-        media_type="text/markdown",
+async def export_tasks(format: str = Query("markdown", pattern="^(markdown|ndjson|csv)$")):
+    """エクスポート（Markdown / NDJSON / CSV）。バッチごとに読みながらストリーミングで返す"""
+    media_type, extension = EXPORT_FORMATS[format]
+    body = EXPORTERS[format](iter_task_batches())
+    return StreamingResponse(
+        body,
+        media_type=media_type,
         headers={
-            "Content-Disposition": f'attachment; filename="eisenhower-{datetime.now().strftime("%Y%m%d-%H%M")}.md"'
+            "Content-Disposition": f'attachment; filename="eisenhower-{datetime.now().strftime("%Y%m%d-%H%M")}.{extension}"'
         }
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,135 @@
+# DBの行 → モデル・JSONの変換
+# 行は自前のデータベースから読んだものなので、Pydanticの検証は省略して組み立てる
+
+import json
+import re
+from datetime import date, datetime
+from typing import Optional
+
+from pydantic import TypeAdapter
+
+from app.models import ArchivedTask, Task
+
+try:
+    import orjson
+except ImportError:  # 任意の依存。なければ標準の json で同じバイト列を作る
+    orjson = None
+
+# 全フィールドを「設定済み」として扱う（model_dump(exclude_unset=True) でも欠けないように）
+_TASK_FIELDS = frozenset(Task.model_fields)
+_ARCHIVED_TASK_FIELDS = frozenset(ArchivedTask.model_fields)
+
+_new_task = Task.__new__
+_set = object.__setattr__
+_fromisoformat = datetime.fromisoformat
+_date_fromisoformat = date.fromisoformat
+
+
+def row_to_task(row) -> Task:
+    """tasksテーブルの行（sqlite3.Row や dict）からTaskを組み立てる
+
+    Task.model_construct と同じ結果になるが、既定値の補完などを省いて
+    インスタンスの属性を直接設定するので、検証ありの Task(...) より速い。
+    """
+    due_date = row["due_date"]
+    task = _new_task(Task)
+    _set(task, "__dict__", {
+        "id": row["id"],
+        "title": row["title"],
+        "description": row["description"],
+        "quadrant": row["quadrant"],
+        "completed": bool(row["completed"]),
+        "due_date": _date_fromisoformat(due_date[:10]) if due_date else None,
+        "created_at": _fromisoformat(row["created_at"]),
+        "updated_at": _fromisoformat(row["updated_at"]),
+        "version": row["version"],
+    })
+    _set(task, "__pydantic_fields_set__", _TASK_FIELDS)
+    _set(task, "__pydantic_extra__", None)
+    _set(task, "__pydantic_private__", None)
+    return task
+
+
+def rows_to_tasks(rows) -> list:
+    """複数の行をTaskのリストに変換"""
+    return [row_to_task(row) for row in rows]
+
+
+def row_to_archived_task(row) -> ArchivedTask:
+    """tasks_archive の行から ArchivedTask を組み立てる（row_to_task と同じく検証を省く）"""
+    values = row_to_task(row).__dict__.copy()
+    values["archived_at"] = _fromisoformat(row["archived_at"])
+    task = _new_task(ArchivedTask)
+    _set(task, "__dict__", values)
+    _set(task, "__pydantic_fields_set__", _ARCHIVED_TASK_FIELDS)
+    _set(task, "__pydantic_extra__", None)
+    _set(task, "__pydantic_private__", None)
+    return task
+
+
+# ---- 行 → JSON（/api/tasks などの応答用） ----
+# Task を作ってから FastAPI の jsonable_encoder に通すと、日時を解析して同じ文字列に
+# 書き戻すことになる。SQLite の CURRENT_TIMESTAMP（YYYY-MM-DD HH:MM:SS）は
+# 区切りを T にするだけで Pydantic の出力と同じになるので、文字列のまま組み立てる
+
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_datetime_adapter = TypeAdapter(datetime)
+
+
+def _json_timestamp(value: str) -> str:
+    if _TIMESTAMP.fullmatch(value):
+        return value[:10] + "T" + value[11:]
+    # それ以外の形（小数秒やタイムゾーンつき）は Pydantic に任せる
+    return _datetime_adapter.dump_python(_fromisoformat(value), mode="json")
+
+
+def _json_date(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    if _DATE.fullmatch(value):
+        return value
+    return _date_fromisoformat(value[:10]).isoformat()
+
+
+def row_to_json_dict(row) -> dict:
+    """Task.model_dump(mode="json") と同じ辞書を行から直接作る（フィールドの順も同じ）"""
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "description": row["description"],
+        "quadrant": row["quadrant"],
+        "completed": bool(row["completed"]),
+        "due_date": _json_date(row["due_date"]),
+        "created_at": _json_timestamp(row["created_at"]),
+        "updated_at": _json_timestamp(row["updated_at"]),
+        "version": row["version"],
+    }
+
+
+def archived_row_to_json_dict(row) -> dict:
+    values = row_to_json_dict(row)
+    values["archived_at"] = _json_timestamp(row["archived_at"])
+    return values
+
+
+def dumps(value) -> bytes:
+    """FastAPI の JSONResponse と同じバイト列（区切りの空白なし、非ASCIIはそのまま）"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def row_to_json(row) -> bytes:
+    """1件のタスクのJSON"""
+    return dumps(row_to_json_dict(row))
+
+
+def rows_to_json(rows) -> bytes:
+    """タスクの配列のJSON"""
+    return dumps([row_to_json_dict(row) for row in rows])
+
+
+def archived_rows_to_json(rows) -> bytes:
+    """アーカイブ済みタスクの配列のJSON"""
+    return dumps([archived_row_to_json_dict(row) for row in rows])
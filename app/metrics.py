@@ -0,0 +1,414 @@
+# 計測（ルートごとのレイテンシ、SQL文ごとの回数と時間、遅いクエリの記録）
+# 結果は GET /metrics（Prometheus のテキスト形式）と GET /api/metrics/slow-queries で見る。
+# 1回の記録はロック1回と数回の加算だけなので、本番でも有効にしたままにできる
+# （TASKS_METRICS=0 で接続の計測とミドルウェアを外す）
+
+import bisect
+import contextvars
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get("TASKS_METRICS", "1") != "0"
+# この時間（ミリ秒）を超えた文を遅いクエリとして記録し、実行計画を取る
+SLOW_QUERY_MS = float(os.environ.get("TASKS_SLOW_QUERY_MS", "100"))
+# 保持する遅いクエリの件数
+SLOW_LOG_SIZE = 100
+
+# ヒストグラムのバケット（秒）
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# どのルートにも一致しなかったリクエストのラベル（パスをそのままラベルにしない）
+UNMATCHED_ROUTE = "unmatched"
+
+# 実行計画を取れる文（EXPLAIN QUERY PLAN は文を実行しない）
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+class Histogram:
+    """ラベルの組ごとの累積ヒストグラム（スレッドセーフ）"""
+
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # ラベルの値の組 -> [バケットごとの件数..., 合計, 件数]
+        self._lock = threading.Lock()
+
+    def observe(self, values: tuple, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {values: list(series) for values, series in self._series.items()}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def exposition(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self.snapshot().items()):
+            labels = format_labels(self.labels, values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """ラベルの組ごとのカウンター（スレッドセーフ）"""
+
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values: tuple, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def exposition(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, value in sorted(self.snapshot().items()):
+            lines.append(f"{self.name}{{{format_labels(self.labels, values)}}} {format_value(value)}")
+        return lines
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value) -> str:
+    return str(value) if isinstance(value, int) else f"{value:.6f}"
+
+
+request_duration = Histogram(
+    "mytask_http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route"), REQUEST_BUCKETS)
+requests_total = Counter(
+    "mytask_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+request_sql_statements = Counter(
+    "mytask_http_request_sql_statements_total", "SQL statements executed while serving a route",
+    ("method", "route"))
+request_sql_seconds = Counter(
+    "mytask_http_request_sql_seconds_total", "Time spent in SQL while serving a route", ("method", "route"))
+statement_duration = Histogram(
+    "mytask_sql_statement_duration_seconds", "SQL statement time (execute + fetch) by statement",
+    ("statement",), STATEMENT_BUCKETS)
+slow_statements = Counter(
+    "mytask_sql_slow_statements_total", "SQL statements slower than the slow query threshold",
+    ("statement",))
+
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+_plans = {}  # 正規化した文 -> 実行計画（文ごとに最初の1回だけ取る）
+_normalized = {}  # SQLの原文 -> 正規化した文
+_NORMALIZED_CACHE_SIZE = 1024
+
+# リクエスト中に実行したSQLの [文の数, 秒数]（DBスレッドにもコンテキストごと引き継がれる）
+_request_sql = contextvars.ContextVar("request_sql", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_PLACEHOLDER_TUPLE = r"\(\s*\?(?:\s*,\s*\?)*\s*\)"
+# VALUES (?, ?), (?, ?), ... の行の並び（1行でも同じラベルにする）
+_VALUES_ROWS = re.compile(rf"\bVALUES\s*({_PLACEHOLDER_TUPLE})(?:\s*,\s*{_PLACEHOLDER_TUPLE})*", re.IGNORECASE)
+# 検索の語ごとに繰り返す AND (... LIKE ? ...) の並び
+_LIKE_CONDITIONS = re.compile(r"( AND \([^()]*\bLIKE \?[^()]*\))+", re.IGNORECASE)
+
+
+def normalize_statement(sql: str) -> str:
+    """ラベル用にSQLを1行にまとめる
+    件数で長さが変わる部分（(?, ?, ...) の列、VALUES の行の並び、繰り返す LIKE の条件）は1つにまとめ、
+    入力の大きさでラベルが増えないようにする
+    """
+    normalized = _normalized.get(sql)
+    if normalized is None:
+        normalized = _WHITESPACE.sub(" ", sql).strip()
+        normalized = _VALUES_ROWS.sub(r"VALUES \1, ...", normalized)
+        normalized = _LIKE_CONDITIONS.sub(r"\1 ...", normalized)
+        normalized = _PLACEHOLDER_LIST.sub("(?, ...)", normalized)
+        if len(_normalized) < _NORMALIZED_CACHE_SIZE:
+            _normalized[sql] = normalized
+    return normalized
+
+
+def record_statement(sql: str, parameters, seconds: float, conn: Optional[sqlite3.Connection] = None):
+    """SQL文1回分の時間を記録する。しきい値を超えたら遅いクエリとして実行計画と一緒に残す"""
+    statement = normalize_statement(sql)
+    statement_duration.observe((statement,), seconds)
+    totals = _request_sql.get()
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        _record_slow(statement, sql, parameters, seconds, conn)
+
+
+def _record_slow(statement: str, sql: str, parameters, seconds: float, conn):
+    slow_statements.inc((statement,))
+    plan = _plans.get(statement)
+    if plan is None and conn is not None:
+        plan = explain(conn, sql, parameters)
+        if plan is not None:
+            _plans[statement] = plan
+    _slow_log.append({
+        "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "statement": statement,
+        "ms": round(seconds * 1000, 3),
+        "plan": plan,
+    })
+    logger.warning("slow query (%.1f ms): %s%s", seconds * 1000, statement,
+                   "".join(f"\n  {line}" for line in plan or ()))
+
+
+def explain(conn: sqlite3.Connection, sql: str, parameters=()) -> Optional[list]:
+    """EXPLAIN QUERY PLAN の結果を、親子関係を字下げした行のリストで返す（取れない文は None）"""
+    if parameters is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    try:
+        rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    except sqlite3.Error:
+        return None
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def slow_queries() -> list:
+    """記録した遅いクエリ（新しい順）"""
+    return list(reversed(_slow_log))
+
+
+def statement_stats(limit: int = 20) -> list:
+    """合計時間の長い順のSQL文（回数、合計、平均）"""
+    stats = [
+        {"statement": values[0], "count": series[-1], "total_ms": round(series[-2] * 1000, 3),
+         "mean_ms": round(series[-2] * 1000 / series[-1], 3)}
+        for values, series in statement_duration.snapshot().items() if series[-1]
+    ]
+    stats.sort(key=lambda stat: stat["total_ms"], reverse=True)
+    return stats[:limit]
+
+
+def reset():
+    """計測値をすべて消す（テスト・ベンチマーク用）"""
+    for metric in (request_duration, requests_total, request_sql_statements, request_sql_seconds,
+                   statement_duration, slow_statements):
+        metric.clear()
+    _slow_log.clear()
+    _plans.clear()
+
+
+def render_prometheus(gauges: Optional[dict] = None) -> str:
+    """すべての計測値を Prometheus のテキスト形式で返す。gauges は {名前: (説明, 値)} の追加のゲージ"""
+    lines = []
+    for metric in (request_duration, requests_total, request_sql_statements, request_sql_seconds,
+                   statement_duration, slow_statements):
+        lines.extend(metric.exposition())
+    for name, (help, value) in (gauges or {}).items():
+        lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {format_value(value)}"])
+    return "\n".join(lines) + "\n"
+
+
+# ---- SQLの計測 ----
+
+class ProfiledCursor(sqlite3.Cursor):
+    """execute から結果を読み終えるまでの時間を文ごとに記録するカーソル
+
+    時間は execute と fetchone / fetchmany / fetchall の合計。
+    for 文で行を読む場合、その間の時間は含まれない（1行ごとの計測は重いため）。
+    """
+
+    __slots__ = ("_sql", "_parameters", "_elapsed")
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._sql = None
+
+    def _start(self, sql, parameters, seconds):
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = seconds
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            record_statement(sql, self._parameters, self._elapsed, self.connection)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._start(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # パラメータは1行分ではないので実行計画は取らない
+            self._start(sql, None, time.perf_counter() - start)
+            self._finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - start
+            if row is None:
+                self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - start
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - start
+            self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """すべての文を ProfiledCursor で実行し、COMMIT の時間も記録する接続
+    （sqlite3.connect(..., factory=ProfiledConnection) で使う）
+    """
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            record_statement("COMMIT", None, time.perf_counter() - start)
+
+
+def connection_factory():
+    """接続プールに渡す接続クラス（計測が無効なら標準の接続）"""
+    return ProfiledConnection if METRICS_ENABLED else sqlite3.Connection
+
+
+# ---- HTTPの計測 ----
+
+_route_paths = {}  # id(アプリ) -> {エンドポイント: パスのテンプレート}
+
+
+def route_label(scope) -> str:
+    """リクエストに一致したルートのパスのテンプレート（/api/tasks/{task_id} など）"""
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return UNMATCHED_ROUTE
+    paths = _route_paths.get(id(app))
+    if paths is None:
+        paths = _route_paths[id(app)] = {
+            getattr(route, "endpoint", None) or getattr(route, "app", None): route.path
+            for route in getattr(app, "routes", ())
+        }
+    return paths.get(endpoint, UNMATCHED_ROUTE)
+
+
+class RequestMetricsMiddleware:
+    """ルートごとのレイテンシ・ステータス・SQLの回数と時間を記録するASGIミドルウェア
+
+    時間はレスポンスの最後の本体を送り終えるまで（SSEのようなストリームは切断まで）。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        totals = [0, 0.0]
+        token = _request_sql.set(totals)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_sql.reset(token)
+            route = route_label(scope)
+            method = scope["method"]
+            request_duration.observe((method, route), time.perf_counter() - start)
+            requests_total.inc((method, route, str(status)))
+            if totals[0]:
+                request_sql_statements.inc((method, route), totals[0])
+                request_sql_seconds.inc((method, route), totals[1])
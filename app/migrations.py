@@ -0,0 +1,289 @@
+# スキーマのマイグレーション
+# スキーマのバージョンは PRAGMA user_version に記録し、
+# 適用履歴と所要時間は schema_migrations テーブルに残す
+
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _create_tasks_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            quadrant INTEGER NOT NULL CHECK(quadrant IN (1, 2, 3, 4)),
+            position INTEGER DEFAULT 0,
+            completed BOOLEAN DEFAULT 0,
+            due_date TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # バージョン管理以前のデータベースには position カラムがない場合がある
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(tasks)')]
+    if 'position' not in columns:
+        conn.execute('ALTER TABLE tasks ADD COLUMN position INTEGER DEFAULT 0')
+
+
+def _index_quadrant_position(conn: sqlite3.Connection):
+    # get_tasks_by_quadrant の ORDER BY と create_task の MAX(position) 用
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_quadrant_position
+        ON tasks (quadrant, position, created_at)
+    ''')
+
+
+def _index_completed_due_date(conn: sqlite3.Connection):
+    # 期限での絞り込み用
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed_due_date
+        ON tasks (completed, due_date)
+    ''')
+
+
+def _space_positions(conn: sqlite3.Connection):
+    # 象限ごとに 0, 1024, 2048, ... と間隔を空けて振り直す
+    # （移動時に隣り合う2行の間へ1行だけ書き込めるように）
+    conn.execute('''
+        UPDATE tasks SET position = ranked.rank * 1024
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY quadrant ORDER BY position, created_at, id
+            ) - 1 AS rank
+            FROM tasks
+        ) AS ranked
+        WHERE tasks.id = ranked.id
+    ''')
+
+
+def _quadrant_generations(conn: sqlite3.Connection):
+    # 象限ごとの世代番号。tasksへの書き込みのたびにトリガーで増やす
+    # （読み込みキャッシュの検証用。別のワーカーの書き込みも検出できる）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quadrant_generations (
+            quadrant INTEGER PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO quadrant_generations (quadrant) VALUES (1), (2), (3), (4)')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_generation_insert AFTER INSERT ON tasks
+        BEGIN
+            UPDATE quadrant_generations SET generation = generation + 1
+            WHERE quadrant = NEW.quadrant;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_generation_update AFTER UPDATE ON tasks
+        BEGIN
+            UPDATE quadrant_generations SET generation = generation + 1
+            WHERE quadrant IN (OLD.quadrant, NEW.quadrant);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_generation_delete AFTER DELETE ON tasks
+        BEGIN
+            UPDATE quadrant_generations SET generation = generation + 1
+            WHERE quadrant = OLD.quadrant;
+        END
+    ''')
+
+
+def _generation_changed_at(conn: sqlite3.Connection):
+    # 世代番号が最後に変わった時刻（HTTPの Last-Modified 用）
+    conn.execute('ALTER TABLE quadrant_generations ADD COLUMN changed_at TEXT')
+    conn.execute('UPDATE quadrant_generations SET changed_at = CURRENT_TIMESTAMP')
+    for name in ('tasks_generation_insert', 'tasks_generation_update', 'tasks_generation_delete'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    conn.execute('''
+        CREATE TRIGGER tasks_generation_insert AFTER INSERT ON tasks
+        BEGIN
+            UPDATE quadrant_generations
+            SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP
+            WHERE quadrant = NEW.quadrant;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER tasks_generation_update AFTER UPDATE ON tasks
+        BEGIN
+            UPDATE quadrant_generations
+            SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP
+            WHERE quadrant IN (OLD.quadrant, NEW.quadrant);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER tasks_generation_delete AFTER DELETE ON tasks
+        BEGIN
+            UPDATE quadrant_generations
+            SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP
+            WHERE quadrant = OLD.quadrant;
+        END
+    ''')
+
+
+def _tasks_fts(conn: sqlite3.Connection):
+    # タイトルと説明の全文検索（tasks を参照する外部コンテンツのFTS5テーブル）
+    # trigram は空白で区切らない日本語も部分一致で引ける（3文字以上）
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+            title, description,
+            content='tasks', content_rowid='id',
+            tokenize='trigram'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        END
+    ''')
+    # 並べ替えや完了状態の変更では索引を書き換えない
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description);
+            INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    ''')
+    conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def _index_due_quadrant(conn: sqlite3.Connection):
+    # 期限のビューと象限ごとの期限切れ件数用。quadrant まで含めて、件数はインデックスだけで数える
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed_due_quadrant
+        ON tasks (completed, due_date, quadrant)
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_tasks_completed_due_date')
+
+
+def _tasks_archive(conn: sqlite3.Connection):
+    # 完了から時間がたったタスクの移動先。id は tasks のものをそのまま使う（AUTOINCREMENT なので再利用されない）
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT,
+            quadrant INTEGER NOT NULL,
+            position INTEGER,
+            completed BOOLEAN,
+            due_date TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_archive_quadrant ON tasks_archive (quadrant, id)')
+    # アーカイブの対象（完了済みの行だけ）を古い順に引く部分インデックス
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed_updated_at
+        ON tasks (updated_at) WHERE completed = 1
+    ''')
+
+
+def _task_versions(conn: sqlite3.Connection):
+    # タスクの行ごとのバージョン。内容・象限・並び順を書き換えるたびに1増やし、
+    # 書き込みは「読んだときのバージョンのままなら」だけ適用する（楽観的排他制御）
+    conn.execute('ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+    conn.execute('ALTER TABLE tasks_archive ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+
+
+def _deferred_fts_inserts(conn: sqlite3.Connection):
+    # 一括作成・インポートでは行ごとのトリガーで索引に追加せず、チャンクごとに INSERT ... SELECT でまとめて追加する
+    # （行ごとのトリガーだとインポートが2倍以上遅くなる）。
+    # tasks_fts_deferred に行がある間だけトリガーを止める。行は書き込みのトランザクションの中でだけ入れて消すので、
+    # 他の接続から見えることはない
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks_fts_deferred (
+            id INTEGER PRIMARY KEY CHECK (id = 1)
+        )
+    ''')
+    conn.execute('DROP TRIGGER IF EXISTS tasks_fts_insert')
+    conn.execute('''
+        CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks
+        WHEN NOT EXISTS (SELECT 1 FROM tasks_fts_deferred)
+        BEGIN
+            INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    ''')
+
+
+# (バージョン, 名前, 適用関数) — 追加のみ。既存のエントリは変更しないこと
+MIGRATIONS = [
+    (1, "create tasks table", _create_tasks_table),
+    (2, "index tasks (quadrant, position, created_at)", _index_quadrant_position),
+    (3, "index tasks (completed, due_date)", _index_completed_due_date),
+    (4, "space task positions by 1024", _space_positions),
+    (5, "quadrant generation counters", _quadrant_generations),
+    (6, "quadrant generation changed_at", _generation_changed_at),
+    (7, "full-text search on title and description", _tasks_fts),
+    (8, "index tasks (completed, due_date, quadrant)", _index_due_quadrant),
+    (9, "tasks_archive table", _tasks_archive),
+    (10, "task version counters", _task_versions),
+    (11, "deferred full-text indexing for bulk inserts", _deferred_fts_inserts),
+]
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """現在のスキーマバージョン"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def run_migrations(conn: sqlite3.Connection, migrations=MIGRATIONS) -> list:
+    """未適用のマイグレーションを順に適用し、適用したものの一覧を返す
+
+    マイグレーションは1件ずつ BEGIN IMMEDIATE のトランザクションで適用するので、
+    複数のワーカーが同時に起動しても二重に適用されない。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            duration_ms REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+
+    applied = []
+    for version, name, migrate in sorted(migrations, key=lambda m: m[0]):
+        if version <= get_version(conn):
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # ロック取得までの間に他のワーカーが適用済みかもしれない
+            if version <= get_version(conn):
+                conn.rollback()
+                continue
+            start = time.perf_counter()
+            migrate(conn)
+            duration_ms = (time.perf_counter() - start) * 1000
+            conn.execute('INSERT INTO schema_migrations (version, name, duration_ms) VALUES (?, ?, ?)',
+                         (version, name, duration_ms))
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info("migration %d (%s) applied in %.1f ms", version, name, duration_ms)
+        applied.append({"version": version, "name": name, "duration_ms": duration_ms})
+    return applied
+
+
+def get_history(conn: sqlite3.Connection) -> list:
+    """適用済みマイグレーションの履歴（version, name, applied_at, duration_ms）"""
+    return conn.execute(
+        'SELECT version, name, applied_at, duration_ms FROM schema_migrations ORDER BY version'
+    ).fetchall()
@@ -10,6 +10,16 @@ class TaskCreate(BaseModel):
     completed: bool = False
     due_date: Optional[date] = None
 
+class TaskPatch(BaseModel):
+    """一括更新用モデル（idと、変更するフィールドだけを指定する）"""
+    id: int
+    # title / quadrant / completed は null にできない（省略すると変更しない）
+    title: str = Field(None, min_length=1, max_length=200)
+    description: Optional[str] = Field(None, max_length=1000)
+    quadrant: int = Field(None, ge=1, le=4)
+    completed: bool = None
+    due_date: Optional[date] = None
+
 class Task(BaseModel):
     """タスクモデル（全フィールドを含む）"""
     id: int
@@ -20,6 +30,11 @@ class Task(BaseModel):
     due_date: Optional[date] = None
     created_at: datetime
     updated_at: datetime
+    version: int = 1  # 更新のたびに増える（If-Match / 楽観的排他制御に使う）
 
     class Config:
-        from_attributes = True  # ORMモード（SQLAlchemyなどと連携する場合）
\ No newline at end of file
+        from_attributes = True  # ORMモード（SQLAlchemyなどと連携する場合）
+
+class ArchivedTask(Task):
+    """アーカイブ済みのタスク"""
+    archived_at: datetime
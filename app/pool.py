@@ -0,0 +1,212 @@
+# SQLite接続プール
+# 接続を長寿命で使い回し、PRAGMAは接続ごとに一度だけ適用する
+
+import functools
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# SQLiteのエラーコード
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+class PoolError(Exception):
+    """接続プールの基底例外"""
+
+
+class PoolTimeout(PoolError):
+    """規定時間内に接続を借りられなかった"""
+
+
+class PoolClosed(PoolError):
+    """クローズ済みのプールから接続を借りようとした"""
+
+
+class ConnectionPool:
+    """SQLite接続のプール
+
+    - size: 同時に開いておく接続数の上限
+    - timeout: 空き接続を待つ秒数
+    - health_check_interval: この秒数以上アイドルだった接続は貸し出し前に疎通確認する
+    - on_connect: 新しい接続を開いたときに一度だけ呼ぶフック（PRAGMA適用など）
+    - factory: 接続のクラス（sqlite3.connect の factory。計測用の接続など）
+
+    同じスレッド内で connection() を入れ子に呼んだ場合は同じ接続を返す。
+    """
+
+    def __init__(self, database: str, size: int = 5, timeout: float = 5.0,
+                 health_check_interval: float = 30.0,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 factory: type = sqlite3.Connection):
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._on_connect = on_connect
+        self._factory = factory
+        self._idle = queue.LifoQueue()  # (connection, 返却時刻)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._local = threading.local()
+
+    # ---- 接続の生成・確認 ----
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=self._factory)
+        try:
+            if self._on_connect is not None:
+                self._on_connect(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    # ---- 貸し出し・返却 ----
+
+    def acquire(self) -> sqlite3.Connection:
+        """接続を1本借りる（呼び出し側で release() すること）"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self._closed:
+                raise PoolClosed(self.database)
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"{self.database}: no connection available within {self.timeout}s")
+                try:
+                    conn, released_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            # 長くアイドルだった接続だけ疎通確認する
+            if time.monotonic() - released_at >= self.health_check_interval and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """借りた接続を返す。未確定のトランザクションはロールバックする"""
+        if self._closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """with文で接続を借りる。同一スレッド内の入れ子呼び出しは同じ接続を共有する"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        self._local.depth = 0
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    # ---- 状態・終了処理 ----
+
+    def stats(self) -> dict:
+        """プールの状態（監視用）"""
+        return {
+            "database": self.database,
+            "size": self.size,
+            "open": self._created,
+            "idle": self._idle.qsize(),
+            "closed": self._closed,
+        }
+
+    def close(self):
+        """アイドル接続をすべて閉じる。貸出中の接続は返却時に閉じられる"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+def is_busy_error(exc: BaseException) -> bool:
+    """SQLITE_BUSY / SQLITE_LOCKED かどうか"""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    code = getattr(exc, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(exc)
+    return "locked" in message or "busy" in message
+
+
+def retry_on_busy(retries: Callable[[], int], base_delay: float = 0.01, max_delay: float = 0.5):
+    """SQLITE_BUSYのときに指数バックオフ（ジッター付き）で再実行するデコレータ
+
+    retries は再試行回数を返す関数（設定値を実行時に読むため）。
+    関数全体を1トランザクションとして再実行するので、書き込み関数にだけ付けること。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            attempts = retries()
+            delay = base_delay
+            for attempt in range(attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except sqlite3.OperationalError as exc:
+                    if attempt >= attempts or not is_busy_error(exc):
+                        raise
+                time.sleep(delay * (0.5 + random.random()))
+                delay = min(delay * 2, max_delay)
+        return wrapper
+    return decorator
@@ -0,0 +1,105 @@
+# HTMLの断片の描画
+# テンプレートは起動時にコンパイルしておく。タスクカードは表示するフィールドだけで決まるので、
+# 描画結果をタスクごとにキャッシュし、一覧はキャッシュしたカードをつなげて返す
+
+import os
+
+from fastapi.templating import Jinja2Templates
+from markupsafe import Markup, escape
+
+from app import database
+from app.cache import LRUCache
+from app.mappers import row_to_task
+
+templates = Jinja2Templates(directory="templates")
+# 起動後はテンプレートファイルの更新を確認しない（開発中は TASKS_TEMPLATE_RELOAD=1）
+templates.env.auto_reload = os.environ.get("TASKS_TEMPLATE_RELOAD") == "1"
+
+# 起動時にコンパイルしておくテンプレート
+PRECOMPILED_TEMPLATES = ("index.html", "task_card.html", "task_list.html", "board.html", "task_detail.html",
+                         "search_results.html", "due_list.html", "due_summary.html")
+
+# 描画済みカードのキャッシュ（タスク1件につき1エントリ。TASKS_CARD_CACHE_SIZE=0 で無効）
+CARD_CACHE_SIZE = int(os.environ.get("TASKS_CARD_CACHE_SIZE", "10000"))
+card_cache = LRUCache(CARD_CACHE_SIZE)
+
+
+def precompile():
+    """テンプレートをコンパイルしてJinjaの環境に載せておく（最初のリクエストでコンパイルしないように）"""
+    for name in PRECOMPILED_TEMPLATES:
+        templates.get_template(name)
+
+
+def _card_version(row) -> tuple:
+    # バージョンは書き込みのたびに増える。削除後に同じIDが再利用された場合のために表示するフィールドも含める
+    return (row["version"], row["updated_at"], row["quadrant"], row["title"])
+
+
+def render_cards(rows) -> list:
+    """タスクの行ごとのカードのHTML（同じ内容なら前回の描画結果を使う）"""
+    # マクロを直接呼ぶ（カードごとにテンプレートのコンテキストを作る render() の約半分の時間）
+    task_card = templates.get_template("task_card.html").module.task_card
+    cards = []
+    for row in rows:
+        key = (database.current_database(), row["id"])
+        version = _card_version(row)
+        html = card_cache.get(key, version)
+        if html is None:
+            # Jinjaの属性アクセスは sqlite3.Row よりモデルの方が速い
+            html = task_card(row_to_task(row))
+            card_cache.put(key, version, html)
+        cards.append(html)
+    return cards
+
+
+def render_card(row) -> Markup:
+    """タスクの行からカードのHTML"""
+    return render_cards([row])[0]
+
+
+def render_list(rows) -> str:
+    """象限のタスク一覧のHTML"""
+    return templates.get_template("task_list.html").render(cards=render_cards(rows))
+
+
+def render_board(board: dict) -> str:
+    """{quadrant: 行のリスト} から hx-swap-oob で各象限に差し込むHTML"""
+    return templates.get_template("board.html").render(
+        board=[(quadrant_id, render_cards(rows)) for quadrant_id, rows in board.items()]
+    )
+
+
+def highlight_html(text) -> Markup:
+    """検索結果の文字列をエスケープし、一致箇所の印を <mark> にする"""
+    if not text:
+        return Markup("")
+    return Markup(str(escape(text))
+                  .replace(database.HIGHLIGHT_START, "<mark>")
+                  .replace(database.HIGHLIGHT_END, "</mark>"))
+
+
+def render_search_results(rows, query: str = "", too_short: bool = False) -> str:
+    """検索結果のカード（一致箇所を強調する。キャッシュはしない）
+    too_short のときは結果の代わりに、もっと長い語を入れるよう促す
+    """
+    results = [
+        {
+            "task": row_to_task(row),
+            "title_html": highlight_html(row["title_highlight"]),
+            "snippet": highlight_html(row["description_snippet"]),
+        }
+        for row in rows
+    ]
+    return templates.get_template("search_results.html").render(results=results, query=query, too_short=too_short)
+
+
+def render_due_list(rows) -> str:
+    """期限のビューのカード（期限を表示する。キャッシュはしない）"""
+    return templates.get_template("due_list.html").render(tasks=[row_to_task(row) for row in rows])
+
+
+def render_due_summary(overdue: dict, next_due_rows) -> str:
+    """期限切れの件数バッジと「次の期限」の一覧（hx-swap-oob）"""
+    return templates.get_template("due_summary.html").render(
+        overdue=overdue, next_due=[row_to_task(row) for row in next_due_rows]
+    )
@@ -0,0 +1,2 @@
+# ベンチマーク
+# 各スクリプトは `python -m benchmarks.<名前>` で実行する
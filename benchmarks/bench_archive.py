@@ -0,0 +1,83 @@
+# アーカイブ: 完了済みが大半のボードで、アーカイブ前後のボードの描画時間とテーブルの大きさを比べる。
+# バッチごとのトランザクションの長さ（書き込みロックを持つ時間）と、
+# アーカイブ中に並行して行うタスク作成の待ち時間も測る
+#
+#   python -m benchmarks.bench_archive [件数] [完了済みの割合]
+
+import asyncio
+import sys
+import time
+
+import app.async_database as async_database
+from app.archive import ArchiveJob
+from app.rendering import render_board
+from benchmarks.common import seed_tasks, summarize, temp_database
+
+
+def age_completed(db, ratio: float):
+    """ratio の割合のタスクを、90日前に完了したことにする"""
+    with db.connection() as conn:
+        conn.execute('''
+            UPDATE tasks SET completed = 1, updated_at = datetime('now', '-90 days')
+            WHERE id % 1000 < ?
+        ''', (int(ratio * 1000),))
+        conn.execute("UPDATE tasks SET completed = 0 WHERE id % 1000 >= ?", (int(ratio * 1000),))
+        conn.commit()
+
+
+async def drive(job: ArchiveJob) -> dict:
+    batch_seconds = []
+    original = async_database.archive_completed_tasks
+
+    async def timed(*args):
+        start = time.perf_counter()
+        count = await original(*args)
+        batch_seconds.append(time.perf_counter() - start)
+        return count
+
+    import app.archive as archive_module
+    archive_module.archive_completed_tasks = timed
+    writes = []
+    running = True
+
+    async def writer():
+        # アーカイブ中もユーザーの書き込みが通ることを確かめる
+        while running:
+            start = time.perf_counter()
+            await async_database.insert_task("並行して作成", None, 1)
+            writes.append(time.perf_counter() - start)
+            await asyncio.sleep(0.005)
+
+    writer_task = asyncio.create_task(writer())
+    try:
+        result = await job.run()
+    finally:
+        running = False
+        await writer_task
+        archive_module.archive_completed_tasks = original
+    return {"result": result, "batches": summarize(batch_seconds), "writes": summarize(writes)}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.9
+    with temp_database() as db:
+        seed_tasks(count)
+        age_completed(db, ratio)
+        job = ArchiveJob(render_board, interval=0, measure=True)
+        measured = asyncio.run(drive(job))
+        async_database.shutdown_executors()
+
+    result = measured["result"]
+    before, after = result["before"], result["after"]
+    print(f"{count} tasks, {ratio:.0%} completed 90 days ago")
+    print(f"  archived {result['archived']} in {result['batches']} batches ({result['seconds']:.1f} s)")
+    print(f"  hot table: {before['tasks']} -> {after['tasks']} rows, "
+          f"board render (uncached): {before['board_render_ms']:.1f} ms -> {after['board_render_ms']:.1f} ms")
+    batches, writes = measured["batches"], measured["writes"]
+    print(f"  batch transaction p50={batches['p50_ms']:.1f} ms p99={batches['p99_ms']:.1f} ms | "
+          f"concurrent insert p50={writes['p50_ms']:.1f} ms p99={writes['p99_ms']:.1f} ms ({writes['count']} inserts)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# 同期DB呼び出しと非同期DB呼び出しのレイテンシ比較
+# 同じハンドラを「イベントループ上で同期呼び出し（変更前）」と
+# 「専用スレッドへ await（変更後）」で実装し、それぞれを uvicorn で起動して
+# 同時接続数 1 / 10 / 100 のクライアントから p50/p99 を測る
+#
+#   python -m benchmarks.bench_async [1クライアントあたりのリクエスト数]
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+import app.database as database
+import app.async_database as async_database
+from benchmarks.common import seed_tasks, summarize
+
+before_app = FastAPI()
+after_app = FastAPI()
+
+
+@before_app.get("/api/tasks/quadrant/{quadrant_id}")
+async def sync_quadrant(quadrant_id: int):
+    return {"count": len(database.get_tasks_by_quadrant(quadrant_id))}
+
+
+@after_app.get("/api/tasks/quadrant/{quadrant_id}")
+async def async_quadrant(quadrant_id: int):
+    return {"count": len(await async_database.get_tasks_by_quadrant(quadrant_id))}
+
+
+def serve(app_name: str, db_path: str, port: int):
+    import uvicorn
+    database.DATABASE = db_path
+    app = before_app if app_name == "before" else after_app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/api/tasks/quadrant/1")
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+async def drive(base_url: str, clients: int, requests_per_client: int) -> list:
+    samples = []
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(index):
+            for i in range(requests_per_client):
+                start = time.perf_counter()
+                response = await client.get(f"/api/tasks/quadrant/{(index + i) % 4 + 1}")
+                samples.append(time.perf_counter() - start)
+                assert response.status_code == 200
+
+        await asyncio.gather(*[worker(i) for i in range(clients)])
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("requests", nargs="?", type=int, default=20)
+    parser.add_argument("--serve", choices=["before", "after"])
+    parser.add_argument("--db")
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.db, args.port)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "bench.db")
+        database.DATABASE = db_path
+        database.init_db()
+        seed_tasks(2000)
+        database.close_pools()
+
+        for name in ("before", "after"):
+            port = free_port()
+            server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_async",
+                                       "--serve", name, "--db", db_path, "--port", str(port)])
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                wait_until_ready(base_url)
+                for clients in (1, 10, 100):
+                    stats = summarize(asyncio.run(drive(base_url, clients, args.requests)))
+                    print(f"{name:>6} clients={clients:>3}: p50={stats['p50_ms']:8.2f} ms "
+                          f"p99={stats['p99_ms']:8.2f} ms")
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
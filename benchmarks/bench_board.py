@@ -0,0 +1,51 @@
+# ボードの再読み込み：象限ごとの4リクエストと /api/board の1リクエストを比べる
+# 書き込みの直後を想定して、毎回キャッシュを空にしてから取得する
+#
+#   python -m benchmarks.bench_board [象限あたりの件数] [リフレッシュ回数]
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+import app.async_database as async_database
+from benchmarks.common import seed_tasks, summarize, temp_database
+
+
+async def refresh(app, rounds: int, combined: bool) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    samples = []
+    requests = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(rounds):
+            async_database.database.task_cache.clear()
+            start = time.perf_counter()
+            if combined:
+                urls = ["/api/board"]
+            else:
+                urls = [f"/api/tasks/quadrant/{quadrant}" for quadrant in (1, 2, 3, 4)]
+            # ブラウザと同じく4象限は並行して取得する
+            responses = await asyncio.gather(*(client.get(url) for url in urls))
+            samples.append(time.perf_counter() - start)
+            requests += len(responses)
+            assert all(response.status_code == 200 for response in responses)
+    return {"requests": requests, **summarize(samples)}
+
+
+def main():
+    per_quadrant = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with temp_database():
+        from app.main import app
+        seed_tasks(per_quadrant * 4)
+        for combined in (False, True):
+            result = asyncio.run(refresh(app, rounds, combined))
+            name = "/api/board" if combined else "4 x quadrant"
+            print(f"{name:>13}: requests={result['requests']:4d}, "
+                  f"p50={result['p50_ms']:7.2f} ms, p95={result['p95_ms']:7.2f} ms")
+        async_database.shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
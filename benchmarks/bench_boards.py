@@ -0,0 +1,115 @@
+# ボードごとのデータベースファイル: あるボードへの大量の書き込みが、別のボードの書き込みを待たせないかを測る。
+#   shared:   2つのチームが1つのファイル（1本の書き込みスレッドと1つの書き込みロック）を共有する
+#   separate: チームごとのファイル（別の書き込みスレッド）
+# ボードの数を増やしたときの書き込み件数の合計も測る
+#
+#   python -m benchmarks.bench_boards [秒数]
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import app.async_database as async_database
+import app.database as db_module
+from benchmarks.common import summarize
+
+BURST_SIZE = 500
+
+
+def board_paths(tmpdir: str, count: int) -> list:
+    """書き込みスレッドが重ならないファイル名を count 個選ぶ"""
+    lanes = async_database.WRITE_WORKERS
+    paths, used = [], set()
+    index = 0
+    while len(paths) < count:
+        path = os.path.join(tmpdir, f"board{index}.db")
+        lane = async_database.write_lane(path, lanes)
+        if lane not in used or len(used) >= lanes:
+            paths.append(path)
+            used.add(lane)
+        index += 1
+    return paths
+
+
+async def open_board(path: str):
+    with db_module.use_database(path):
+        await async_database.ensure_db()
+
+
+async def burst_writer(path: str, stop: asyncio.Event) -> int:
+    """1チームの大量の書き込み（BURST_SIZE 件ずつの一括作成を繰り返す）"""
+    tasks = [{"title": f"一括{i}", "description": None, "quadrant": i % 4 + 1, "completed": False,
+              "due_date": None} for i in range(BURST_SIZE)]
+    written = 0
+    with db_module.use_database(path):
+        while not stop.is_set():
+            written += len(await async_database.bulk_insert_tasks(tasks))
+    return written
+
+
+async def interactive_writer(path: str, count: int) -> list:
+    """もう1チームの普段の操作（1件ずつの作成）の待ち時間"""
+    samples = []
+    with db_module.use_database(path):
+        for _ in range(count):
+            start = time.perf_counter()
+            await async_database.insert_task("普段の操作", None, 1)
+            samples.append(time.perf_counter() - start)
+            await asyncio.sleep(0.002)
+    return samples
+
+
+async def isolation(paths: list, count: int = 300) -> dict:
+    burst_path, interactive_path = paths
+    for path in set(paths):
+        await open_board(path)
+    stop = asyncio.Event()
+    burst = asyncio.create_task(burst_writer(burst_path, stop))
+    samples = await interactive_writer(interactive_path, count)
+    stop.set()
+    await burst
+    return summarize(samples)
+
+
+async def throughput(paths: list, seconds: float) -> float:
+    """ボードごとに1つの書き込みループを seconds 秒回したときの、1秒あたりの作成件数の合計"""
+    for path in paths:
+        await open_board(path)
+    deadline = time.perf_counter() + seconds
+
+    async def writer(path):
+        written = 0
+        with db_module.use_database(path):
+            while time.perf_counter() < deadline:
+                await async_database.insert_task("作成", None, written % 4 + 1)
+                written += 1
+        return written
+
+    return sum(await asyncio.gather(*(writer(path) for path in paths))) / seconds
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        try:
+            shared_path = os.path.join(tmpdir, "shared.db")
+            shared = asyncio.run(isolation([shared_path, shared_path]))
+            separate = asyncio.run(isolation(board_paths(tmpdir, 2)))
+            print(f"single inserts while another team bulk-inserts {BURST_SIZE} at a time:")
+            print(f"  shared file     p50={shared['p50_ms']:7.2f} ms p99={shared['p99_ms']:7.2f} ms")
+            print(f"  separate files  p50={separate['p50_ms']:7.2f} ms p99={separate['p99_ms']:7.2f} ms")
+
+            print(f"insert throughput, one writer per board ({async_database.WRITE_WORKERS} writer threads, "
+                  f"{os.cpu_count()} CPUs):")
+            for count in (1, 2, 4, 8):
+                rate = asyncio.run(throughput(board_paths(os.path.join(tmpdir, f"t{count}"), count), seconds))
+                print(f"  {count} boards  {rate:8.0f} inserts/s")
+        finally:
+            async_database.shutdown_executors()
+            db_module.close_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# 一括API: 10000件を1リクエストで作成・完了・削除する時間と、1件ずつのリクエストとの比較
+#
+#   python -m benchmarks.bench_bulk [件数] [1件ずつ送る件数]
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+import app.async_database as async_database
+from benchmarks.common import temp_database
+
+
+async def run(app, count: int, single: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    timings = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        start = time.perf_counter()
+        for i in range(single):
+            response = await client.post("/api/tasks", json={"title": f"単発{i}", "quadrant": i % 4 + 1})
+            assert response.status_code == 200
+        timings["single create (per item)"] = (time.perf_counter() - start) / single
+
+        tasks = [{"title": f"一括{i}", "description": f"説明{i}", "quadrant": i % 4 + 1} for i in range(count)]
+        start = time.perf_counter()
+        response = await client.post("/api/tasks/bulk", json=tasks)
+        timings["bulk create"] = time.perf_counter() - start
+        ids = [item["id"] for item in response.json()["results"]]
+
+        start = time.perf_counter()
+        response = await client.patch("/api/tasks/bulk", json=[{"id": task_id, "completed": True} for task_id in ids])
+        timings["bulk complete"] = time.perf_counter() - start
+        assert all(item["status"] == "updated" for item in response.json()["results"])
+
+        start = time.perf_counter()
+        response = await client.request("DELETE", "/api/tasks/bulk", json={"ids": ids})
+        timings["bulk delete"] = time.perf_counter() - start
+        assert all(item["status"] == "deleted" for item in response.json()["results"])
+    return timings
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    single = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    with temp_database():
+        from app.main import app
+        timings = asyncio.run(run(app, count, single))
+        async_database.shutdown_executors()
+    per_item = timings.pop("single create (per item)")
+    print(f"single create: {per_item * 1000:.2f} ms/item -> {per_item * count:.2f} s for {count} items")
+    for name, seconds in timings.items():
+        print(f"{name:>13}: {seconds * 1000:8.1f} ms for {count} items ({seconds / count * 1e6:.1f} µs/item)")
+
+
+if __name__ == "__main__":
+    main()
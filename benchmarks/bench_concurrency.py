@@ -0,0 +1,108 @@
+# 同じタスクへの同時書き込み: 読んで・描画して・書き戻す（read-modify-write）を複数スレッドで繰り返し、
+#   optimistic:  バージョンつきの UPDATE（update_task(expected_version=...)）。衝突したら返ってきた行で再試行
+#   pessimistic: BEGIN IMMEDIATE で書き込みロックを取ってから読み、書き終えるまで持ち続ける
+#   blind:       バージョンを見ずに上書きする（変更前の動き。速いが更新が失われる）
+# を比べる。タイトルのカウンタを1ずつ増やすので、最後の値と書き込み回数の差が失われた更新の数
+#
+#   python -m benchmarks.bench_concurrency [秒数] [スレッド数]
+
+import logging
+import random
+import sys
+import threading
+import time
+
+from app import metrics
+from app.rendering import render_card
+from benchmarks.common import summarize, temp_database
+
+# 読んでから書くまでの処理（描画や入力の検証）にかかる時間
+THINK_SECONDS = 0.002
+
+
+def counter(row) -> int:
+    return int(row["title"].rsplit(" ", 1)[1])
+
+
+def think(row):
+    render_card(row)
+    time.sleep(THINK_SECONDS)
+
+
+def optimistic(db, task_id: int) -> int:
+    """書き込みまでの再試行の回数を返す"""
+    row = db.get_task_by_id(task_id)
+    retries = 0
+    while True:
+        think(row)
+        try:
+            db.update_task(task_id, title=f"カウンタ {counter(row) + 1}", expected_version=row["version"])
+            return retries
+        except db.VersionConflict as conflict:
+            row = conflict.current
+            retries += 1
+
+
+def pessimistic(db, task_id: int) -> int:
+    with db.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        think(row)
+        conn.execute("UPDATE tasks SET title = ?, updated_at = CURRENT_TIMESTAMP, version = version + 1 WHERE id = ?",
+                     (f"カウンタ {counter(row) + 1}", task_id))
+        conn.commit()
+    return 0
+
+
+def blind(db, task_id: int) -> int:
+    row = db.get_task_by_id(task_id)
+    think(row)
+    db.update_task(task_id, title=f"カウンタ {counter(row) + 1}")
+    return 0
+
+
+def run(db, mode, hot_tasks: int, threads: int, seconds: float) -> dict:
+    task_ids = [db.create_task("カウンタ 0", None, 1) for _ in range(hot_tasks)]
+    deadline = time.perf_counter() + seconds
+    results = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        samples, retries = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            retries += mode(db, rng.choice(task_ids))
+            samples.append(time.perf_counter() - start)
+        results.append((samples, retries))
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    samples = [sample for worker_samples, _ in results for sample in worker_samples]
+    final = sum(counter(db.get_task_by_id(task_id)) for task_id in task_ids)
+    db.bulk_delete_tasks(task_ids)
+    return {**summarize(samples), "max_ms": max(samples) * 1000, "rate": len(samples) / seconds,
+            "retries": sum(retries for _, retries in results), "lost": len(samples) - final}
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    # ロック待ちの BEGIN IMMEDIATE が遅いクエリとして毎回記録されるので、ここでは出力しない
+    metrics.logger.setLevel(logging.ERROR)
+    with temp_database() as db:
+        print(f"{threads} threads, read -> render + {THINK_SECONDS * 1000:.0f} ms -> write, {seconds:.0f} s per case")
+        for hot_tasks in (1, 4, 64):
+            print(f"  {hot_tasks} hot task(s)")
+            for name, mode in (("optimistic", optimistic), ("pessimistic", pessimistic), ("blind", blind)):
+                result = run(db, mode, hot_tasks, threads, seconds)
+                print(f"    {name:<11} {result['rate']:7.0f} writes/s  p50={result['p50_ms']:6.2f} ms "
+                      f"p99={result['p99_ms']:7.2f} ms max={result['max_ms']:7.1f} ms  "
+                      f"retries={result['retries']:5d}  lost={result['lost']}")
+
+
+if __name__ == "__main__":
+    main()
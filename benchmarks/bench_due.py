@@ -0,0 +1,52 @@
+# 期限のビュー: (completed, due_date, quadrant) のインデックスの範囲を読むクエリと、
+# 全件を読んで Python で絞り込む方法を比べる。期限切れの件数と「次の期限」はキャッシュの効果も測る
+#
+#   python -m benchmarks.bench_due [件数]
+
+import sys
+import time
+from datetime import date
+
+from benchmarks.common import seed_tasks, summarize, temp_database
+
+TODAY = "2026-07-01"
+
+
+def filter_in_python(db, view: str) -> list:
+    """比較用: 全件を読んでから絞り込む"""
+    condition = {
+        "overdue": lambda due: due < TODAY,
+        "today": lambda due: due == TODAY,
+        "week": lambda due: TODAY <= due <= "2026-07-07",
+    }[view]
+    rows = [row for row in db.get_all_tasks() if not row["completed"] and row["due_date"] and condition(row["due_date"])]
+    return sorted(rows, key=lambda row: (row["due_date"], row["quadrant"]))[:db.DEFAULT_PAGE_SIZE]
+
+
+def measure(func, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with temp_database() as db:
+        seed_tasks(count)
+        print(f"{count} tasks (half with a due date in {date.fromisoformat(TODAY).year}), today={TODAY}")
+        for view in db.DUE_VIEWS:
+            indexed = measure(lambda: db.get_due_tasks(view, TODAY), 20)
+            python = measure(lambda: filter_in_python(db, view), 2)
+            print(f"  {view:<8} index p50={indexed['p50_ms']:7.2f} ms | load all + filter p50={python['p50_ms']:8.1f} ms")
+
+        db.task_cache.clear()
+        cold = measure(lambda: (db.task_cache.clear(), db.get_overdue_counts(TODAY), db.get_next_due(TODAY)), 10)
+        warm = measure(lambda: (db.get_overdue_counts(TODAY), db.get_next_due(TODAY)), 200)
+        print(f"  overdue counts + next due: cold p50={cold['p50_ms']:.2f} ms, cached p50={warm['p50_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
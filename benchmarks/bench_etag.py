@@ -0,0 +1,56 @@
+# 「refresh from:body」による再取得の嵐で、条件付きGETが節約する転送量とCPU時間を測る
+# 4象限のフラグメントを何度も取り直す。変更なしの状態で If-None-Match を付けるかどうかを比べる
+#
+#   python -m benchmarks.bench_etag [象限あたりの件数] [リフレッシュ回数]
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+import app.async_database as async_database
+from benchmarks.common import seed_tasks, temp_database
+
+
+async def storm(app, refreshes: int, conditional: bool) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    etags = {}
+    received = 0
+    not_modified = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for _ in range(refreshes):
+            for quadrant in (1, 2, 3, 4):
+                headers = {"If-None-Match": etags[quadrant]} if conditional and quadrant in etags else {}
+                response = await client.get(f"/api/tasks/quadrant/{quadrant}", headers=headers)
+                received += len(response.content)
+                if response.status_code == 304:
+                    not_modified += 1
+                else:
+                    etags[quadrant] = response.headers["etag"]
+        return {
+            "bytes": received,
+            "not_modified": not_modified,
+            "cpu_ms": (time.process_time() - cpu_start) * 1000,
+            "wall_ms": (time.perf_counter() - wall_start) * 1000,
+        }
+
+
+def main():
+    per_quadrant = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    refreshes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with temp_database():
+        from app.main import app
+        seed_tasks(per_quadrant * 4)
+        for conditional in (False, True):
+            result = asyncio.run(storm(app, refreshes, conditional))
+            name = "If-None-Match" if conditional else "full GET"
+            print(f"{name:>14}: {result['bytes'] / 1024:9.1f} KiB, 304={result['not_modified']:4d}, "
+                  f"cpu={result['cpu_ms']:8.1f} ms, wall={result['wall_ms']:8.1f} ms")
+        async_database.shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# インポート: エクスポート形式のMarkdown / NDJSONを /api/import にストリーミングで送り、
+# 件数あたりの時間を1件ずつの create_task（MAX(position) を毎回引く）と比べる
+#
+#   python -m benchmarks.bench_import [件数]
+
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+
+import app.async_database as async_database
+from benchmarks.common import temp_database
+
+UPLOAD_CHUNK = 64 * 1024
+
+
+async def markdown_body(count: int):
+    """export_markdown と同じ形式の本文を少しずつ生成する"""
+    per_quadrant = count // 4
+    yield "# Eisenhower Matrix\n\nExported: 2026-01-01 00:00\n\n---\n\n".encode()
+    for quadrant in (1, 2, 3, 4):
+        lines = [f"## Q{quadrant} · 象限\n\n"]
+        for i in range(per_quadrant):
+            lines.append(f"- [{'x' if i % 3 == 0 else ' '}] タスク {quadrant}-{i}\n")
+            if len(lines) >= 2000:
+                yield "".join(lines).encode()
+                lines = []
+        lines.append("\n")
+        yield "".join(lines).encode()
+
+
+async def ndjson_body(count: int):
+    lines = []
+    for i in range(count):
+        lines.append(json.dumps({"id": i + 1, "title": f"タスク{i}", "description": None, "quadrant": i % 4 + 1,
+                                 "completed": i % 3 == 0, "due_date": "2026-05-01" if i % 2 else None,
+                                 "created_at": "2026-01-01T00:00:00", "updated_at": "2026-01-01T00:00:00"},
+                                ensure_ascii=False) + "\n")
+        if len(lines) >= 2000:
+            yield "".join(lines).encode()
+            lines = []
+    if lines:
+        yield "".join(lines).encode()
+
+
+async def upload(app, format: str, body) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        response = await client.post("/api/import", params={"format": format}, content=body)
+        elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.text
+    return {"imported": response.json()["imported"], "seconds": elapsed}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    single = min(count, 5000)
+    for format, body in (("markdown", markdown_body), ("ndjson", ndjson_body)):
+        with temp_database() as database:
+            from app.main import app
+            result = asyncio.run(upload(app, format, body(count)))
+            async_database.shutdown_executors()
+            print(f"{format:>8}: {result['imported']} tasks in {result['seconds']:.1f} s "
+                  f"({result['seconds'] / result['imported'] * 1e6:.1f} µs/task)")
+
+    with temp_database() as database:
+        start = time.perf_counter()
+        for i in range(single):
+            database.create_task(f"タスク{i}", None, i % 4 + 1)
+        per_task = (time.perf_counter() - start) / single
+        print(f"create_task: {per_task * 1e6:.1f} µs/task -> {per_task * count:.0f} s for {count} tasks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# JSONの応答: 変更前の「行 → Task → jsonable_encoder → json.dumps」と、
+# 行から直接 JSON を作る経路（orjson / 標準の json）を比べる。
+# 全件（既定 10万件）とAPIの1ページ（1000件）、ASGI経由の GET /api/tasks も測る
+#
+#   python -m benchmarks.bench_json [件数]
+
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+
+import app.mappers as mappers
+from app.mappers import rows_to_json, rows_to_tasks
+from benchmarks.common import seed_tasks, summarize, temp_database
+
+
+def pydantic_path(rows) -> bytes:
+    # 変更前の /api/tasks と同じ（FastAPI の serialize_response + JSONResponse.render）
+    content = jsonable_encoder(rows_to_tasks(rows))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def stdlib_path(rows) -> bytes:
+    original = mappers.orjson
+    mappers.orjson = None
+    try:
+        return rows_to_json(rows)
+    finally:
+        mappers.orjson = original
+
+
+def best_of(func, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def measure_api(limit: int, repeat: int = 50) -> dict:
+    from app.main import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = await client.get("/api/tasks", params={"limit": limit})
+            samples.append(time.perf_counter() - start)
+            response.raise_for_status()
+    return summarize(samples)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with temp_database() as db:
+        seed_tasks(count)
+        rows = db.get_all_tasks()
+        assert pydantic_path(rows) == rows_to_json(rows) == stdlib_path(rows), "JSON is not byte-compatible"
+        encoder = "orjson" if mappers.orjson is not None else "json (orjson not installed)"
+        print(f"{count} tasks, encoder={encoder}, {len(rows_to_json(rows)) / 1e6:.1f} MB")
+        for label, sample in ((f"all {count}", rows), ("page 1000", rows[:1000])):
+            repeat = 3 if len(sample) > 10_000 else 50
+            before = best_of(pydantic_path, sample, repeat)
+            after = best_of(rows_to_json, sample, repeat)
+            stdlib = best_of(stdlib_path, sample, repeat)
+            print(f"  {label:<11} Task + jsonable_encoder={before * 1000:8.2f} ms | "
+                  f"rows -> {encoder.split()[0]}={after * 1000:7.2f} ms ({before / after:.1f}x) | "
+                  f"rows -> json={stdlib * 1000:7.2f} ms ({before / stdlib:.1f}x)")
+        api = asyncio.run(measure_api(1000))
+        print(f"  GET /api/tasks?limit=1000 (ASGI, end to end) p50={api['p50_ms']:.2f} ms p99={api['p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# 行 → Task 変換のマイクロベンチマーク
+# 変更前の「位置指定 + Pydantic検証」と、カラム名で検証を省略する変換を比べる
+#
+#   python -m benchmarks.bench_mapping
+
+import sqlite3
+import time
+from datetime import datetime
+
+from app.mappers import rows_to_tasks
+from app.migrations import run_migrations
+from app.models import Task
+
+
+def load_rows(count: int) -> list:
+    conn = sqlite3.connect(":memory:")
+    run_migrations(conn)
+    conn.executemany(
+        "INSERT INTO tasks (title, description, quadrant, position, completed, due_date) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"タスク{i}", f"説明{i}", i % 4 + 1, i, i % 3 == 0, "2026-05-01" if i % 2 else None)
+         for i in range(count)],
+    )
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("SELECT * FROM tasks").fetchall()
+    conn.close()
+    return rows
+
+
+def validated(rows) -> list:
+    # 変更前の app/main.py と同じ組み立て方
+    return [
+        Task(
+            id=row[0],
+            title=row[1],
+            description=row[2],
+            quadrant=row[3],
+            completed=bool(row[5]),
+            due_date=datetime.fromisoformat(row[6]) if row[6] else None,
+            created_at=datetime.fromisoformat(row[7]),
+            updated_at=datetime.fromisoformat(row[8])
+        )
+        for row in rows
+    ]
+
+
+def best_of(func, rows, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    for count in (10_000, 100_000):
+        rows = load_rows(count)
+        before = best_of(validated, rows)
+        after = best_of(rows_to_tasks, rows)
+        print(f"{count:>7} rows: validated={before * 1000:8.1f} ms "
+              f"mapper={after * 1000:8.1f} ms ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
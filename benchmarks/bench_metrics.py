@@ -0,0 +1,93 @@
+# 計測のオーバーヘッド: 同じ読み書きを標準の接続と計測つきの接続（ProfiledConnection）で比べる。
+# ミドルウェアは何もしないASGIアプリを包んで、1リクエストあたりの追加時間を測る
+#
+#   python -m benchmarks.bench_metrics [件数]
+
+import asyncio
+import sys
+import time
+
+from app import metrics
+from benchmarks.common import seed_tasks, summarize, temp_database
+
+
+def measure(func, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def database_cases(db) -> dict:
+    rows = db.get_tasks_by_quadrant(2)
+    middle = rows[len(rows) // 2]["id"]
+    return {
+        "get_task_by_id (uncached)": (lambda: (db.task_cache.clear(), db.get_task_by_id(middle)), 2000),
+        "search": (lambda: db.search_tasks("タスク12"), 500),
+        "get_due_tasks": (lambda: db.get_due_tasks("week", "2026-07-01"), 500),
+        "get_tasks_by_quadrant (uncached)": (lambda: (db.task_cache.clear(), db.get_tasks_by_quadrant(1)), 10),
+        "insert_task": (lambda: db.insert_task("計測", None, 4), 500),
+    }
+
+
+def measure_database(db, rounds: int = 3) -> dict:
+    """2つの接続を交互に rounds 回ずつ測り、p50 の最小値を取る（マシンの揺らぎを減らすため）"""
+    results = {}
+    for _ in range(rounds):
+        for enabled in (False, True):
+            metrics.METRICS_ENABLED = enabled
+            db.close_pools()  # 新しい接続クラスでプールを作り直す
+            for name, (func, repeat) in database_cases(db).items():
+                func()
+                p50 = measure(func, repeat)["p50_ms"]
+                by_mode = results.setdefault(name, {})
+                by_mode[enabled] = min(p50, by_mode.get(enabled, p50))
+    return results
+
+
+async def measure_middleware(repeat: int = 20000) -> dict:
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    results = {}
+    for name, asgi in (("plain", endpoint), ("middleware", metrics.RequestMetricsMiddleware(endpoint))):
+        samples = []
+        for _ in range(repeat):
+            scope = {"type": "http", "method": "GET", "path": "/"}
+            start = time.perf_counter()
+            await asgi(scope, receive, send)
+            samples.append(time.perf_counter() - start)
+        results[name] = summarize(samples)
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    original = metrics.METRICS_ENABLED
+    try:
+        with temp_database() as db:
+            seed_tasks(count)
+            results = measure_database(db)
+    finally:
+        metrics.METRICS_ENABLED = original
+
+    print(f"{count} tasks, p50 per call (plain connection -> profiled connection)")
+    for name, by_mode in results.items():
+        plain, profiled = by_mode[False], by_mode[True]
+        print(f"  {name:<34} {plain:8.3f} ms -> {profiled:8.3f} ms ({(profiled - plain) * 1000:+.1f} µs)")
+    middleware = asyncio.run(measure_middleware())
+    plain, measured = middleware["plain"]["p50_ms"], middleware["middleware"]["p50_ms"]
+    print(f"  request middleware (empty ASGI app)  {plain * 1000:.1f} µs -> {measured * 1000:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
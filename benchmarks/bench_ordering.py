@@ -0,0 +1,56 @@
+# ドラッグ&ドロップ1回あたりのコスト比較（象限に10,000件）
+# 変更前: 象限全体の順序を送り、全行のpositionを振り直す
+# 変更後: 前後のタスクを指定して、移動した1行だけを書き込む
+#
+#   python -m benchmarks.bench_ordering [件数] [移動回数]
+
+import random
+import sys
+import time
+
+from benchmarks.common import seed_tasks, temp_database
+
+
+def renumber_moves(db, moves: int, rng) -> tuple:
+    ids = [row["id"] for row in db.get_tasks_by_quadrant(1)]
+    changed = 0
+    start = time.perf_counter()
+    for _ in range(moves):
+        task_id = ids.pop(rng.randrange(len(ids)))
+        ids.insert(rng.randrange(len(ids) + 1), task_id)
+        # 変更前のフロントエンドと同じく、密な連番で全件を送る
+        with db.connection() as conn:
+            before = conn.total_changes
+            db.update_task_positions(1, [(tid, index) for index, tid in enumerate(ids)])
+            changed += conn.total_changes - before
+    return time.perf_counter() - start, changed
+
+
+def gap_moves(db, moves: int, rng) -> tuple:
+    ids = [row["id"] for row in db.get_tasks_by_quadrant(1)]
+    changed = 0
+    start = time.perf_counter()
+    for _ in range(moves):
+        task_id = ids.pop(rng.randrange(len(ids)))
+        index = rng.randrange(len(ids) + 1)
+        ids.insert(index, task_id)
+        before_id = ids[index + 1] if index + 1 < len(ids) else None
+        with db.connection() as conn:
+            before = conn.total_changes
+            db.move_task(task_id, 1, before_id=before_id)
+            changed += conn.total_changes - before
+    return time.perf_counter() - start, changed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    moves = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    for name, run in (("renumber", renumber_moves), ("gap move", gap_moves)):
+        with temp_database() as db:
+            seed_tasks(count, quadrants=(1,))
+            seconds, changed = run(db, moves, random.Random(1))
+            print(f"{name:>9}: {seconds / moves * 1000:8.2f} ms/move, {changed / moves:8.1f} rows written/move")
+
+
+if __name__ == "__main__":
+    main()
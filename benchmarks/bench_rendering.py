@@ -0,0 +1,77 @@
+# /api/tasks/quadrant/{id} の描画: 1象限あたり1000枚のカード
+# 変更前（リクエストごとに全カードをテンプレートで描画）と、
+# 描画済みカードのキャッシュ（空の状態 / 温まった状態）を比べる。
+# どれも象限の行は読み込みキャッシュから返るので、差は描画の分
+#
+#   python -m benchmarks.bench_rendering [象限あたりの件数] [リクエスト数]
+
+import asyncio
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse
+from markupsafe import Markup
+
+import app.async_database as async_database
+from app.mappers import rows_to_tasks
+from app.rendering import card_cache, templates
+from benchmarks.common import seed_tasks, summarize, temp_database
+
+before_app = FastAPI()
+
+# 変更前の task_list.html（カードごとに include して描画。include と同じくカードごとにコンテキストを作る）
+_before_card = templates.env.from_string('{{ task_card(task) }}')
+_before_list = templates.env.from_string(
+    '{% for task in tasks %}\n{{ render_card(task) }}\n{% endfor %}\n'
+    '{% if tasks|length == 0 %}\n<p class="empty-message">タスクがありません</p>\n{% endif %}\n'
+)
+
+
+def render_card_before(task) -> Markup:
+    task_card = templates.get_template("task_card.html").module.task_card
+    return Markup(_before_card.render(task=task, task_card=task_card))
+
+
+@before_app.get("/api/tasks/quadrant/{quadrant_id}", response_class=HTMLResponse)
+async def before_quadrant(quadrant_id: int):
+    rows = await async_database.get_tasks_by_quadrant(quadrant_id)
+    return HTMLResponse(_before_list.render(tasks=rows_to_tasks(rows),
+                                            render_card=render_card_before))
+
+
+async def measure(app, requests: int, clear_cards: bool) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    samples = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/tasks/quadrant/1")  # 読み込みキャッシュを温める
+        for i in range(requests):
+            if clear_cards:
+                card_cache.clear()
+            start = time.perf_counter()
+            response = await client.get(f"/api/tasks/quadrant/{i % 4 + 1}")
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200
+    return summarize(samples)
+
+
+def main():
+    per_quadrant = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    with temp_database():
+        from app.main import app
+        seed_tasks(per_quadrant * 4)
+        card_cache.maxsize = max(card_cache.maxsize, per_quadrant * 4)
+        for name, target, clear_cards in (
+            ("before", before_app, False),
+            ("cards cold", app, True),
+            ("cards warm", app, False),
+        ):
+            stats = asyncio.run(measure(target, requests, clear_cards))
+            print(f"{name:>10}: p50={stats['p50_ms']:7.2f} ms p95={stats['p95_ms']:7.2f} ms")
+        async_database.shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# 全文検索: FTS5（trigram）の search_tasks と、bm25 で全一致を並べる検索、LIKE の走査を比べる
+# 語彙からランダムに作ったタイトルと説明のタスクを投入し、一致件数の違う語で検索する
+#
+#   python -m benchmarks.bench_search [件数]
+
+import random
+import sys
+import time
+
+from benchmarks.common import stopwatch, summarize, temp_database
+
+KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+# 3〜5文字のカタカナの語（出現頻度は語ごとにほぼ同じ）と、よく使う語
+_vocabulary = random.Random(0)
+WORDS = ["".join(_vocabulary.choices(KANA, k=_vocabulary.randint(3, 5))) for _ in range(2000)] + \
+    ["請求書", "レポート", "会議", "見積もり", "レビュー"] * 20
+SEED_CHUNK = 50000
+
+QUERIES = {
+    "rare word": WORDS[42],
+    "common word": "レポート",
+    "two words": "レポート 会議",
+    "short word": "ゾ",
+    "no match": "存在しない語",
+}
+
+
+def seed_text(db, count: int, seed: int = 42):
+    """タイトル3語、説明12語のタスクを投入する（FTSの索引はチャンクごとにまとめて作られる）"""
+    rng = random.Random(seed)
+    for start in range(0, count, SEED_CHUNK):
+        tasks = [
+            {"title": " ".join(rng.choices(WORDS, k=3)), "description": " ".join(rng.choices(WORDS, k=12)),
+             "quadrant": i % 4 + 1}
+            for i in range(start, min(count, start + SEED_CHUNK))
+        ]
+        db.import_task_chunk(tasks)
+
+
+def bm25_search(db, text: str, limit: int = 20) -> list:
+    """比較用: 一致するすべての行を bm25 で並べる（タイトルの重み10。3文字未満の語は使わない）"""
+    match = " ".join(f'"{term}"' for term in text.split() if len(term) >= 3)
+    with db.connection() as conn:
+        return conn.execute('''
+            SELECT tasks.*, highlight(tasks_fts, 0, '[', ']'), snippet(tasks_fts, 1, '[', ']', '…', 16)
+            FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid
+            WHERE tasks_fts MATCH ?
+            ORDER BY bm25(tasks_fts, 10.0, 1.0)
+            LIMIT ?
+        ''', (match, limit)).fetchall()
+
+
+def count_matches(db, text: str) -> int:
+    terms = [term for term in text.split() if len(term) >= 3]
+    if not terms:
+        return 0
+    with db.connection() as conn:
+        return conn.execute("SELECT count(*) FROM tasks_fts WHERE tasks_fts MATCH ?",
+                            (" ".join(f'"{term}"' for term in terms),)).fetchone()[0]
+
+
+def like_scan(db, text: str, limit: int = 20) -> list:
+    """索引を使わない比較用の検索"""
+    with db.connection() as conn:
+        pattern = f"%{text}%"
+        return conn.execute(
+            "SELECT * FROM tasks WHERE title LIKE ? OR description LIKE ? LIMIT ?", (pattern, pattern, limit)
+        ).fetchall()
+
+
+def measure(search, text: str, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = search(text)
+        samples.append(time.perf_counter() - start)
+    return {**summarize(samples), "rows": len(rows)}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with temp_database() as db:
+        with stopwatch() as seeding:
+            seed_text(db, count)
+        print(f"{count} tasks seeded in {seeding['seconds']:.1f} s (with FTS index)")
+        for name, text in QUERIES.items():
+            fts = measure(db.search_tasks, text, 50)
+            # 3文字未満の語だけの検索は索引を引けないので search_tasks は走査せずに空を返す（like の列と比べる）
+            bm25 = measure(lambda t: bm25_search(db, t), text, 5) if len(text) >= 3 else None
+            like = measure(lambda t: like_scan(db, t), text, 5)
+            print(f"  {name:<12} {text!r:<16} matches={count_matches(db, text):>7} "
+                  f"search_tasks p50={fts['p50_ms']:6.2f} ms p99={fts['p99_ms']:6.2f} ms ({fts['rows']} rows) | "
+                  f"bm25 p50={bm25['p50_ms'] if bm25 else float('nan'):7.2f} ms | like p50={like['p50_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
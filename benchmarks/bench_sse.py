@@ -0,0 +1,159 @@
+# SSEの負荷試験: 待機中の接続を多数保ったまま書き込み、全クライアントに届くまでの時間を測る
+# アプリを uvicorn で起動し、N本の /api/events 接続を張ってから、
+# カードの変更（event: task）と象限の移動（event: board）を1件ずつ行う
+#
+#   python -m benchmarks.bench_sse [接続数] [書き込み回数]
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import app.database as database
+from benchmarks.bench_async import free_port
+from benchmarks.common import seed_tasks, summarize
+
+
+def serve(db_path: str, port: int):
+    import uvicorn
+    database.DATABASE = db_path
+    from app.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_until_ready(base_url: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/api/events/stats")
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+def rss_kib(pid: int) -> int:
+    """プロセスの常駐メモリ（KiB）"""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class Listener:
+    """1本のSSE接続。イベントを受け取った時刻を記録する"""
+
+    def __init__(self):
+        self.received = []  # (event, 受信時刻)
+        self.ready = asyncio.Event()
+        self.changed = asyncio.Condition()
+
+    async def run(self, client: httpx.AsyncClient):
+        async with client.stream("GET", "/api/events") as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("retry:"):
+                    self.ready.set()
+                elif line.startswith("event: "):
+                    event = line[7:]
+                elif line == "" and event is not None:
+                    async with self.changed:
+                        self.received.append((event, time.perf_counter()))
+                        self.changed.notify_all()
+                    event = None
+
+    async def wait_for(self, count: int):
+        async with self.changed:
+            await self.changed.wait_for(lambda: len(self.received) >= count)
+
+
+async def drive(base_url: str, pid: int, connections: int, writes: int) -> dict:
+    limits = httpx.Limits(max_connections=connections + 10, max_keepalive_connections=10)
+    timeout = httpx.Timeout(60, read=None)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        rss_before = rss_kib(pid)
+        listeners = [Listener() for _ in range(connections)]
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(listener.run(client)) for listener in listeners]
+        await asyncio.wait_for(asyncio.gather(*(listener.ready.wait() for listener in listeners)), 120)
+        connect_s = time.perf_counter() - start
+        stats = (await client.get("/api/events/stats")).json()
+        rss_after = rss_kib(pid)
+
+        task_id = (await client.get("/api/tasks", params={"limit": 1})).json()[0]["id"]
+        delivery = {"task": [], "board": []}
+        slowest = {"task": [], "board": []}
+        for i in range(writes):
+            if i % 2 == 0:
+                sent = time.perf_counter()
+                await client.patch(f"/api/tasks/{task_id}", data={"completed": "true" if i % 4 else "false"})
+                kind = "task"
+            else:
+                sent = time.perf_counter()
+                await client.patch(f"/api/tasks/{task_id}/quadrant", data={"quadrant": str(i % 4 + 1)})
+                kind = "board"
+            await asyncio.wait_for(asyncio.gather(*(listener.wait_for(i + 1) for listener in listeners)), 60)
+            latencies = [listener.received[i][1] - sent for listener in listeners]
+            delivery[kind].extend(latencies)
+            slowest[kind].append(max(latencies))
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "subscribers": stats["subscribers"],
+        "connect_s": connect_s,
+        "kib_per_connection": (rss_after - rss_before) / connections,
+        "delivery": {kind: summarize(samples) for kind, samples in delivery.items()},
+        "slowest": {kind: summarize(samples) for kind, samples in slowest.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("connections", nargs="?", type=int, default=1000)
+    parser.add_argument("writes", nargs="?", type=int, default=40)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--db")
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.db, args.port)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "bench.db")
+        database.DATABASE = db_path
+        database.init_db()
+        seed_tasks(200)
+        database.close_pools()
+
+        port = free_port()
+        server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_sse",
+                                   "--serve", "--db", db_path, "--port", str(port)])
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_ready(base_url)
+            result = asyncio.run(drive(base_url, server.pid, args.connections, args.writes))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"connections={result['subscribers']} (opened in {result['connect_s']:.1f} s), "
+          f"server RSS ≈ {result['kib_per_connection']:.1f} KiB/connection")
+    for kind in ("task", "board"):
+        delivery = result["delivery"][kind]
+        slowest = result["slowest"][kind]
+        print(f"  event: {kind:<5} delivery p50={delivery['p50_ms']:7.2f} ms p99={delivery['p99_ms']:7.2f} ms, "
+              f"last client p50={slowest['p50_ms']:7.2f} ms p99={slowest['p99_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# 書き込み中の読み込みスループット比較（rollback journal と WAL）
+#
+#   python -m benchmarks.bench_wal [秒数] [読み込みスレッド数]
+
+import sys
+import threading
+import time
+
+import app.database as db_module
+from benchmarks.common import seed_tasks, temp_database
+
+
+def run(profile: str, seconds: float, readers: int) -> dict:
+    with temp_database(profile) as db:
+        seed_tasks(2000)
+        stop = threading.Event()
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def writer():
+            while not stop.is_set():
+                try:
+                    task_id = db.create_task("書き込み", None, 1)
+                    db.update_task(task_id, completed=True)
+                    with lock:
+                        counts["writes"] += 2
+                except Exception:
+                    with lock:
+                        counts["errors"] += 1
+
+        def reader(quadrant):
+            while not stop.is_set():
+                try:
+                    db.get_tasks_by_quadrant(quadrant)
+                    with lock:
+                        counts["reads"] += 1
+                except Exception:
+                    with lock:
+                        counts["errors"] += 1
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader, args=(i % 4 + 1,)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    return {
+        "profile": profile,
+        "reads_per_sec": counts["reads"] / seconds,
+        "writes_per_sec": counts["writes"] / seconds,
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    # 読み込みスレッド + 書き込みスレッドが同時に接続を持てるようにする
+    db_module.POOL_SIZE = max(db_module.POOL_SIZE, readers + 1)
+    for profile in ("default", "wal"):
+        result = run(profile, seconds, readers)
+        print(f"{result['profile']:>8}: reads/s={result['reads_per_sec']:9.1f} "
+              f"writes/s={result['writes_per_sec']:8.1f} errors={result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# ベンチマーク共通のヘルパー
+
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+import app.database as db_module
+
+
+@contextmanager
+def temp_database(profile: str = None):
+    """一時ファイルのデータベースに切り替えて初期化する"""
+    original_db = db_module.DATABASE
+    original_profile = db_module.STORAGE_PROFILE
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_module.DATABASE = os.path.join(tmpdir, "bench.db")
+        if profile is not None:
+            db_module.STORAGE_PROFILE = profile
+        db_module.init_db()
+        try:
+            yield db_module
+        finally:
+            db_module.close_pools()
+            db_module.DATABASE = original_db
+            db_module.STORAGE_PROFILE = original_profile
+
+
+def seed_tasks(count: int, quadrants=(1, 2, 3, 4), seed: int = 42):
+    """count件のタスクを象限に均等に投入する（1トランザクション）"""
+    rng = random.Random(seed)
+    rows = []
+    per_quadrant = {q: 0 for q in quadrants}
+    for i in range(count):
+        quadrant = quadrants[i % len(quadrants)]
+        due_date = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if rng.random() < 0.5 else None
+        rows.append((f"タスク{i}", f"説明{i}", quadrant, per_quadrant[quadrant] * db_module.POSITION_GAP,
+                     1 if rng.random() < 0.3 else 0, due_date))
+        per_quadrant[quadrant] += 1
+    with db_module.connection() as conn:
+        conn.executemany(
+            "INSERT INTO tasks (title, description, quadrant, position, completed, due_date) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+
+
+def percentile(samples, pct: float) -> float:
+    """最近傍法のパーセンタイル"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples) -> dict:
+    """レイテンシ（秒）の要約をミリ秒で返す"""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+@contextmanager
+def stopwatch():
+    """経過秒数を result["seconds"] に入れる"""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
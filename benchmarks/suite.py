@@ -0,0 +1,370 @@
+# ベンチマークスイート
+# 1k / 100k / 1M 件の合成ボードで、app/database.py の関数ごとのマイクロベンチマークと、
+# プロセス内のASGI負荷試験（HTMX / JSON のルートを混ぜて並行に叩く）を行い、結果をJSONに保存する。
+# 2回分のJSONを比べて、しきい値や前回からの悪化を検出できる
+#
+#   python -m benchmarks.suite run [--sizes 1k,100k,1m] [--duration 10] [--concurrency 16] [--out results.json]
+#   python -m benchmarks.suite compare base.json new.json [--tolerance 0.25] [--thresholds benchmarks/thresholds.json]
+#
+# 投入済みのボードは --cache-dir（既定は一時ディレクトリ）にスキーマのバージョンごとに残し、次回から再利用する
+
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import httpx
+
+import app.async_database as async_database
+import app.database as db_module
+from app import migrations
+from benchmarks.common import percentile, seed_tasks, temp_database
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(__file__), "thresholds.json")
+# これより小さい差はノイズとして扱う（ミリ秒）
+NOISE_FLOOR_MS = 0.05
+# 前回と比べる指標。負荷試験の p95 / p99 は並行数ぶんの待ち行列で大きく揺れるので、
+# 既定ではしきい値だけで見る（--all-stats で比べる）
+COMPARED_STATS = ("p50_ms", "ops_per_s", "tasks_per_s", "seconds", "errors")
+
+
+def stats(samples: list, seconds: float = None) -> dict:
+    """レイテンシ（秒）のサンプルの要約（ミリ秒）。seconds を渡すとその時間あたりのスループットも入れる"""
+    result = {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+    if seconds is not None:
+        result["ops_per_s"] = len(samples) / seconds if seconds else 0.0
+    return result
+
+
+# 合成ボード
+
+@contextmanager
+def seeded_board(count: int, cache_dir: str):
+    """count件のボードを作業用のファイルにコピーして切り替える"""
+    version = migrations.MIGRATIONS[-1][0]
+    os.makedirs(cache_dir, exist_ok=True)
+    template = os.path.join(cache_dir, f"board-{count}-v{version}.db")
+    if not os.path.exists(template):
+        print(f"seeding {count} tasks into {template} ...", file=sys.stderr)
+        with temp_database() as db:
+            seed_tasks(count)
+            db.close_pools()  # 最後の接続を閉じるとWALがメインのファイルに書き戻される
+            shutil.copyfile(db.DATABASE, template + ".tmp")
+        os.replace(template + ".tmp", template)
+
+    original_db = db_module.DATABASE
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_module.DATABASE = os.path.join(tmpdir, "bench.db")
+        shutil.copyfile(template, db_module.DATABASE)
+        db_module.init_db()
+        try:
+            yield db_module
+        finally:
+            db_module.close_pools()
+            db_module.DATABASE = original_db
+
+
+# マイクロベンチマーク
+
+def micro_benchmarks(db, count: int, rng: random.Random) -> list:
+    """(名前, 準備, 計測する関数, 回数)。準備は計測に含めない"""
+    def task_id():
+        return rng.randint(1, count)
+
+    def cold():
+        db.task_cache.clear()
+
+    quadrant = lambda: rng.randint(1, 4)  # noqa: E731
+    scan_repeat = max(3, min(200, 2_000_000 // count))
+    created = []  # insert_task で作ったタスク（delete_task で消す）
+
+    def insert():
+        created.append(db.insert_task("ベンチマーク", "説明", quadrant(), "2026-07-01")["id"])
+
+    def move():
+        # 投入直後のタスク id の象限は (id - 1) % 4 + 1。前のタスクと同じ象限に移す
+        before_id = task_id()
+        db.move_task(task_id(), (before_id - 1) % 4 + 1, before_id=before_id)
+
+    def swap_positions():
+        q = quadrant()
+        first, second = [row for row in db.get_tasks_by_quadrant(q)[:2]]
+        db.update_task_positions(q, [(first["id"], second["position"]), (second["id"], first["position"])])
+
+    return [
+        ("get_tasks_by_quadrant.cold", cold, lambda: db.get_tasks_by_quadrant(quadrant()), scan_repeat),
+        ("get_tasks_by_quadrant.warm", None, lambda: db.get_tasks_by_quadrant(quadrant()), 200),
+        ("get_board.cold", cold, lambda: db.get_board(), max(3, scan_repeat // 4)),
+        ("get_board.warm", None, lambda: db.get_board(), 200),
+        ("get_task_by_id", None, lambda: db.get_task_by_id(task_id()), 1000),
+        ("list_tasks.first_page", None, lambda: db.list_tasks(limit=100), 500),
+        ("list_tasks.filtered", None, lambda: db.list_tasks(limit=100, completed=False, due_from="2026-06-01"), 200),
+        ("search_tasks", None, lambda: db.search_tasks(f"タスク{task_id()}"), 500),
+        ("get_due_tasks.overdue", None, lambda: db.get_due_tasks("overdue", "2026-07-01"), 500),
+        ("get_overdue_counts.cold", cold, lambda: db.get_overdue_counts("2026-07-01"), max(3, scan_repeat // 4)),
+        ("insert_task", None, insert, 500),
+        ("update_task", None, lambda: db.update_task(task_id(), title=f"更新{rng.random()}"), 500),
+        ("move_task", None, move, 500),
+        ("move_task_to_quadrant", None, lambda: db.move_task_to_quadrant(task_id(), quadrant()), 500),
+        ("update_task_positions", None, swap_positions, max(3, scan_repeat // 4)),
+        ("delete_task", None, lambda: db.delete_task(created.pop()), 500),
+    ]
+
+
+def run_micro(db, count: int, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    results = {}
+    for name, setup, func, repeat in micro_benchmarks(db, count, rng):
+        if setup is None:
+            func()  # 暖機（キャッシュを使う計測の1回目を含めない）
+        samples = []
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        results[name] = stats(samples)
+        print(f"  micro {name:<28} p50={results[name]['p50_ms']:9.3f} ms p99={results[name]['p99_ms']:9.3f} ms",
+              file=sys.stderr)
+    return results
+
+
+# ASGI負荷試験
+
+def load_routes(count: int) -> list:
+    """(名前, 重み, リクエストを作る関数)。関数は rng を受け取り (method, url, kwargs) を返す"""
+    def task_id(rng):
+        return rng.randint(1, count)
+
+    def move(rng):
+        before_id = task_id(rng)
+        return ("PATCH", f"/api/tasks/{task_id(rng)}/move",
+                {"data": {"quadrant": str((before_id - 1) % 4 + 1), "before_id": str(before_id)}})
+
+    return [
+        ("GET /api/board", 5, lambda rng: ("GET", "/api/board", {})),
+        ("GET /api/tasks/quadrant/{id}", 15, lambda rng: ("GET", f"/api/tasks/quadrant/{rng.randint(1, 4)}", {})),
+        ("GET /api/tasks", 10, lambda rng: ("GET", "/api/tasks", {"params": {"limit": 100}})),
+        ("GET /api/tasks/{id}", 20, lambda rng: ("GET", f"/api/tasks/{task_id(rng)}", {})),
+        ("GET /api/tasks/{id}/detail", 10, lambda rng: ("GET", f"/api/tasks/{task_id(rng)}/detail", {})),
+        ("GET /api/search", 10, lambda rng: ("GET", "/api/search", {"params": {"q": f"タスク{task_id(rng)}"}})),
+        ("GET /api/due/summary", 5, lambda rng: ("GET", "/api/due/summary", {"params": {"today": "2026-07-01"}})),
+        ("POST /api/tasks/html", 5, lambda rng: ("POST", "/api/tasks/html",
+                                                  {"data": {"title": "負荷試験", "quadrant": str(rng.randint(1, 4))}})),
+        ("PATCH /api/tasks/{id}", 10, lambda rng: ("PATCH", f"/api/tasks/{task_id(rng)}",
+                                                   {"data": {"completed": rng.choice(["true", "false"])}})),
+        ("PATCH /api/tasks/{id}/move", 10, move),
+    ]
+
+
+async def run_load(app, count: int, duration: float, concurrency: int, seed: int = 42) -> dict:
+    routes = load_routes(count)
+    names = [route[0] for route in routes]
+    weights = [route[1] for route in routes]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def worker(index: int, deadline: float):
+            rng = random.Random(seed + index)
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                method, url, kwargs = routes[names.index(name)][2](rng)
+                start = time.perf_counter()
+                response = await client.request(method, url, **kwargs)
+                elapsed = time.perf_counter() - start
+                if response.status_code >= 500 or (response.status_code >= 400 and response.status_code != 404):
+                    errors[name] += 1
+                else:
+                    samples[name].append(elapsed)
+
+        # 暖機（テンプレートとキャッシュ）
+        await worker(-1, time.perf_counter() + min(1.0, duration / 10))
+        for name in names:
+            samples[name].clear()
+            errors[name] = 0
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(worker(index, deadline) for index in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        export_start = time.perf_counter()
+        response = await client.get("/api/export", params={"format": "ndjson"})
+        export_seconds = time.perf_counter() - export_start
+        assert response.status_code == 200
+
+    routes_result = {name: {**stats(samples[name], elapsed), "errors": errors[name]} for name in names}
+    for name, result in routes_result.items():
+        print(f"  load  {name:<28} {result['ops_per_s']:8.1f} req/s p50={result['p50_ms']:8.2f} ms "
+              f"p99={result['p99_ms']:8.2f} ms errors={result['errors']}", file=sys.stderr)
+    all_samples = [sample for values in samples.values() for sample in values]
+    return {
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "total": {**stats(all_samples, elapsed), "errors": sum(errors.values())},
+        "routes": routes_result,
+        "export_ndjson": {"seconds": export_seconds, "bytes": len(response.content),
+                          "tasks_per_s": count / export_seconds if export_seconds else 0.0},
+    }
+
+
+# 実行と比較
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args) -> dict:
+    from app.main import app
+    from app.rendering import precompile
+
+    precompile()
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+        },
+        "results": {},
+    }
+    for size in args.sizes.split(","):
+        count = SIZES.get(size.lower()) or int(size)
+        print(f"[{size}] {count} tasks", file=sys.stderr)
+        result = {}
+        if args.only in (None, "micro"):
+            with seeded_board(count, args.cache_dir) as db:
+                result["micro"] = run_micro(db, count)
+        if args.only in (None, "load"):
+            with seeded_board(count, args.cache_dir):
+                result["load"] = asyncio.run(run_load(app, count, args.duration, args.concurrency))
+        report["results"][size] = result
+    async_database.shutdown_executors()
+    return report
+
+
+def flatten(report: dict) -> dict:
+    """比べる指標を "1k/micro/get_board.cold/p50_ms" の形のキーにする"""
+    metrics = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}/{key}" if prefix else key, child)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[prefix] = value
+
+    walk("", report["results"])
+    return metrics
+
+
+def is_latency(key: str) -> bool:
+    return key.endswith("_ms") or key.endswith("/seconds")
+
+
+def is_throughput(key: str) -> bool:
+    return key.endswith("ops_per_s") or key.endswith("tasks_per_s")
+
+
+def compare(base: dict, new: dict, tolerance: float, thresholds: dict,
+            compared_stats=COMPARED_STATS) -> list:
+    """悪化した指標の (キー, 前回, 今回, 理由) のリスト
+    前回との比較は compared_stats の指標だけ、しきい値はすべての指標に適用する
+    """
+    base_metrics = flatten(base)
+    new_metrics = flatten(new)
+    problems = []
+    for key, value in sorted(new_metrics.items()):
+        previous = base_metrics.get(key)
+        if previous is not None and key.rsplit("/", 1)[-1] in compared_stats:
+            if key.endswith("/errors"):
+                if value > previous:
+                    problems.append((key, previous, value, "more errors"))
+            elif previous <= 0:
+                pass
+            elif is_latency(key) and value > previous * (1 + tolerance) and value - previous > NOISE_FLOOR_MS:
+                problems.append((key, previous, value, f"+{value / previous - 1:.0%}"))
+            elif is_throughput(key) and value < previous * (1 - tolerance):
+                problems.append((key, previous, value, f"{value / previous - 1:.0%}"))
+        for pattern, limit in thresholds.items():
+            if fnmatch.fnmatchcase(key, pattern):
+                if is_throughput(key) and value < limit:
+                    problems.append((key, previous, value, f"below threshold {limit}"))
+                elif not is_throughput(key) and value > limit:
+                    problems.append((key, previous, value, f"above threshold {limit}"))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマークスイート")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="ベンチマークを実行してJSONに保存する")
+    run_parser.add_argument("--sizes", default="1k,100k")
+    run_parser.add_argument("--only", choices=("micro", "load"))
+    run_parser.add_argument("--duration", type=float, default=10.0, help="負荷試験の秒数（サイズごと）")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "mytask-bench"))
+    run_parser.add_argument("--out", default="benchmark-results.json")
+    compare_parser = commands.add_parser("compare", help="2回分の結果を比べる（悪化があれば終了コード1）")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--tolerance", type=float, default=0.25, help="許容する悪化の割合")
+    compare_parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS)
+    compare_parser.add_argument("--all-stats", action="store_true", help="p95 / p99 と平均も前回と比べる")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args)
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"✅ {args.out} に保存しました")
+        return
+
+    with open(args.base, encoding="utf-8") as file:
+        base = json.load(file)
+    with open(args.new, encoding="utf-8") as file:
+        new = json.load(file)
+    thresholds = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds, encoding="utf-8") as file:
+            thresholds = json.load(file)
+    compared_stats = COMPARED_STATS + (("p95_ms", "p99_ms", "mean_ms") if args.all_stats else ())
+    problems = compare(base, new, args.tolerance, thresholds, compared_stats)
+    print(f"{base['meta'].get('git') or args.base} -> {new['meta'].get('git') or args.new}: "
+          f"{len(flatten(new))} metrics, {len(problems)} regressions")
+    for key, previous, value, reason in problems:
+        before = f"{previous:.3f}" if previous is not None else "-"
+        print(f"  {key:<64} {before:>12} -> {value:12.3f}  {reason}")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,638 @@
+"""
+データベース層のテスト
+"""
+import asyncio
+import sqlite3
+import threading
+from datetime import date
+
+import pytest
+
+import app.database as db_module
+from app import async_database, migrations
+from app.mappers import row_to_task
+from app.models import Task
+from app.pool import ConnectionPool, PoolClosed, PoolTimeout, retry_on_busy
+
+
+@pytest.fixture(scope="function")
+def db(tmp_path):
+    """一時ファイルのデータベースに切り替える"""
+    original_db = db_module.DATABASE
+    db_module.DATABASE = str(tmp_path / "tasks.db")
+    db_module.init_db()
+
+    yield db_module
+
+    db_module.close_pools()
+    db_module.DATABASE = original_db
+
+
+def rows_written(db, before: dict) -> dict:
+    """象限ごとに書き込まれたタスクの行数（行を書き込むたびに世代番号が1増える）"""
+    after = db.get_generations()
+    return {q: after[q] - before[q] for q in after if after[q] != before[q]}
+
+
+def test_pool_reuses_connection(tmp_path):
+    """返却した接続が再利用されること"""
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert pool.stats()["open"] == 1
+    pool.close()
+
+
+def test_pool_applies_pragmas_once(tmp_path):
+    """on_connectは接続ごとに一度だけ呼ばれること"""
+    calls = []
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2, on_connect=calls.append)
+    for _ in range(5):
+        with pool.connection() as conn:
+            conn.execute("SELECT 1")
+    assert len(calls) == 1
+    pool.close()
+
+
+def test_pool_nested_checkout_shares_connection(tmp_path):
+    """同じスレッドでの入れ子の貸し出しは同じ接続になること"""
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=0.1)
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+    pool.close()
+
+
+def test_pool_timeout_and_close(tmp_path):
+    """上限に達したらタイムアウトし、クローズ後は借りられないこと"""
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=0.05)
+    held = pool.acquire()
+    errors = []
+
+    def borrow():
+        try:
+            pool.acquire()
+        except PoolTimeout as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    thread.join()
+    assert len(errors) == 1
+
+    pool.release(held)
+    pool.close()
+    with pytest.raises(PoolClosed):
+        pool.acquire()
+
+
+def test_pool_rolls_back_uncommitted_work(db):
+    """コミットされずに返却された変更は破棄されること"""
+    with db.connection() as conn:
+        conn.execute("INSERT INTO tasks (title, quadrant) VALUES ('未確定', 1)")
+    assert db.get_all_tasks() == []
+
+
+def test_crud_uses_single_pooled_connection(db):
+    """CRUD操作が1本の接続を使い回すこと"""
+    task_id = db.create_task("プール", None, 1)
+    db.update_task(task_id, completed=True)
+    assert db.get_task_by_id(task_id)[5] == 1
+    db.delete_task(task_id)
+    assert db.get_task_by_id(task_id) is None
+    assert db.get_pool().stats()["open"] == 1
+
+
+def test_wal_profile_applied(db):
+    """WALプロファイルでjournal_modeとPRAGMAが設定されること"""
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == db.BUSY_TIMEOUT_MS
+
+
+def test_retry_on_busy_backs_off_and_succeeds():
+    """SQLITE_BUSYは規定回数まで再試行し、それ以外の例外はそのまま送出すること"""
+    calls = []
+
+    @retry_on_busy(lambda: 3, base_delay=0.001)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+        return "ok"
+
+    assert flaky() == "ok"
+    assert len(calls) == 3
+
+    @retry_on_busy(lambda: 3, base_delay=0.001)
+    def broken():
+        calls.append(1)
+        raise sqlite3.OperationalError("no such table: nope")
+
+    calls.clear()
+    with pytest.raises(sqlite3.OperationalError):
+        broken()
+    assert len(calls) == 1
+
+
+def test_migrations_create_indexes(db):
+    """最新バージョンまで適用され、象限の一覧がインデックスを使うこと"""
+    with db.connection() as conn:
+        assert migrations.get_version(conn) == migrations.MIGRATIONS[-1][0]
+        history = migrations.get_history(conn)
+        assert [row[0] for row in history] == [m[0] for m in migrations.MIGRATIONS]
+        assert all(row[3] >= 0 for row in history)
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE quadrant = ? ORDER BY position, created_at", (1,)))
+        assert "idx_tasks_quadrant_position" in plan
+        assert "TEMP B-TREE" not in plan
+    # 再実行しても何も適用されない
+    assert db.init_db() == []
+
+
+def test_migrations_upgrade_legacy_database(tmp_path):
+    """positionカラムのない旧スキーマをアップグレードできること"""
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, "
+                 "description TEXT, quadrant INTEGER NOT NULL, completed BOOLEAN DEFAULT 0, due_date TEXT, "
+                 "created_at TEXT DEFAULT CURRENT_TIMESTAMP, updated_at TEXT DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("INSERT INTO tasks (title, quadrant) VALUES ('旧タスク', 2)")
+    conn.commit()
+
+    applied = migrations.run_migrations(conn)
+    assert [m["version"] for m in applied] == [m[0] for m in migrations.MIGRATIONS]
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(tasks)")]
+    assert "position" in columns
+    # positionが末尾に追加されていてもカラム名で変換できる
+    conn.row_factory = sqlite3.Row
+    task = row_to_task(conn.execute("SELECT * FROM tasks").fetchone())
+    assert (task.title, task.quadrant, task.completed) == ("旧タスク", 2, False)
+    conn.close()
+
+
+def test_async_api_runs_off_event_loop(db):
+    """非同期APIは読み込み・書き込みそれぞれ専用スレッドで実行されること"""
+    async def scenario():
+        loop_thread = threading.get_ident()
+        task_id = await async_database.create_task("非同期", None, 3)
+        writer_threads = await asyncio.gather(*[
+            async_database.run_write(threading.current_thread) for _ in range(5)
+        ])
+        reader_thread = await async_database.run_read(threading.get_ident)
+        row = await async_database.get_task_by_id(task_id)
+        return loop_thread, writer_threads, reader_thread, row
+
+    loop_thread, writer_threads, reader_thread, row = asyncio.run(scenario())
+    async_database.shutdown_executors()
+    assert row[1] == "非同期"
+    assert reader_thread != loop_thread
+    # 書き込みは1本のスレッドに直列化される
+    assert len({thread.ident for thread in writer_threads}) == 1
+    assert writer_threads[0].name.startswith("db-writer")
+
+
+def test_mutations_return_rows_in_one_statement(db):
+    """作成・更新・移動は1文で実行され、結果の行を返すこと"""
+    statements = []
+    with db.connection() as conn:
+        # スキーマの変更（ALTER TABLE）の後は全文検索の索引が最初の書き込みで設定を読み直すので、先に読ませておく
+        conn.execute("SELECT count(*) FROM tasks_fts").fetchone()
+        conn.set_trace_callback(statements.append)
+        first = db.insert_task("一件目", None, 1)
+        second = db.insert_task("二件目", "説明", 1, "2026-01-31")
+        updated = db.update_task(first[0], completed=True)
+        moved = db.move_task_to_quadrant(second[0], 2)
+        missing = db.update_task(99999, title="なし")
+        conn.set_trace_callback(None)
+
+    # トリガーの実行は同じ文がもう一度通知されるので、連続する重複は数えない
+    # （「-- 」で始まるのは全文検索の索引が内部で実行する文）
+    statements = [s for s in statements if not s.startswith("--")]
+    sql = [s for i, s in enumerate(statements)
+           if s.split()[0] not in ("BEGIN", "COMMIT") and (i == 0 or statements[i - 1] != s)]
+    assert len(sql) == 5
+    assert (first[1], first[4]) == ("一件目", 0)
+    assert (second[4], second[6]) == (db.POSITION_GAP, "2026-01-31")
+    assert updated[5] == 1
+    assert (moved[3], moved[4]) == (2, 0)
+    assert missing is None
+    assert db.delete_task(first[0]) is True
+    assert db.delete_task(first[0]) is False
+
+
+def test_versioned_update_rejects_stale_writes(db):
+    """バージョンは書き込みのたびに増え、古いバージョンを前提にした書き込みは VersionConflict になること"""
+    task_id = db.create_task("版", None, 1)
+    assert db.update_task(task_id, title="一回目", expected_version=1)["version"] == 2
+    with pytest.raises(db.VersionConflict) as conflict:
+        db.update_task(task_id, title="古い", expected_version=1)
+    assert (conflict.value.current["title"], conflict.value.current["version"]) == ("一回目", 2)
+    with pytest.raises(db.VersionConflict):
+        db.move_task(task_id, 2, expected_version=1)
+    with pytest.raises(db.VersionConflict):
+        db.move_task_to_quadrant(task_id, 2, expected_version=1)
+
+    assert db.move_task(task_id, 2, expected_version=2)["version"] == 3
+    assert db.move_task_to_quadrant(task_id, 3)["version"] == 4
+    assert db.bulk_update_tasks([{"id": task_id, "completed": True}]) == [True]
+    assert db.get_task_by_id(task_id)["version"] == 5
+    # 存在しないタスクは従来どおり None
+    assert db.update_task(99999, title="なし", expected_version=1) is None
+
+    other = db.create_task("別", None, 3)
+    with pytest.raises(db.VersionConflict) as conflict:
+        db.update_task_positions(3, [(other, 0), (task_id, 1024)], {task_id: 4, other: 1})
+    assert [row["id"] for row in conflict.value.current] == [task_id, other]
+    rows = db.update_task_positions(3, [(other, 0), (task_id, 1024)], {task_id: 5, other: 1})
+    assert [(row["id"], row["version"]) for row in rows] == [(other, 2), (task_id, 6)]
+
+def test_row_to_task_matches_validated_model(db):
+    """検証を省略して組み立てたTaskが、検証ありのTaskと同じ内容になること"""
+    row = db.insert_task("変換", "説明", 4, "2026-03-01")
+    task = row_to_task(row)
+    validated = Task.model_validate(task.model_dump())
+    assert task.model_dump() == validated.model_dump()
+    assert task.due_date == date(2026, 3, 1)
+    assert task.model_fields_set == set(Task.model_fields)
+
+
+def test_update_task_positions_writes_only_changes(db):
+    """並べ替えは変わった行だけを書き込み、他の象限のIDは無視すること"""
+    ids = [db.create_task(f"並べ替え{i}", None, 1) for i in range(4)]
+    other = db.create_task("別の象限", None, 2)
+
+    before = db.get_generations()
+    # 先頭2件を入れ替え、他の象限のIDも混ぜる
+    order = [ids[1], ids[0], other, ids[2], ids[3]]
+    rows = db.update_task_positions(1, [(task_id, position) for position, task_id in enumerate(order)])
+
+    # ids[0], ids[1] の入れ替えと、otherを挟んでずれた ids[2], ids[3] の4行だけ
+    assert rows_written(db, before) == {1: 4}
+    assert [row["id"] for row in rows] == [ids[1], ids[0], ids[2], ids[3]]
+    assert db.get_task_by_id(other)["quadrant"] == 2
+    assert db.get_task_by_id(other)["position"] == 0
+
+    before = db.get_generations()
+    rows = db.update_task_positions(1, [(row["id"], row["position"]) for row in rows])
+    assert rows_written(db, before) == {}
+
+
+def test_move_task_touches_one_row(db):
+    """前後を指定した移動は1行だけを書き込むこと"""
+    ids = [db.create_task(f"移動{i}", None, 1) for i in range(5)]
+    assert [db.get_task_by_id(i)["position"] for i in ids] == [n * db.POSITION_GAP for n in range(5)]
+
+    before = db.get_generations()
+    db.move_task(ids[4], 1, before_id=ids[1])
+    db.move_task(ids[0], 1, after_id=ids[3])
+    assert rows_written(db, before) == {1: 2}
+
+    order = [row["id"] for row in db.get_tasks_by_quadrant(1)]
+    assert order == [ids[4], ids[1], ids[2], ids[3], ids[0]]
+
+    # 別の象限へ（基準なしなら末尾）
+    db.create_task("Q2", None, 2)
+    moved = db.move_task(ids[2], 2)
+    assert moved["quadrant"] == 2
+    assert db.get_tasks_by_quadrant(2)[-1]["id"] == ids[2]
+    assert db.move_task(99999, 1) is None
+
+
+def test_move_task_rebalances_when_gap_is_exhausted(db):
+    """隙間がなくなったら象限を振り直して移動できること"""
+    first = db.create_task("先頭", None, 3)
+    second = db.create_task("二番目", None, 3)
+    mover = db.create_task("移動", None, 3)
+    db.update_task(second, position=1)  # 0 と 1 の間には入らない
+
+    db.move_task(mover, 3, after_id=first)
+    rows = db.get_tasks_by_quadrant(3)
+    assert [row["id"] for row in rows] == [first, mover, second]
+    positions = [row["position"] for row in rows]
+    assert positions == sorted(set(positions))
+
+
+def test_quadrant_cache_invalidated_per_quadrant(db):
+    """象限の一覧は、その象限への書き込みがあったときだけ読み直すこと"""
+    db.create_task("Q1", None, 1)
+    db.task_cache.clear()
+    start = db.task_cache.stats()
+
+    db.get_tasks_by_quadrant(1)
+    db.get_tasks_by_quadrant(1)
+    db.create_task("Q2", None, 2)  # 別の象限への書き込み
+    assert [row["title"] for row in db.get_tasks_by_quadrant(1)] == ["Q1"]
+    db.create_task("Q1-2", None, 1)
+    assert [row["title"] for row in db.get_tasks_by_quadrant(1)] == ["Q1", "Q1-2"]
+
+    stats = db.task_cache.stats()
+    assert stats["hits"] - start["hits"] == 2
+    assert stats["misses"] - start["misses"] == 2
+
+
+def test_cache_sees_writes_from_other_workers(db):
+    """別のプロセス（別の接続）からの書き込みも世代番号で検出すること"""
+    task_id = db.create_task("元のタイトル", None, 4)
+    assert db.get_task_by_id(task_id)["title"] == "元のタイトル"
+    assert len(db.get_tasks_by_quadrant(4)) == 1
+
+    other = sqlite3.connect(db.DATABASE)
+    other.execute("UPDATE tasks SET title = '別ワーカー' WHERE id = ?", (task_id,))
+    other.execute("INSERT INTO tasks (title, quadrant) VALUES ('追加', 4)")
+    other.commit()
+    other.close()
+
+    assert db.get_task_by_id(task_id)["title"] == "別ワーカー"
+    assert len(db.get_tasks_by_quadrant(4)) == 2
+
+
+def test_board_reads_stale_quadrants_in_one_scan(db):
+    """ボードは象限ごとの一覧と同じ内容で、変わった象限だけを1回のクエリで読み直すこと"""
+    for quadrant in (1, 2, 3, 4):
+        db.create_task(f"Q{quadrant}", None, quadrant)
+    board = db.get_board()
+    assert list(board) == [1, 2, 3, 4]
+    for quadrant, rows in board.items():
+        assert rows == db.get_tasks_by_quadrant(quadrant)
+
+    db.create_task("Q2-2", None, 2)
+    db.create_task("Q4-2", None, 4)
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            board = db.get_board()
+        finally:
+            conn.set_trace_callback(None)
+    assert [row["title"] for row in board[2]] == ["Q2", "Q2-2"]
+    assert [row["title"] for row in board[4]] == ["Q4", "Q4-2"]
+    assert len([sql for sql in statements if "FROM tasks" in sql]) == 1
+
+
+def test_mutations_notify_change_listeners(db):
+    """書き込みのコミット後に変更の種類と象限が通知されること"""
+    events = []
+    listener = lambda kind, quadrants, task_id: events.append((kind, quadrants, task_id))
+    db.add_change_listener(listener)
+    try:
+        first = db.create_task("一件目", None, 1)
+        second = db.create_task("二件目", None, 1)
+        db.update_task(first, completed=True)
+        db.move_task_to_quadrant(first, 2)
+        db.move_task(second, 2, before_id=first)
+        db.update_task_positions(2, [(first, 0), (second, db.POSITION_GAP)])
+        db.delete_task(first)
+        db.update_task(99999, title="なし")
+        assert db.delete_task(first) is False
+    finally:
+        db.remove_change_listener(listener)
+
+    assert events == [
+        ("board", (1,), first),
+        ("board", (1,), second),
+        ("task", (1,), first),
+        ("board", (2,), first),
+        ("board", (2,), second),
+        ("board", (2,), None),
+        ("board", (2,), first),
+    ]
+
+
+def test_bulk_operations_use_one_transaction(db):
+    """一括操作は1回のコミットで書き込み、入力の順に結果を返すこと"""
+    commits = []
+    with db.connection() as conn:
+        conn.set_trace_callback(lambda sql: commits.append(sql) if sql == "COMMIT" else None)
+        try:
+            ids = db.bulk_insert_tasks([{"title": f"一括{i}", "quadrant": i % 2 + 1} for i in range(100)])
+            found = db.bulk_update_tasks([{"id": ids[0], "completed": True}, {"id": -1, "title": "なし"},
+                                          {"id": ids[1], "quadrant": 3}])
+            deleted = db.bulk_delete_tasks([ids[2], -1, ids[2]])
+        finally:
+            conn.set_trace_callback(None)
+
+    assert len(commits) == 3
+    assert len(ids) == 100 and ids == sorted(ids)
+    assert [row["title"] for row in db.get_tasks_by_quadrant(1)][:2] == ["一括0", "一括4"]
+    assert [row["position"] for row in db.get_tasks_by_quadrant(1)][:2] == [0, 2 * db.POSITION_GAP]
+    assert found == [True, False, True]
+    assert db.get_task_by_id(ids[0])["completed"] == 1
+    assert db.get_task_by_id(ids[1])["quadrant"] == 3
+    assert deleted == [True, False, True]
+    assert db.get_task_by_id(ids[2]) is None
+
+
+def test_bulk_inserts_index_each_chunk_without_the_row_trigger(db):
+    """一括作成・インポートの行も全文検索で引け、トリガーを止める印はトランザクションの外に残らないこと"""
+    db.create_task("一件ずつの会議メモ", None, 1)
+    db.bulk_insert_tasks([{"title": f"一括の会議メモ{i}", "quadrant": 2} for i in range(3)])
+    assert db.import_task_chunk([{"title": "取り込んだ会議メモ", "description": "議事録の下書き", "quadrant": 3}]) == 1
+    db.create_task("後から作った会議メモ", None, 4)
+
+    titles = {row["title"] for row in db.search_tasks("会議メモ", limit=50)}
+    assert len(titles) == 6
+    assert [row["title"] for row in db.search_tasks("議事録")] == ["取り込んだ会議メモ"]
+    with db.connection() as conn:
+        assert conn.execute("SELECT count(*) FROM tasks_fts_deferred").fetchone()[0] == 0
+        # 索引と tasks の内容がずれていれば例外になる
+        conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('integrity-check')")
+
+def test_search_ranks_and_follows_writes(db):
+    """全文検索は索引を引いてタイトルの一致を先に返し、更新と削除がすぐに反映されること"""
+    in_title = db.insert_task("週次レポートを書く", None, 1)
+    in_description = db.insert_task("月曜の準備", "レポートの下書きを見直す", 2)
+    db.insert_task("買い物", "牛乳とパン", 4)
+
+    with db.connection() as conn:
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?", ('"レポート"',)))
+        assert "VIRTUAL TABLE INDEX" in plan
+
+    rows = db.search_tasks("レポート")
+    # 説明だけの一致の方が新しくても、タイトルの一致が先
+    assert [row["id"] for row in rows] == [in_title["id"], in_description["id"]]
+    assert rows[0]["title_highlight"] == f"週次{db.HIGHLIGHT_START}レポート{db.HIGHLIGHT_END}を書く"
+    assert db.HIGHLIGHT_START + "レポート" in rows[1]["description_snippet"]
+
+    # 語はすべて含むものだけ。3文字未満の語と FTS5 の記号も使える
+    assert [row["id"] for row in db.search_tasks("レポート 下書き")] == [in_description["id"]]
+    assert [row["title_highlight"] for row in db.search_tasks("牛乳と")] == ["買い物"]
+    assert db.search_tasks("牛乳と")[0]["description_snippet"] == f"{db.HIGHLIGHT_START}牛乳と{db.HIGHLIGHT_END}パン"
+    # 3文字未満の語は索引で引いた行の絞り込みにだけ使い、短い語だけでは検索しない
+    assert [row["id"] for row in db.search_tasks("レポート 下書")] == [in_description["id"]]
+    assert db.search_tasks("レポート 牛乳") == []
+    assert db.search_tasks("牛乳") == []
+    assert db.search_tasks('"レポ OR *') == []
+    assert db.search_tasks("   ") == []
+
+    db.update_task(in_title["id"], title="週次まとめを書く")
+    db.delete_task(in_description["id"])
+    assert db.search_tasks("レポート") == []
+    assert [row["id"] for row in db.search_tasks("まとめ")] == [in_title["id"]]
+
+
+def test_due_views_use_index_and_cache(db):
+    """期限のビューと期限切れの件数はインデックスの範囲で読み、件数と次の期限はキャッシュすること"""
+    today = "2026-05-10"
+    overdue = db.insert_task("期限切れ", None, 1, "2026-05-01")
+    db.insert_task("期限切れ2", None, 3, "2026-05-09")
+    due_today = db.insert_task("今日", None, 2, today)
+    this_week = db.insert_task("今週", None, 4, "2026-05-16")
+    db.insert_task("来週", None, 4, "2026-05-17")
+    done = db.insert_task("完了済み", None, 1, "2026-05-02")
+    db.update_task(done["id"], completed=True)
+    db.insert_task("期限なし", None, 1)
+
+    assert [row["title"] for row in db.get_due_tasks("overdue", today)] == ["期限切れ", "期限切れ2"]
+    assert [row["id"] for row in db.get_due_tasks("today", today)] == [due_today["id"]]
+    assert [row["id"] for row in db.get_due_tasks("week", today)] == [due_today["id"], this_week["id"]]
+    assert db.get_due_tasks("overdue", today, limit=1)[0]["id"] == overdue["id"]
+    with pytest.raises(ValueError):
+        db.get_due_tasks("someday", today)
+
+    with db.connection() as conn:
+        for view in db.DUE_VIEWS:
+            condition, params = db._due_condition(view, today)
+            plan = " ".join(row[3] for row in conn.execute(
+                f"EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE completed = 0 AND {condition} ORDER BY due_date, quadrant",
+                params))
+            assert "idx_tasks_completed_due_quadrant" in plan and "TEMP B-TREE" not in plan
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT quadrant, count(*) FROM tasks WHERE completed = 0 AND due_date < ? GROUP BY quadrant",
+            (today,)))
+        assert "COVERING INDEX idx_tasks_completed_due_quadrant" in plan
+
+    assert db.get_overdue_counts(today) == {1: 1, 2: 0, 3: 1, 4: 0}
+    assert [row["title"] for row in db.get_next_due(today, 2)] == ["今日", "今週"]
+    # ボードが変わらなければタスクを読まない（世代番号だけ読む）
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            db.get_overdue_counts(today)
+            db.get_next_due(today)
+        finally:
+            conn.set_trace_callback(None)
+    assert not [sql for sql in statements if "FROM tasks" in sql]
+
+    db.update_task(overdue["id"], completed=True)
+    db.update_task(due_today["id"], due_date="2026-05-11")
+    assert db.get_overdue_counts(today) == {1: 0, 2: 0, 3: 1, 4: 0}
+    assert [row["title"] for row in db.get_next_due(today, 2)] == ["今日", "今週"]
+    assert db.get_next_due(today)[0]["due_date"] == "2026-05-11"
+    # 日付が変われば読み直す
+    assert db.get_overdue_counts("2026-05-18")[4] == 2
+
+
+def test_archive_moves_old_completed_tasks_in_batches(db):
+    """古い完了済みタスクだけを、バッチごとのトランザクションでアーカイブに移すこと"""
+    tasks = [db.insert_task(f"完了{i}", None, i % 4 + 1) for i in range(5)]
+    recent = db.insert_task("最近完了", None, 1)
+    active = db.insert_task("未完了", None, 1)
+    for task in tasks + [recent]:
+        db.update_task(task["id"], completed=True)
+    with db.connection() as conn:
+        conn.execute("UPDATE tasks SET updated_at = datetime('now', '-40 days') WHERE title LIKE '完了%'")
+        conn.execute("UPDATE tasks SET updated_at = datetime('now', '-41 days') WHERE id = ?", (active["id"],))
+        conn.commit()
+        plan = " ".join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM tasks INDEXED BY idx_tasks_completed_updated_at "
+            "WHERE completed = 1 AND updated_at < ? ORDER BY updated_at", ("2026-01-01",)))
+        assert "idx_tasks_completed_updated_at" in plan and "TEMP B-TREE" not in plan
+    before = db.get_generations()
+
+    commits = []
+    with db.connection() as conn:
+        conn.set_trace_callback(lambda sql: commits.append(sql) if sql == "COMMIT" else None)
+        try:
+            counts = [db.archive_completed_tasks(30, 2) for _ in range(4)]
+        finally:
+            conn.set_trace_callback(None)
+    assert counts == [2, 2, 1, 0]
+    assert len(commits) == 4
+    assert db.get_table_sizes() == {"tasks": 2, "completed": 1, "archived": 5}
+    assert all(db.get_generations()[q] > before[q] for q in before)
+    assert db.get_task_by_id(tasks[0]["id"]) is None
+    assert db.search_tasks("完了0") == []
+
+    page, cursor = db.list_archived_tasks(limit=3)
+    assert [row["id"] for row in page] == [task["id"] for task in reversed(tasks)][:3]
+    assert page[0]["archived_at"] is not None and page[0]["completed"] == 1
+    rest, next_cursor = db.list_archived_tasks(limit=3, cursor=cursor)
+    assert [row["id"] for row in rest] == [tasks[1]["id"], tasks[0]["id"]] and next_cursor is None
+    assert [row["quadrant"] for row in db.list_archived_tasks(quadrant=1)[0]] == [1, 1]
+    for bad in ("invalid", db._encode_archive_cursor(True), db._encode_archive_cursor("1")):
+        with pytest.raises(ValueError):
+            db.list_archived_tasks(cursor=bad)
+
+
+def test_profiled_connection_records_statements_and_slow_plans(db, monkeypatch):
+    """計測つきの接続が文ごとの時間を記録し、しきい値を超えた文の実行計画を残すこと"""
+    from app import metrics
+    metrics.reset()
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    task_id = db.create_task("計測", None, 1)
+    db.bulk_delete_tasks([task_id, task_id + 1, task_id + 2])
+
+    statements = {stat["statement"]: stat["count"] for stat in metrics.statement_stats(100)}
+    assert statements["COMMIT"] >= 2
+    # 件数で長さが変わるプレースホルダの列は1つのラベルにまとめる
+    assert any("IN (?, ...)" in statement for statement in statements)
+
+    slow = metrics.slow_queries()
+    insert = next(entry for entry in slow if entry["statement"].startswith("INSERT INTO tasks"))
+    assert any("quadrant" in line for line in insert["plan"])
+    assert next(entry for entry in slow if entry["statement"] == "COMMIT")["plan"] is None
+    assert "mytask_sql_slow_statements_total" in metrics.render_prometheus()
+    metrics.reset()
+
+
+def test_statement_labels_do_not_grow_with_input_size(db):
+    """並べ替えの行数や検索の語数が変わっても、SQL文のラベルは1つのままであること"""
+    from app import metrics
+    ids = [db.create_task(f"ラベル{i}", None, 4) for i in range(50)]
+    metrics.reset()
+    for size in (2, 3, 50, 1):
+        # 先頭の size 件を逆順にする（位置が変わる行だけが VALUES の行になる）
+        order = ids[:size][::-1] + ids[size:]
+        db.update_task_positions(4, [(task_id, index * 7) for index, task_id in enumerate(order)])
+    for query in ("ラベル ab", "ラベル ab cd", "ラベル ab cd ef"):
+        db.search_tasks(query)
+
+    statements = [stat["statement"] for stat in metrics.statement_stats(1000)]
+    assert len([s for s in statements if s.startswith("UPDATE tasks SET position")]) == 1
+    assert len([s for s in statements if "LIKE ?" in s]) == 1
+    metrics.reset()
+
+def test_open_pools_are_bounded_and_writes_use_per_board_threads(db, tmp_path, monkeypatch):
+    """開いておく接続プールは上限まで（古いものから閉じる）、書き込みスレッドはボードごとに決まること"""
+    monkeypatch.setattr(db, "MAX_OPEN_DATABASES", 2)
+    paths = [str(tmp_path / f"board{i}.db") for i in range(3)]
+    for path in paths:
+        with db.use_database(path):
+            assert db.ensure_db() is True
+            assert db.ensure_db() is False
+            db.create_task(path, None, 1)
+    assert db.open_databases() == [paths[2], paths[1]]
+    assert set(paths) <= set(db.initialized_databases())
+    # 閉じたボードも次に使うときにプールを作り直して読める
+    with db.use_database(paths[0]):
+        assert [row["title"] for row in db.get_all_tasks()] == [paths[0]]
+    assert db.open_databases() == [paths[0], paths[2]]
+
+    async def writer_threads():
+        names = {}
+        for path in paths:
+            with db.use_database(path):
+                names[path] = await async_database.run_write(lambda: threading.current_thread().name)
+        return names
+
+    names = asyncio.run(writer_threads())
+    async_database.shutdown_executors()
+    lanes = async_database.WRITE_WORKERS
+    assert names == {path: f"db-writer-{async_database.write_lane(path, lanes)}_0" for path in paths}
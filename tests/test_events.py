@@ -0,0 +1,62 @@
+"""
+ライブ更新（SSE）の配信のテスト
+"""
+import asyncio
+
+from app.events import RESYNC, Broadcaster, format_event
+
+
+def test_format_event_prefixes_every_data_line():
+    assert format_event("task", "<div>\n</div>", 3) == "event: task\nid: 3\ndata: <div>\ndata: </div>\n\n"
+    assert format_event("refresh") == "event: refresh\ndata: \n\n"
+
+
+def test_broadcast_reaches_every_subscriber():
+    """同じメッセージが全購読者に届き、close でストリームが終わること"""
+    async def scenario():
+        broadcaster = Broadcaster()
+        streams = [broadcaster.stream(heartbeat=5) for _ in range(3)]
+        for stream in streams:
+            assert (await stream.__anext__()).startswith("retry:")
+        assert len(broadcaster) == 3
+
+        message = format_event("board", "<div></div>")
+        broadcaster.broadcast(message)
+        received = [await stream.__anext__() for stream in streams]
+
+        broadcaster.close()
+        ended = []
+        for stream in streams:
+            ended.append([chunk async for chunk in stream])
+        return received, ended, len(broadcaster)
+
+    received, ended, remaining = asyncio.run(scenario())
+    assert received == [format_event("board", "<div></div>")] * 3
+    assert ended == [[], [], []]
+    assert remaining == 0
+
+
+def test_slow_subscriber_is_told_to_resync():
+    """キューがあふれた購読者は溜まったメッセージの代わりに再読み込みの指示を受け取ること"""
+    async def scenario():
+        broadcaster = Broadcaster(queue_size=2)
+        queue = broadcaster.subscribe()
+        for i in range(5):
+            broadcaster.broadcast(format_event("task", str(i)))
+        return [queue.get_nowait() for _ in range(queue.qsize())], broadcaster.stats()
+
+    messages, stats = asyncio.run(scenario())
+    # 再読み込みで最新の状態になるので、それ以前のメッセージは要らない
+    assert messages == [RESYNC]
+    assert stats["resyncs"] == 2
+
+
+def test_keepalive_when_idle():
+    async def scenario():
+        stream = Broadcaster().stream(heartbeat=0.01)
+        await stream.__anext__()
+        chunk = await stream.__anext__()
+        await stream.aclose()
+        return chunk
+
+    assert asyncio.run(scenario()).startswith(":")
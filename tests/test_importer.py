@@ -0,0 +1,98 @@
+"""
+インポートのテスト
+"""
+import asyncio
+
+import pytest
+
+import app.database as db_module
+from app.importer import ImportFormatError, MarkdownParser, NDJSONParser, import_file, iter_line_batches
+
+
+def test_markdown_parser_reads_export_format():
+    parser = MarkdownParser()
+    tasks = parser.parse([
+        "# Eisenhower Matrix\n", "\n", "Exported: 2026-01-01 09:00\n", "\n", "---\n", "\n",
+        "## Q1 · 緊急かつ重要\n", "\n", "- [ ] 一つ目\n", "- [x] 二つ目\r\n", "\n",
+    ])
+    tasks += parser.parse(["## Q2 · 重要\n", "\n", "—\n", "\n", "## Q4 · その他\n", "- [X] 四つ目\n"])
+    assert [(task["title"], task["quadrant"], task["completed"]) for task in tasks] == [
+        ("一つ目", 1, False), ("二つ目", 1, True), ("四つ目", 4, True),
+    ]
+
+
+def test_parse_errors_report_line_numbers():
+    with pytest.raises(ImportFormatError, match="line 2"):
+        MarkdownParser().parse(["# タイトル\n", "- [ ] 見出しの前\n"])
+    parser = NDJSONParser()
+    parser.parse(['{"title": "正しい", "quadrant": 1}\n'])
+    with pytest.raises(ImportFormatError, match="line 2: quadrant"):
+        parser.parse(['{"title": "不正", "quadrant": 7}\n'])
+
+
+def test_line_batches_across_chunk_boundaries():
+    """行やマルチバイト文字がチャンクをまたいでも正しく分割すること"""
+    data = "一行目\n二行目\n最後の行".encode()
+
+    async def chunks():
+        for i in range(0, len(data), 4):
+            yield data[i:i + 4]
+
+    async def collect():
+        return [line async for lines in iter_line_batches(chunks()) for line in lines]
+
+    assert asyncio.run(collect()) == ["一行目", "二行目", "最後の行"]
+
+
+def test_import_file_in_chunks(tmp_path):
+    """ファイルから一定件数ごとに追加し、象限ごとの並び順を保つこと"""
+    original_db = db_module.DATABASE
+    db_module.DATABASE = str(tmp_path / "tasks.db")
+    db_module.init_db()
+    try:
+        db_module.create_task("既存", None, 2)
+        path = tmp_path / "board.md"
+        lines = ["## Q2 · 重要\n"] + [f"- [ ] タスク{i}\n" for i in range(25)]
+        path.write_text("".join(lines), encoding="utf-8")
+
+        result = import_file(str(path), chunk_size=10)
+        assert result["imported"] == 25
+        rows = db_module.get_tasks_by_quadrant(2)
+        assert [row["title"] for row in rows] == ["既存"] + [f"タスク{i}" for i in range(25)]
+        assert len({row["position"] for row in rows}) == 26
+    finally:
+        db_module.close_pools()
+        db_module.DATABASE = original_db
+
+
+def test_import_stream_counts_only_committed_chunks(monkeypatch):
+    """書き込みに失敗したチャンクは数えず、他の例外でも書き込み中のチャンクを待ってから終えること"""
+    import app.importer as importer
+    committed, notified = [], []
+
+    async def import_task_chunk(tasks):
+        await asyncio.sleep(0.01)
+        if tasks[0]["quadrant"] == 2:
+            raise RuntimeError("disk full")
+        committed.append(len(tasks))
+        return len(tasks)
+
+    monkeypatch.setattr(importer, "import_task_chunk", import_task_chunk)
+    monkeypatch.setattr(db_module, "notify_board_changed", lambda quadrants: notified.append(sorted(quadrants)))
+
+    async def chunks(data, error=None):
+        for line in data:
+            yield line.encode()
+        if error:
+            raise error
+
+    lines = ["## Q1\n", "- [ ] a\n", "- [ ] b\n", "## Q2\n", "- [ ] c\n", "- [ ] d\n"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(importer.import_stream(chunks(lines), chunk_size=2))
+    assert committed == [2] and notified == [[1]]
+
+    # アップロードが途中で切れても、書き込み中だったチャンクの結果を待つ
+    committed.clear(), notified.clear()
+    with pytest.raises(ConnectionError):
+        asyncio.run(importer.import_stream(chunks(lines[:3], ConnectionError()), chunk_size=2))
+    assert committed == [2] and notified == [[1]]
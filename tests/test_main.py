@@ -4,7 +4,10 @@ FastAPIアプリケーションのテスト
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
-from app.database import init_db, get_all_tasks, delete_task
+from app.database import init_db, close_pools, get_all_tasks, delete_task
+import csv
+import io
+import json
 import os
 
 # テスト用のデータベースファイル名
@@ -27,7 +30,8 @@ def client():
     yield client
     
     # テスト後にクリーンアップ
-    # テスト用データベースを削除
+    # 接続プールを閉じてからテスト用データベースを削除
+    close_pools()
     if os.path.exists(TEST_DATABASE):
         os.remove(TEST_DATABASE)
     
@@ -181,3 +185,586 @@ def test_task_title_required(client):
     response = client.post("/api/tasks", json=task_data)
     assert response.status_code == 422  # バリデーションエラー
 
+
+def test_update_missing_task_returns_404(client):
+    """存在しないタスクの更新・削除は404になること"""
+    response = client.put("/api/tasks/99999", json={"title": "なし", "quadrant": 1})
+    assert response.status_code == 404
+    response = client.patch("/api/tasks/99999", data={"completed": "true"})
+    assert response.status_code == 404
+    response = client.delete("/api/tasks/99999")
+    assert response.status_code == 404
+
+def test_update_task_quadrant_html(client):
+    """HTMX用：別の象限の最後尾へ移動するテスト"""
+    client.post("/api/tasks", json={"title": "既存", "quadrant": 3})
+    task_id = client.post("/api/tasks", json={"title": "移動", "quadrant": 1}).json()["id"]
+
+    response = client.patch(f"/api/tasks/{task_id}/quadrant", data={"quadrant": "3"})
+    assert response.status_code == 200
+    assert 'data-quadrant="3"' in response.text
+    assert client.get(f"/api/tasks/{task_id}").json()["quadrant"] == 3
+
+def test_if_match_conflict_returns_current_task(client):
+    """If-Match のバージョンが古い更新は 409 と現在のタスクを返し、上書きしないこと"""
+    task_id = client.post("/api/tasks", json={"title": "元", "quadrant": 1}).json()["id"]
+    etag = client.get(f"/api/tasks/{task_id}").headers["etag"]
+    assert etag == f'"t-default-{task_id}-1"'
+
+    first = client.put(f"/api/tasks/{task_id}", json={"title": "先", "quadrant": 1}, headers={"If-Match": etag})
+    assert first.status_code == 200
+    assert first.json()["version"] == 2
+    assert first.headers["etag"] == f'"t-default-{task_id}-2"'
+
+    # 同じETagで2回目の書き込み（読んだ後に他から更新された）
+    stale = client.put(f"/api/tasks/{task_id}", json={"title": "後", "quadrant": 1}, headers={"If-Match": etag})
+    assert stale.status_code == 409
+    assert stale.json()["current"]["title"] == "先"
+    assert stale.headers["etag"] == first.headers["etag"]
+    assert client.get(f"/api/tasks/{task_id}").json()["title"] == "先"
+
+    # If-Match なしは従来どおり上書き
+    assert client.put(f"/api/tasks/{task_id}", json={"title": "上書き", "quadrant": 1}).status_code == 200
+    current = client.get(f"/api/tasks/{task_id}").headers["etag"]
+    put = lambda if_match: client.put(f"/api/tasks/{task_id}", json={"title": "x", "quadrant": 1},
+                                      headers={"If-Match": if_match})
+    # 弱いETagや別のETagは強い比較で一致しないだけ（409）。列はどれかが一致すればよい。entity-tag でなければ 400
+    assert put(f"W/{current}").status_code == 409
+    assert put('W/"default-q-1"').status_code == 409
+    assert put(f'"other", {etag}, ,{current}').status_code == 200
+    assert put("t-1-1").status_code == 400
+
+def test_stale_move_returns_current_card(client):
+    """ドラッグの間に更新されたタスクの移動・並べ替えは 409 と現在のカード（一覧）を返すこと"""
+    task_id = client.post("/api/tasks", json={"title": "ドラッグ", "quadrant": 1}).json()["id"]
+    other_id = client.post("/api/tasks", json={"title": "隣", "quadrant": 1}).json()["id"]
+    card = client.patch(f"/api/tasks/{task_id}/move", data={"quadrant": "2", "version": "1"})
+    assert card.status_code == 200
+    assert 'data-version="2"' in card.text
+
+    # 別のタブが version 1 のカードのまま元の象限に戻そうとする
+    response = client.patch(f"/api/tasks/{task_id}/move", data={"quadrant": "1", "version": "1"})
+    assert response.status_code == 409
+    assert 'data-quadrant="2"' in response.text and 'data-version="2"' in response.text
+    assert client.get(f"/api/tasks/{task_id}").json()["quadrant"] == 2
+    response = client.patch(f"/api/tasks/{task_id}", data={"completed": "true", "version": "1"})
+    assert response.status_code == 409
+    assert client.get(f"/api/tasks/{task_id}").json()["completed"] is False
+
+    response = client.patch("/api/tasks/quadrant/1/reorder",
+                            json={"task_ids": [other_id], "versions": {str(other_id): 0}})
+    assert response.status_code == 409
+    assert f'data-task-id="{other_id}"' in response.text
+
+def test_get_tasks_pagination(client):
+    """カーソルでページを辿ると全件を重複なく順に取得できるテスト"""
+    for i in range(5):
+        client.post("/api/tasks", json={"title": f"ページ{i}", "quadrant": 2 - i % 2})
+
+    seen = []
+    response = client.get("/api/tasks", params={"limit": 2})
+    while True:
+        assert response.status_code == 200
+        seen.extend(task["title"] for task in response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        assert 'rel="next"' in response.headers["Link"]
+        response = client.get("/api/tasks", params={"limit": 2, "cursor": next_cursor})
+
+    assert seen == ["ページ1", "ページ3", "ページ0", "ページ2", "ページ4"]
+
+def test_get_tasks_filters(client):
+    """象限・完了状態・期限で絞り込めるテスト"""
+    client.post("/api/tasks", json={"title": "期限内", "quadrant": 1, "due_date": "2026-05-10"})
+    client.post("/api/tasks", json={"title": "期限外", "quadrant": 1, "due_date": "2026-08-01"})
+    done_id = client.post("/api/tasks", json={"title": "完了", "quadrant": 3}).json()["id"]
+    client.patch(f"/api/tasks/{done_id}", data={"completed": "true"})
+
+    titles = lambda params: [t["title"] for t in client.get("/api/tasks", params=params).json()]
+    assert titles({"quadrant": 3}) == ["完了"]
+    assert titles({"completed": "true"}) == ["完了"]
+    assert titles({"due_from": "2026-05-01", "due_to": "2026-05-31"}) == ["期限内"]
+    assert client.get("/api/tasks", params={"cursor": "???"}).status_code == 400
+
+def test_malformed_cursor_returns_400(client):
+    """デコードできても値の型が違うカーソルは 400 になること（SQLiteに渡さない）"""
+    import base64
+    for key in ([1, [1], "x", 1], [1, True, "x", 1], [True, 0, "x", 1], [1, 0, "x", False], [1, 0, 5, 1], [1, 0, "x"]):
+        cursor = base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+        assert client.get("/api/tasks", params={"cursor": cursor}).status_code == 400
+
+def test_export_markdown(client):
+    """Markdownエクスポートのテスト（タスクのない象限は「—」）"""
+    client.post("/api/tasks", json={"title": "重要な仕事", "quadrant": 2})
+    done_id = client.post("/api/tasks", json={"title": "済んだ仕事", "quadrant": 2}).json()["id"]
+    client.patch(f"/api/tasks/{done_id}", data={"completed": "true"})
+    client.post("/api/tasks", json={"title": "雑用", "quadrant": 4})
+
+    response = client.get("/api/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/markdown")
+    assert response.headers["content-disposition"].endswith('.md"')
+    body = response.text.split("---\n\n", 1)[1]
+    assert body == (
+        "## Q1 · 緊急かつ重要\n\n—\n\n"
+        "## Q2 · 重要\n\n- [ ] 重要な仕事\n- [x] 済んだ仕事\n\n"
+        "## Q3 · 緊急\n\n—\n\n"
+        "## Q4 · その他\n\n- [ ] 雑用\n\n"
+    )
+
+def test_export_ndjson_and_csv(client):
+    """NDJSON / CSV エクスポートのテスト"""
+    created = client.post("/api/tasks", json={"title": "書き出し", "quadrant": 3}).json()
+
+    response = client.get("/api/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0]) == created
+
+    response = client.get("/api/export", params={"format": "csv"})
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0][:4] == ["id", "title", "description", "quadrant"]
+    assert rows[1][1] == "書き出し"
+
+    assert client.get("/api/export", params={"format": "xml"}).status_code == 422
+
+def test_reorder_tasks_in_quadrant(client):
+    """HTMX用：象限内の並べ替え結果がHTMLで返るテスト"""
+    first = client.post("/api/tasks", json={"title": "一番目", "quadrant": 1}).json()["id"]
+    second = client.post("/api/tasks", json={"title": "二番目", "quadrant": 1}).json()["id"]
+
+    response = client.patch("/api/tasks/quadrant/1/reorder", json={"task_ids": [second, first]})
+    assert response.status_code == 200
+    assert response.text.index("二番目") < response.text.index("一番目")
+    assert client.patch("/api/tasks/quadrant/1/reorder", json={"task_ids": []}).status_code == 400
+    for body in ({"task_ids": ["abc"]}, {"task_ids": [None]}, {"task_ids": [True]}, {"task_ids": first},
+                 [first, second], {"task_ids": [first], "versions": [1]}):
+        assert client.patch("/api/tasks/quadrant/1/reorder", json=body).status_code == 400
+    assert client.patch("/api/tasks/quadrant/1/reorder", content=b"{",
+                        headers={"content-type": "application/json"}).status_code == 400
+
+def test_move_task_html(client):
+    """HTMX用：前後のカードを基準にタスクを移動するテスト"""
+    first = client.post("/api/tasks", json={"title": "先頭", "quadrant": 1}).json()["id"]
+    second = client.post("/api/tasks", json={"title": "移動するタスク", "quadrant": 2}).json()["id"]
+
+    response = client.patch(f"/api/tasks/{second}/move", data={"quadrant": "1", "before_id": str(first)})
+    assert response.status_code == 200
+    assert 'data-quadrant="1"' in response.text
+    html = client.get("/api/tasks/quadrant/1").text
+    assert html.index("移動するタスク") < html.index("先頭")
+    assert client.patch(f"/api/tasks/{second}/move", data={"quadrant": "9"}).status_code == 400
+    assert client.patch("/api/tasks/99999/move", data={"quadrant": "1"}).status_code == 404
+
+def test_cache_stats(client):
+    """読み込みキャッシュの統計を取得するテスト"""
+    client.get("/api/tasks/quadrant/1")
+    client.get("/api/tasks/quadrant/1")
+    stats = client.get("/api/cache/stats").json()
+    assert stats["hits"] >= 1
+    assert {"size", "maxsize", "misses", "evictions", "hit_ratio"} <= set(stats)
+
+def test_quadrant_conditional_get(client):
+    """象限が変わっていなければ304、変わったら新しい本体を返すテスト"""
+    client.post("/api/tasks", json={"title": "条件付き", "quadrant": 1})
+    first = client.get("/api/tasks/quadrant/1")
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+
+    response = client.get("/api/tasks/quadrant/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # 別の象限への書き込みでは変わらない
+    client.post("/api/tasks", json={"title": "別の象限", "quadrant": 2})
+    assert client.get("/api/tasks/quadrant/1", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/api/tasks", json={"title": "追加", "quadrant": 1})
+    response = client.get("/api/tasks/quadrant/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "追加" in response.text
+    assert response.headers["etag"] != etag
+
+def test_task_conditional_get(client):
+    """タスク詳細・JSONの条件付きGETのテスト"""
+    task_id = client.post("/api/tasks", json={"title": "詳細", "quadrant": 3}).json()["id"]
+    for url in (f"/api/tasks/{task_id}", f"/api/tasks/{task_id}/detail", "/api/tasks"):
+        etag = client.get(url).headers["etag"]
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    etag = client.get(f"/api/tasks/{task_id}").headers["etag"]
+    client.patch(f"/api/tasks/{task_id}", data={"completed": "true"})
+    response = client.get(f"/api/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["completed"] is True
+
+def test_board(client):
+    """4象限をまとめて返す /api/board のテスト"""
+    client.post("/api/tasks", json={"title": "ボード1", "quadrant": 1})
+    client.post("/api/tasks", json={"title": "ボード3", "quadrant": 3})
+    response = client.get("/api/board")
+    assert response.status_code == 200
+    html = response.text
+    for quadrant in (1, 2, 3, 4):
+        assert f'id="quadrant-{quadrant}" hx-swap-oob="innerHTML"' in html
+    # 各タスクは自分の象限のブロックに入る
+    blocks = html.split('hx-swap-oob="innerHTML"')
+    assert "ボード1" in blocks[1] and "ボード3" in blocks[3]
+    assert "タスクがありません" in blocks[2] and "タスクがありません" in blocks[4]
+
+    etag = response.headers["etag"]
+    assert client.get("/api/board", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/api/tasks", json={"title": "ボード4", "quadrant": 4})
+    assert client.get("/api/board", headers={"If-None-Match": etag}).status_code == 200
+
+def test_change_feed_pushes_fragments(client):
+    """書き込みの通知から、内容の変更はカード、移動は移動元と移動先の一覧が配信されること"""
+    import asyncio
+    from app.async_database import shutdown_executors
+    from app.events import Broadcaster, ChangeFeed
+    from app.main import render_board, render_card
+
+    task_id = client.post("/api/tasks", json={"title": "配信", "quadrant": 1}).json()["id"]
+
+    async def scenario():
+        broadcaster = Broadcaster()
+        feed = ChangeFeed(broadcaster, render_card, render_board)
+        await feed.start()
+        queue = broadcaster.subscribe()
+        try:
+            messages = []
+            for method, url, data in [
+                ("PUT", f"/api/tasks/{task_id}/html", {"title": "配信（更新）", "quadrant": "1"}),
+                ("PATCH", f"/api/tasks/{task_id}", {"completed": "true"}),
+                ("PATCH", f"/api/tasks/{task_id}/quadrant", {"quadrant": "3"}),
+            ]:
+                client.request(method, url, data=data)
+                messages.append(await asyncio.wait_for(queue.get(), 5))
+            return messages
+        finally:
+            feed.stop()
+
+    messages = asyncio.run(scenario())
+    shutdown_executors()
+    assert [message.split("\n", 1)[0] for message in messages[:2]] == ["event: task"] * 2
+    assert f'id="task-{task_id}"' in messages[0] and "配信（更新）" in messages[0]
+    assert 'data-quadrant="1"' in messages[1]
+    # 移動: 移動元（世代番号から検出）と移動先の両方
+    assert messages[2].startswith("event: board\n")
+    assert 'id="quadrant-1"' in messages[2] and 'id="quadrant-3"' in messages[2]
+    assert "タスクがありません" in messages[2]
+
+def test_card_rendering_is_memoized(client):
+    """一覧は描画済みのカードを再利用し、タスクが変わったカードだけ描画し直すこと"""
+    from app.rendering import card_cache
+    ids = [client.post("/api/tasks", json={"title": f"カード{i}", "quadrant": 2}).json()["id"]
+           for i in range(3)]
+    client.put(f"/api/tasks/{ids[0]}", json={"title": "<b>太字</b>", "quadrant": 2})
+    card_cache.clear()
+    first = client.get("/api/tasks/quadrant/2").text
+    before = card_cache.stats()
+    assert client.get("/api/tasks/quadrant/2").text == first
+    assert card_cache.stats()["hits"] - before["hits"] == 3
+    # エスケープは1回だけ
+    assert "&lt;b&gt;太字&lt;/b&gt;" in first and "&amp;lt;" not in first
+
+    client.put(f"/api/tasks/{ids[1]}/html", data={"title": "変更後"})
+    before = card_cache.stats()
+    html = client.get("/api/tasks/quadrant/2").text
+    assert "変更後" in html and "カード1" not in html
+    assert card_cache.stats()["hits"] - before["hits"] == 3  # 更新時に描画したカードも使われる
+
+def test_card_macro_is_shared_by_lists():
+    """ボード・検索・期限のカードは同じマクロから描画され、違うのは id の先頭と期限の表示だけであること"""
+    from datetime import datetime
+    from app.models import Task
+    from app.rendering import templates
+    task = Task(id=7, title="共通", quadrant=1, created_at=datetime(2026, 1, 1), updated_at=datetime(2026, 1, 1))
+    card = templates.get_template("task_card.html").module.task_card(task)
+    assert card.startswith('<div class="task-card" id="task-7"') and card.endswith("</div>")
+    due = templates.get_template("due_list.html").render(tasks=[task])
+    assert str(card).replace('id="task-7"', 'id="due-task-7"') in due
+
+def test_bulk_create_update_delete(client):
+    """一括作成・一括更新（完了）・一括削除のテスト"""
+    response = client.post("/api/tasks/bulk", json=[
+        {"title": f"一括{i}", "quadrant": i % 4 + 1, "due_date": "2026-03-01"} for i in range(8)
+    ])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["index"] for item in results] == list(range(8))
+    ids = [item["id"] for item in results]
+    assert client.get(f"/api/tasks/{ids[5]}").json()["title"] == "一括5"
+
+    response = client.patch("/api/tasks/bulk", json=[
+        {"id": ids[0], "completed": True},
+        {"id": ids[1], "title": "改名", "quadrant": 1},
+        {"id": 99999, "completed": True},
+    ])
+    assert [item["status"] for item in response.json()["results"]] == ["updated", "updated", "not_found"]
+    assert client.get(f"/api/tasks/{ids[0]}").json()["completed"] is True
+    moved = client.get(f"/api/tasks/{ids[1]}").json()
+    assert (moved["title"], moved["quadrant"], moved["due_date"]) == ("改名", 1, "2026-03-01")
+    # 移動したタスクは移動先の末尾
+    assert client.get("/api/tasks", params={"quadrant": 1}).json()[-1]["id"] == ids[1]
+
+    response = client.request("DELETE", "/api/tasks/bulk", json={"ids": [ids[2], ids[3], 99999]})
+    assert [item["status"] for item in response.json()["results"]] == ["deleted", "deleted", "not_found"]
+    assert client.get(f"/api/tasks/{ids[2]}").status_code == 404
+    assert len(client.get("/api/tasks").json()) == 6
+
+def test_bulk_validation_rejects_whole_batch(client):
+    """1件でも不正な入力があれば何も書き込まないこと"""
+    response = client.post("/api/tasks/bulk", json=[
+        {"title": "正しい", "quadrant": 1},
+        {"title": "", "quadrant": 5},
+    ])
+    assert response.status_code == 422
+    assert client.get("/api/tasks").json() == []
+    assert client.patch("/api/tasks/bulk", json=[{"id": 1, "title": None}]).status_code == 422
+
+def test_bulk_rejects_large_body_before_parsing(client, monkeypatch):
+    """一括操作の本文が上限を超えたら、JSON を解析せずに 413 を返すこと（Content-Length なしでも）"""
+    from app import limits
+    monkeypatch.setattr(limits, "MAX_BULK_BYTES", 200)
+    tasks = [{"title": f"大きい{i}", "quadrant": 1} for i in range(20)]
+    assert client.post("/api/tasks/bulk", json=tasks).status_code == 413
+    assert client.post("/boards/team-a/api/tasks/bulk", json=tasks).status_code == 413
+    assert client.request("DELETE", "/api/tasks/bulk", json={"ids": list(range(100))}).status_code == 413
+
+    # chunked で送ると Content-Length がないので、読みながら数える
+    body = json.dumps(tasks).encode()
+    chunks = (body[start:start + 64] for start in range(0, len(body), 64))
+    response = client.post("/api/tasks/bulk", content=chunks, headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert "too large" in response.json()["detail"]
+    assert client.get("/api/tasks").json() == []
+
+    assert client.post("/api/tasks/bulk", json=tasks[:1]).status_code == 200
+
+def test_import_round_trips_export(client):
+    """エクスポートした Markdown / NDJSON をインポートすると同じボードになること"""
+    client.post("/api/tasks", json={"title": "重要な仕事", "quadrant": 1, "due_date": "2026-04-01"})
+    done = client.post("/api/tasks", json={"title": "終わった", "quadrant": 3}).json()["id"]
+    client.patch(f"/api/tasks/{done}", data={"completed": "true"})
+    markdown = client.get("/api/export?format=markdown").content
+    ndjson = client.get("/api/export?format=ndjson").content
+    original = [(t["title"], t["quadrant"], t["completed"], t["due_date"]) for t in client.get("/api/tasks").json()]
+
+    for task in client.get("/api/tasks").json():
+        client.delete(f"/api/tasks/{task['id']}")
+    response = client.post("/api/import?format=markdown", content=markdown)
+    assert response.json()["imported"] == 2
+    assert response.json()["quadrants"] == {"1": 1, "2": 0, "3": 1, "4": 0}
+    # Markdownはタイトルと完了状態だけ
+    assert [(t["title"], t["quadrant"], t["completed"]) for t in client.get("/api/tasks").json()] == \
+        [row[:3] for row in original]
+
+    for task in client.get("/api/tasks").json():
+        client.delete(f"/api/tasks/{task['id']}")
+    assert client.post("/api/import?format=ndjson", content=ndjson).json()["imported"] == 2
+    assert [(t["title"], t["quadrant"], t["completed"], t["due_date"])
+            for t in client.get("/api/tasks").json()] == original
+
+def test_import_reports_bad_line(client):
+    response = client.post("/api/import?format=ndjson", content=b'{"title": "ok", "quadrant": 1}\nnot json\n')
+    assert response.status_code == 400
+    assert "line 2" in response.json()["detail"]
+
+def test_search(client):
+    """ライブ検索のテスト（一致箇所を強調したカードを返し、HTMLはエスケープする）"""
+    task = client.post("/api/tasks", json={"title": "<b>請求書</b>を送る", "description": "経理に請求書を送付", "quadrant": 1}).json()
+    response = client.get("/api/search", params={"q": "請求書"})
+    assert response.status_code == 200
+    html = response.text
+    assert f'id="search-task-{task["id"]}"' in html
+    assert "&lt;b&gt;<mark>請求書</mark>&lt;/b&gt;を送る" in html
+    assert 'class="task-snippet">経理に<mark>請求書</mark>を送付' in html
+
+    assert "一致するタスクがありません" in client.get("/api/search", params={"q": "存在しない語"}).text
+    assert client.get("/api/search").text.strip() == ""
+    short = client.get("/api/search", params={"q": "請求"})
+    assert "3文字以上の語で検索してください" in short.text and "ETag" not in short.headers
+    assert client.get("/api/search", params={"q": "請求書", "limit": 0}).status_code == 422
+
+    etag = response.headers["etag"]
+    assert client.get("/api/search", params={"q": "請求書"}, headers={"If-None-Match": etag}).status_code == 304
+
+def test_due_views(client):
+    """期限のビュー・期限切れバッジ・次の期限のテスト"""
+    client.post("/api/tasks", json={"title": "期限切れ", "quadrant": 1, "due_date": "2026-05-01"})
+    client.post("/api/tasks", json={"title": "今日", "quadrant": 2, "due_date": "2026-05-10"})
+    client.post("/api/tasks", json={"title": "期限なし", "quadrant": 3})
+    params = {"today": "2026-05-10"}
+
+    response = client.get("/api/tasks/due/overdue", params=params)
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()] == ["期限切れ"]
+    assert client.get("/api/tasks/due/week", params=params).json()[0]["title"] == "今日"
+    assert client.get("/api/tasks/due/someday").status_code == 422
+    etag = response.headers["etag"]
+    assert client.get("/api/tasks/due/overdue", params=params, headers={"If-None-Match": etag}).status_code == 304
+    # 日付が変われば同じボードでも別の内容
+    assert client.get("/api/tasks/due/overdue", params={"today": "2026-05-11"},
+                      headers={"If-None-Match": etag}).status_code == 200
+
+    assert client.get("/api/due/counts", params=params).json() == {"1": 1, "2": 0, "3": 0, "4": 0}
+    html = client.get("/api/due/today", params=params).text
+    assert 'id="due-task-' in html and 'class="task-due">2026-05-10' in html
+
+    summary = client.get("/api/due/summary", params=params)
+    assert 'id="overdue-1" class="overdue-badge" hx-swap-oob="outerHTML"' in summary.text
+    assert 'title="期限切れ 1件">1</span>' in summary.text
+    assert '<span class="next-due-date">2026-05-10</span> 今日' in summary.text
+    assert "期限なし" not in summary.text
+
+def test_archive_endpoints(client):
+    """アーカイブの実行・閲覧・統計のテスト"""
+    import app.database as db_module
+    ids = [client.post("/api/tasks", json={"title": f"古い完了{i}", "quadrant": 2}).json()["id"] for i in range(3)]
+    client.patch("/api/tasks/bulk", json=[{"id": task_id, "completed": True} for task_id in ids])
+    client.post("/api/tasks", json={"title": "未完了", "quadrant": 2})
+    with db_module.connection() as conn:
+        conn.execute("UPDATE tasks SET updated_at = datetime('now', '-90 days') WHERE completed = 1")
+        conn.commit()
+
+    result = client.post("/api/archive/run").json()
+    assert result["archived"] == 3 and result["batches"] == 1
+    # 前後の件数と描画時間は TASKS_ARCHIVE_MEASURE=1 のときだけ（全件を読んで描画するので）
+    assert "before" not in result
+    assert "古い完了" not in client.get("/api/board").text
+
+    response = client.get("/api/archive", params={"limit": 2})
+    assert [task["title"] for task in response.json()] == ["古い完了2", "古い完了1"]
+    assert "archived_at" in response.json()[0]
+    rest = client.get("/api/archive", params={"limit": 2, "cursor": response.headers["x-next-cursor"]})
+    assert [task["title"] for task in rest.json()] == ["古い完了0"]
+    assert client.get("/api/archive", params={"cursor": "invalid"}).status_code == 400
+
+    stats = client.get("/api/archive/stats").json()
+    assert stats["tasks"] == 1 and stats["archived"] == 3
+    assert stats["job"]["last_run"]["archived"] == 3
+
+def test_archive_measurement_is_opt_in(client):
+    """measure=True のときだけ、読み込みスレッドで前後の件数とボードの描画時間を記録すること"""
+    import asyncio
+    import threading
+    from app.archive import ArchiveJob
+    client.post("/api/tasks", json={"title": "残る", "quadrant": 1})
+    threads = []
+
+    def render_board(board):
+        threads.append(threading.current_thread().name)
+        return ""
+
+    result = asyncio.run(ArchiveJob(render_board, interval=0, measure=True).run())
+    assert result["before"]["tasks"] == result["after"]["tasks"] == 1
+    assert result["after"]["board_render_ms"] >= 0
+    assert len(threads) == 2 and all(name.startswith("db-reader") for name in threads)
+    assert "before" not in asyncio.run(ArchiveJob(render_board, interval=0, measure=False).run())
+    assert len(threads) == 2
+
+def test_metrics_endpoint(client):
+    """ルートのテンプレートごとのレイテンシとSQLの回数が /metrics に出ること"""
+    from app import metrics
+    metrics.reset()
+    task_id = client.post("/api/tasks", json={"title": "計測", "quadrant": 1}).json()["id"]
+    client.get(f"/api/tasks/{task_id}")
+    client.get("/api/tasks/999999")
+    client.get("/no-such-path")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'mytask_http_requests_total{method="GET",route="/api/tasks/{task_id}",status="200"} 1' in body
+    assert 'mytask_http_requests_total{method="GET",route="/api/tasks/{task_id}",status="404"} 1' in body
+    assert 'mytask_http_requests_total{method="GET",route="unmatched",status="404"} 1' in body
+    assert 'mytask_http_request_duration_seconds_count{method="POST",route="/api/tasks"} 1' in body
+    assert 'mytask_http_request_sql_statements_total{method="POST",route="/api/tasks"}' in body
+    assert "mytask_db_pool_open_connections" in body
+
+    slow = client.get("/api/metrics/slow-queries").json()
+    assert slow["threshold_ms"] == metrics.SLOW_QUERY_MS
+    assert any(stat["statement"].startswith("INSERT INTO tasks") for stat in slow["top_statements"])
+
+def test_json_fast_path_matches_pydantic_encoding(client):
+    """行から直接作るJSONが、Task を jsonable_encoder に通した場合と同じバイト列であること"""
+    from fastapi.encoders import jsonable_encoder
+    import app.database as db_module
+    import app.mappers as mappers
+    from app.mappers import rows_to_tasks
+    client.post("/api/tasks", json={"title": "改行\nと\"引用\"と😀", "description": "説明", "quadrant": 2,
+                                    "due_date": "2026-05-01"})
+    client.post("/api/tasks", json={"title": "期限なし", "quadrant": 3})
+    with db_module.connection() as conn:
+        # 小数秒つきの時刻は Pydantic の書式に任せる
+        conn.execute("UPDATE tasks SET updated_at = '2026-01-02 03:04:05.5' WHERE quadrant = 3")
+        conn.commit()
+
+    def expected(value) -> bytes:
+        return json.dumps(jsonable_encoder(value), ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    rows = get_all_tasks()
+    assert client.get("/api/tasks").content == expected(rows_to_tasks(rows))
+    assert client.get(f"/api/tasks/{rows[0]['id']}").content == expected(rows_to_tasks(rows)[0])
+    # orjson がない環境の標準 json でも同じ
+    original = mappers.orjson
+    mappers.orjson = None
+    try:
+        assert mappers.rows_to_json(rows) == expected(rows_to_tasks(rows))
+    finally:
+        mappers.orjson = original
+
+def test_boards_use_separate_databases(client, tmp_path, monkeypatch):
+    """ボードごとに別のデータベースファイルを使い、URLの先頭か X-Board ヘッダーで選べること"""
+    import app.boards as boards
+    monkeypatch.setattr(boards, "BOARDS_DIR", str(tmp_path / "boards"))
+    created = client.post("/api/tasks", json={"title": "チームA", "quadrant": 1}, headers={"X-Board": "team-a"})
+    assert created.status_code == 200
+    # 最初のリクエストでファイルを作ってマイグレーションする
+    assert (tmp_path / "boards" / "team-a.db").exists()
+    client.post("/boards/team-b/api/tasks", json={"title": "チームB", "quadrant": 1})
+
+    assert client.get("/api/tasks").json() == []
+    assert [task["title"] for task in client.get("/boards/team-a/api/tasks").json()] == ["チームA"]
+    assert [task["title"] for task in client.get("/api/tasks", headers={"X-Board": "team-b"}).json()] == ["チームB"]
+    assert "チームA" in client.get("/boards/team-a/api/board").text
+    assert "チームA" not in client.get("/boards/team-b/api/board").text
+
+    # 次のページのリンクもボードの先頭つき
+    client.post("/boards/team-a/api/tasks", json={"title": "チームA2", "quadrant": 2})
+    page = client.get("/boards/team-a/api/tasks", params={"limit": 1})
+    assert "/boards/team-a/api/tasks?" in page.headers["link"]
+
+    page = client.get("/boards/team-a/")
+    assert 'hx-headers=\'{"X-Board": "team-a"}\'' in page.text
+    assert "new EventSource('/boards/team-a/api/events')" in page.text
+    assert "hx-headers" not in client.get("/").text.split("<body", 1)[1].split(">", 1)[0]
+
+    assert client.get("/api/tasks", headers={"X-Board": "../etc"}).status_code == 400
+    assert client.get("/boards/Team_A/api/tasks").status_code == 400
+
+def test_validators_are_scoped_to_the_board(client, tmp_path, monkeypatch):
+    """同じURLでも X-Board が違えば、別のボードのETagでは 304 にも書き込みにもならないこと"""
+    import app.boards as boards
+    monkeypatch.setattr(boards, "BOARDS_DIR", str(tmp_path / "boards"))
+    team_a, team_b = {"X-Board": "team-a"}, {"X-Board": "team-b"}
+    task_id = client.post("/api/tasks", json={"title": "A", "quadrant": 1}, headers=team_a).json()["id"]
+    assert client.post("/api/tasks", json={"title": "B", "quadrant": 1}, headers=team_b).json()["id"] == task_id
+
+    board = client.get("/api/board", headers=team_a)
+    assert "X-Board" in board.headers["vary"]
+    assert client.get("/api/board", headers={**team_a, "If-None-Match": board.headers["etag"]}).status_code == 304
+    assert client.get("/api/board", headers={**team_b, "If-None-Match": board.headers["etag"]}).status_code == 200
+
+    etag = client.get(f"/api/tasks/{task_id}", headers=team_a).headers["etag"]
+    assert client.get(f"/api/tasks/{task_id}", headers={**team_b, "If-None-Match": etag}).status_code == 200
+    response = client.put(f"/api/tasks/{task_id}", json={"title": "上書き", "quadrant": 1},
+                          headers={**team_b, "If-Match": etag})
+    assert response.status_code == 409
+    assert client.get(f"/api/tasks/{task_id}", headers=team_b).json()["title"] == "B"
+    # URLでボードを選ぶ場合はヘッダーで変わらないので Vary を付けない
+    assert "vary" not in client.get("/boards/team-a/api/board").headers